@@ -0,0 +1,257 @@
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from PIL import Image, ImageSequence
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sgf2anim
+from sgf2anim import _parse_content, _render_diagram
+from sgf2anim._settings import Settings
+
+MAIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEMO_DIR = os.path.join(MAIN_DIR, "_demo_res")
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+MANIFEST_NAME = "manifest.json"
+PROFILES = ("static", "animated", "sensei")
+
+TIMING = (1500, 3000, 10000, 500)
+
+# the number of cells that a Sensei's Library diagram shows
+# around the played area, and the pixels of each cell of its image.
+SENSEI_PADDING = 2
+SENSEI_CELL_SIZE = 23
+
+
+# renders every .sgf file in _demo_res as a static diagram, an animated diagram
+# and a diagram in the Sensei's Library format, and compares the decoded pixels
+# and frame durations of each one with the references in benchmarks/golden.
+# any change to the output is reported next to how much faster each diagram
+# now renders than when its reference was saved, so a faster way of drawing
+# can be checked to draw exactly the same diagrams.
+# run with --update to save the current output as the new references.
+def main():
+    args = _create_parser().parse_args()
+    manifest_path = os.path.join(GOLDEN_DIR, MANIFEST_NAME)
+    manifest = {}  # {<reference name>: {"seconds": <seconds to render>}}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+
+    print(
+        f"{'diagram':<46}{'frames':>8}{'pixels':>10}{'ms':>8}{'ref ms':>8}"
+        f"{'speedup':>9}"
+    )
+    n_cases = 0
+    n_differ = 0
+    seconds = 0.0
+    reference_seconds = 0.0
+    for name, profile, sgf_path in _iter_cases(args.profiles or PROFILES):
+        data, elapsed = _time_render(profile, sgf_path, args.repeat)
+        n_cases += 1
+        reference_path = os.path.join(GOLDEN_DIR, name)
+        if args.update:
+            manifest[name] = {"seconds": round(elapsed, 4)}
+            os.makedirs(os.path.dirname(reference_path), exist_ok=True)
+            with open(reference_path, "wb") as file:
+                file.write(data)
+            print(f"{name:<46}{'saved':>8}{'':>10}{elapsed * 1000:>8.0f}")
+            continue
+
+        if not os.path.exists(reference_path):
+            n_differ += 1
+            print(f"{name:<46}{'no reference':>18}")
+            continue
+        difference = compare_diagrams(data, reference_path)
+        if difference is not None:
+            n_differ += 1
+            if args.diff_dir is not None:
+                _save_diff(args.diff_dir, name, data, reference_path)
+
+        reference_elapsed = manifest.get(name, {}).get("seconds")
+        frames, pixels = ("same", "") if difference is None else difference
+        line = f"{name:<46}{frames:>8}{pixels:>10}{elapsed * 1000:>8.0f}"
+        if reference_elapsed:
+            seconds += elapsed
+            reference_seconds += reference_elapsed
+            speedup = reference_elapsed / elapsed
+            line += f"{reference_elapsed * 1000:>8.0f}{speedup:>8.2f}x"
+        print(line)
+
+    if args.update:
+        with open(manifest_path, "w", encoding="utf-8") as file:
+            json.dump(manifest, file, indent=1, sort_keys=True)
+            file.write("\n")
+        print(f"\n{n_cases} references were saved to {GOLDEN_DIR}.")
+        return 0
+
+    print(f"\n{n_cases} diagrams: {n_cases - n_differ} same, {n_differ} differ.")
+    if seconds > 0:
+        print(
+            f"{seconds:.2f}s, {reference_seconds:.2f}s for the references "
+            f"({reference_seconds / seconds:.2f}x)."
+        )
+    return 1 if n_differ > 0 else 0
+
+
+# yields (<reference name>, <profile>, <sgf path>) for every diagram to render.
+def _iter_cases(profiles):
+    sgf_paths = sorted(sgf2anim.iter_SGF_paths(DEMO_DIR, recursive=True))
+    for profile in profiles:
+        extension = "gif" if profile == "animated" else "png"
+        for sgf_path in sgf_paths:
+            stem = os.path.splitext(os.path.relpath(sgf_path, DEMO_DIR))[0]
+            name = f"{profile}/{stem}.{extension}".replace(os.sep, "/")
+            yield name, profile, sgf_path
+
+
+# returns the bytes of the diagram of <sgf_path> rendered with the <profile>'s
+# settings and the fewest seconds it took to render out of <n_repeats> times.
+# the style is loaded ahead of time, so its loading isn't timed.
+def _time_render(profile, sgf_path, n_repeats):
+    with open(sgf_path, "r", encoding="utf-8", errors="replace") as file:
+        content = file.read()
+
+    settings = sgf2anim.get_settings()
+    settings.load_dict(Settings().to_dict())
+    if profile == "animated":
+        settings.set_for_animated_diagram()
+    else:
+        settings.set_for_static_diagram()
+    sgf2anim.load_images()
+
+    with tempfile.TemporaryDirectory() as temp_directory:
+        render_path = sgf_path
+        if profile == "sensei":
+            settings.DOING_SENSEIS_FORMAT = True
+            render_path = _create_sensei_image(temp_directory, content)
+
+        best_elapsed = None
+        for _ in range(max(1, n_repeats)):
+            out_file = io.BytesIO()
+            start_time = time.perf_counter()
+            success = _render_diagram(
+                content, render_path, out_file, profile != "animated", *TIMING
+            )
+            elapsed = time.perf_counter() - start_time
+            if not success:
+                raise RuntimeError(f"{sgf_path} could not be rendered.")
+            if best_elapsed is None or elapsed < best_elapsed:
+                best_elapsed = elapsed
+    settings.load_dict(Settings().to_dict())
+    return out_file.getvalue(), best_elapsed
+
+
+# makes the image that a diagram in the Sensei's Library format takes the size
+# of its viewport from, showing SENSEI_PADDING cells around the played area.
+# returns the path of an .sgf file which that image accompanies.
+def _create_sensei_image(directory, content):
+    game = _parse_content(content)
+    min_x, min_y, max_x, max_y = game.bounds
+    n_cells_wide = min(game.width, max_x - min_x + 1 + SENSEI_PADDING * 2)
+    n_cells_high = min(game.height, max_y - min_y + 1 + SENSEI_PADDING * 2)
+    size = (4 + n_cells_wide * SENSEI_CELL_SIZE, 4 + n_cells_high * SENSEI_CELL_SIZE)
+    Image.new("RGB", size).save(os.path.join(directory, "diagram.png"))
+    return os.path.join(directory, "diagram.sgf")
+
+
+# returns None if the diagram in <data> looks exactly the same as the one
+# at <reference_path>, frame for frame and millisecond for millisecond.
+# otherwise, returns (<frames>, <pixels>): the frame counts if they differ,
+# or "timing" if only the durations differ, and the number of pixels that
+# differ within the frames that both have.
+def compare_diagrams(data, reference_path):
+    frames = _decode_frames(io.BytesIO(data))
+    reference_frames = _decode_frames(reference_path)
+
+    n_pixels = 0
+    has_same_timing = len(frames) == len(reference_frames)
+    for (pixels, duration), (reference_pixels, reference_duration) in zip(
+        frames, reference_frames
+    ):
+        if pixels.shape != reference_pixels.shape:
+            return "size", ""
+        n_pixels += int(np.any(pixels != reference_pixels, axis=2).sum())
+        has_same_timing = has_same_timing and duration == reference_duration
+
+    if len(frames) != len(reference_frames):
+        return f"{len(frames)}/{len(reference_frames)}", str(n_pixels)
+    if n_pixels > 0:
+        return "", str(n_pixels)
+    if not has_same_timing:
+        return "timing", ""
+    return None
+
+
+# returns the decoded [<RGBA pixels>, <duration ms>] of every frame of an image
+# as it's seen, so consecutive frames that look the same are combined into one.
+def _decode_frames(file):
+    frames = []
+    with Image.open(file) as image:
+        for frame in ImageSequence.Iterator(image):
+            pixels = np.array(frame.convert("RGBA"))
+            duration = frame.info.get("duration", 0)
+            if len(frames) > 0 and np.array_equal(frames[-1][0], pixels):
+                frames[-1][1] += duration
+            else:
+                frames.append([pixels, duration])
+    return frames
+
+
+# saves the new diagram and an image of where its first differing frame
+# differs from the reference to <diff_dir>.
+def _save_diff(diff_dir, name, data, reference_path):
+    out_path = os.path.join(diff_dir, name)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open(out_path, "wb") as file:
+        file.write(data)
+
+    frames = _decode_frames(io.BytesIO(data))
+    reference_frames = _decode_frames(reference_path)
+    for (pixels, _), (reference_pixels, _) in zip(frames, reference_frames):
+        if pixels.shape != reference_pixels.shape:
+            return
+        mask = np.any(pixels != reference_pixels, axis=2)
+        if mask.any():
+            diff_image = Image.fromarray(mask.astype(np.uint8) * 255)
+            diff_image.save(os.path.splitext(out_path)[0] + "-diff.png")
+            return
+
+
+def _create_parser():
+    parser = argparse.ArgumentParser(
+        description="Compares the diagrams of the demo games with their references."
+    )
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="save the current diagrams as the new references.",
+    )
+    parser.add_argument(
+        "--profile",
+        dest="profiles",
+        action="append",
+        choices=PROFILES,
+        help="a profile to render with. can be given more than once (default: all).",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        help="the number of times each diagram is rendered, "
+        "of which the fastest is timed (default: 1).",
+    )
+    parser.add_argument(
+        "--diff-dir",
+        help="a directory to save every diagram that differs to, "
+        "with an image of where its first differing frame differs.",
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sgf2anim
+from sgf2anim import _iter_frames, _parse_content
+from sgf2anim._save_png import PNG_COMPRESS_LEVELS, save_PNG_to_file
+
+N_REPEATS = 5
+
+
+# compares the time it takes to encode static diagrams and the size of the files
+# when saving full RGB PNGs and palette PNGs at every compression tier.
+def main():
+    main_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    images = _render_demo_images(os.path.join(main_dir, "_demo_res"))
+    print(f"encoding {len(images)} diagrams {N_REPEATS} times each.\n")
+
+    print(f"{'mode':<24}{'ms/diagram':>12}{'bytes':>12}{'size':>9}")
+    baseline_bytes = None
+    for use_palette in [False, True]:
+        for tier in reversed(list(PNG_COMPRESS_LEVELS)):
+            sgf2anim.get_settings().PNG_PALETTE = use_palette
+            sgf2anim.get_settings().PNG_COMPRESSION = tier
+            seconds, n_bytes = _time_encoding(images)
+            if baseline_bytes is None:
+                baseline_bytes = n_bytes  # the original RGB "smallest" output.
+
+            mode = f"{'palette' if use_palette else 'rgb'} {tier}"
+            ms_per_image = seconds / (len(images) * N_REPEATS) * 1000
+            share = n_bytes / baseline_bytes * 100
+            print(f"{mode:<24}{ms_per_image:>12.2f}{n_bytes:>12}{share:>8.1f}%")
+
+
+# returns the image of the static diagram of every .sgf file in <directory>.
+def _render_demo_images(directory):
+    sgf2anim.get_settings().set_for_static_diagram()
+    images = []
+    for path in sgf2anim.iter_SGF_paths(directory, recursive=True):
+        with open(path, "r", encoding="utf-8") as file:
+            game = _parse_content(file.read())
+        if game is not None:
+            # a static diagram is its only frame.
+            image = list(_iter_frames(path, game, True))[0][0]
+            images.append(image)
+    return images
+
+
+# returns the seconds it takes to encode every image N_REPEATS times
+# and the total number of bytes of one encoding of every image.
+def _time_encoding(images):
+    save_PNG_to_file(io.BytesIO(), images[0])  # makes the palette ahead of time.
+    n_bytes = 0
+    start_time = time.perf_counter()
+    for i in range(N_REPEATS):
+        for image in images:
+            out_file = io.BytesIO()
+            save_PNG_to_file(out_file, image)
+            if i == 0:
+                n_bytes += len(out_file.getvalue())
+    return time.perf_counter() - start_time, n_bytes
+
+
+if __name__ == "__main__":
+    main()
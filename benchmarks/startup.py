@@ -0,0 +1,129 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+MAIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEMO_DIR = os.path.join(MAIN_DIR, "_demo_res")
+
+N_REPEATS = 5
+
+# the most milliseconds that importing sgf2anim, and importing it and rendering
+# a first diagram in a new process, can take before it counts as a regression.
+# importing took about 160ms before the heavy dependencies were deferred.
+MAX_IMPORT_MS = 100
+MAX_FIRST_RENDER_MS = {"png": 1000, "gif": 2000}
+
+# the modules that mustn't be imported yet after each step, since only some
+# diagrams need them: numpy is imported with the first board,
+# imageio with the first GIF, and asyncio and the HTTP server when used.
+DEFERRED_MODULES = {
+    "import": ("numpy", "imageio", "asyncio", "http.server", "multiprocessing"),
+    "png": ("imageio", "asyncio", "http.server", "multiprocessing"),
+    "gif": ("asyncio", "http.server", "multiprocessing"),
+}
+
+# the script each new process runs, which prints the milliseconds it took
+# and the deferred modules that were imported anyway as its last line.
+_SCRIPT = """
+import json, sys, time
+start_time = time.perf_counter()
+sys.path.insert(0, {main_dir!r})
+import sgf2anim
+import_ms = (time.perf_counter() - start_time) * 1000
+render_ms = None
+if {out_format!r} is not None:
+    with open({sgf_path!r}, "r", encoding="utf-8") as file:
+        content = file.read()
+    if sgf2anim.render_diagram(content, {out_format!r}) is None:
+        raise RuntimeError("the diagram could not be rendered.")
+    render_ms = (time.perf_counter() - start_time) * 1000
+loaded = [name for name in {modules!r} if name in sys.modules]
+print(json.dumps({{"import_ms": import_ms, "render_ms": render_ms, "loaded": loaded}}))
+"""
+
+
+# measures how long a new process takes to import sgf2anim, and to import it
+# and render its first PNG and GIF of a demo game, which includes loading
+# the style. each is the fastest of N_REPEATS new processes.
+# exits with 1 if any of them takes longer than its target, or if a dependency
+# that should be deferred was imported before it was needed.
+def main():
+    args = _create_parser().parse_args()
+    sgf_path = args.sgf or _get_demo_path()
+    print(f"{'step':<10}{'import ms':>11}{'total ms':>10}{'target ms':>11}  deferred")
+
+    n_failed = 0
+    for step in ["import", "png", "gif"]:
+        out_format = None if step == "import" else step
+        results = [
+            _run_step(out_format, sgf_path, DEFERRED_MODULES[step])
+            for _ in range(max(1, args.repeat))
+        ]
+        import_ms = min(result["import_ms"] for result in results)
+        if out_format is None:
+            total_ms = import_ms
+            target_ms = MAX_IMPORT_MS
+        else:
+            total_ms = min(result["render_ms"] for result in results)
+            target_ms = MAX_FIRST_RENDER_MS[out_format]
+        loaded = sorted({name for result in results for name in result["loaded"]})
+
+        line = f"{step:<10}{import_ms:>11.0f}{total_ms:>10.0f}{target_ms:>11}  "
+        line += "ok" if len(loaded) == 0 else "imported " + ", ".join(loaded)
+        if total_ms > target_ms or len(loaded) > 0:
+            n_failed += 1
+            line += "  (regression)"
+        print(line)
+
+    if n_failed > 0:
+        print(f"\n{n_failed} step(s) regressed.")
+        return 1
+    return 0
+
+
+# returns the result that a new process printed after importing sgf2anim
+# and rendering the game at <sgf_path> as <out_format>, if it's given.
+def _run_step(out_format, sgf_path, modules):
+    script = _SCRIPT.format(
+        main_dir=MAIN_DIR, out_format=out_format, sgf_path=sgf_path, modules=modules
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+# returns the path of the first .sgf file of the demo games.
+def _get_demo_path():
+    sys.path.insert(0, MAIN_DIR)
+    import sgf2anim
+
+    return sorted(sgf2anim.iter_SGF_paths(DEMO_DIR, recursive=True))[0]
+
+
+def _create_parser():
+    parser = argparse.ArgumentParser(
+        description="Measures how long sgf2anim takes to import and to render "
+        "its first diagrams in a new process."
+    )
+    parser.add_argument(
+        "--sgf",
+        help="the .sgf file to render (default: the first demo game).",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=N_REPEATS,
+        help="the number of new processes of which the fastest is timed "
+        f"(default: {N_REPEATS}).",
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    sys.exit(main())
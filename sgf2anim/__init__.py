@@ -1,15 +1,30 @@
+import importlib
+import io
 import os
 import re
 import time
-import numpy as np
 from PIL import Image
+from ._archive import ARCHIVE_EXTENSION, GameArchive, write_archive
+from ._batch import (
+    BatchJournal,
+    REASON_NOT_RENDERED,
+    STATUS_DONE,
+    STATUS_FAILED,
+    run_tasks,
+)
 from ._commands import (
     get_has_used_line_annotations,
     get_line_annotations_image,
+    get_line_annotations_box,
     set_move_num,
-    play_setup_moves,
-    run_command,
+    apply_command,
+    draw_command,
+    finish_setup_moves,
 )
+from ._bundle import render_playback_bundle, save_playback_bundle
+from ._cells import play_static_cells
+from ._compile import compile_game, is_frame_node
+from ._draw import get_dirty_box, reset_annotations, reset_dirty_box
 from ._image_resources import (
     get_stone_images,
     get_board_image,
@@ -17,76 +32,72 @@ from ._image_resources import (
     get_show_height,
     get_cell_size,
     get_scaled_margin,
+    load_images,
     setup_board,
 )
+from ._find_paths import (
+    SYMLINKS_IGNORE,
+    SYMLINKS_FILES,
+    SYMLINKS_FOLLOW,
+    iter_SGF_paths,
+    get_mirrored_out_path,
+)
 from ._image_text import create_cell_text
-from ._katrain_file import *
+from ._katrain_file import (
+    is_katrain_file,
+    is_katrain_content,
+    create_cleaned_katrain_file,
+    clean_katrain_content,
+)
+from ._metrics import BatchMetrics, get_metric_totals, get_task_metrics
+from ._positions import PositionRenderer, render_position
+from ._profile import (
+    get_stage_times,
+    reset_stage_times,
+    format_stage_times,
+    start_memory_trace,
+    stop_memory_trace,
+    get_stage_peaks,
+    format_stage_peaks,
+    stage,
+    timed_iter,
+)
 from ._save_gif import save_GIF_to_file
+from ._save_png import save_PNG_to_file
+from ._save_svg import save_SVG_to_file
 from ._settings import get_settings
-
-
-_ANNOTATION_FUNC_NAMES = [
-    "AR",
-    "C",
-    "CR",
-    "DD",
-    "LB",
-    "LN",
-    "MA",
-    "MN",
-    "SL",
-    "SQ",
-    "TR",
-]
-
-
-# saves individual stone graphics used in Sensei's Library.
-def save_stone_graphics(stones_directory: str):
-    GRAPHIC_SIZE = 64
-    MARKS = (("CR", "c.png"), ("SQ", "s.png"), ("TR", "t.png"), ("MA", "x.png"))
-
-    for key, image_extension in MARKS:
-        get_stone_images()[GRAPHIC_SIZE][key].save(
-            os.path.join(stones_directory, "e" + image_extension),
-            format="PNG",
-            compress_level=9,
-        )
-
-    for char, text_color in [
-        ("b", get_settings().NUMBER_COLOR_FOR_BLACK),
-        ("w", get_settings().NUMBER_COLOR_FOR_WHITE),
-    ]:
-        stone_graphic = get_stone_images()[GRAPHIC_SIZE][char.upper()]
-        stone_graphic.save(
-            os.path.join(stones_directory, f"{char}.png"),
-            format="PNG",
-            compress_level=9,
-        )
-
-        for i in range(1, 101):
-            comp = create_cell_text(
-                GRAPHIC_SIZE,
-                str(i),
-                text_color,
-                get_settings().NUMBER_TEXT_SCALE,
-            )
-            image = Image.alpha_composite(stone_graphic, comp)
-            image.save(
-                os.path.join(stones_directory, f"{char}{i}.png"),
-                format="PNG",
-                compress_level=9,
-            )
-
-        for key, image_extension in MARKS:
-            Image.alpha_composite(
-                stone_graphic, get_stone_images()[GRAPHIC_SIZE][key]
-            ).save(
-                os.path.join(stones_directory, char + image_extension),
-                format="PNG",
-                compress_level=9,
-            )
-
-
+from ._sgf_collection import split_SGF_collection
+from ._stone_graphics import save_stone_graphics
+from ._thumbnail import ContactSheetWriter, render_thumbnail, save_contact_sheets
+from ._views import get_view_state, set_view_state, setup_view
+
+# the names that are only imported once they're used, as {<name>: <module>},
+# since asyncio and the HTTP server take a while to import.
+_LAZY_NAMES = {"render_frames": "_async", "render": "_async", "serve": "_server"}
+
+
+def __getattr__(name):
+    module_name = _LAZY_NAMES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+# creates a static and an animated diagram for every .sgf file
+# found in the given <directory>. files are rendered as soon as they're found.
+# if <out_directory> is given, the outputs are written to a tree there
+# which mirrors the tree of <directory>.
+# <n_jobs> is the number of worker processes to render with.
+# if <journal_path> is given, every finished file is recorded there,
+# and files that were already recorded by a previous run are skipped.
+# if <timeout_s> is given, any file that takes longer to render is recorded
+# as failed and skipped, so it can't stall the rest of the job.
+# if <metrics_path> is given, a JSON line of the metrics of every file and of
+# the whole job is appended to it. if <prometheus_path> is given, the metrics
+# of the job so far are kept there in the Prometheus text format.
+# returns a dict of the totals of the job (see <BatchMetrics.get_summary>).
 def process_directory(
     directory: str,
     out_path_addon: str = "",
@@ -94,36 +105,123 @@ def process_directory(
     start_freeze_ms: int = 3000,
     end_freeze_ms: int = 10000,
     number_display_ms: int = 500,
+    recursive: bool = False,
+    include=("*.sgf",),
+    exclude=(),
+    symlinks: str = SYMLINKS_FILES,
+    out_directory: str = None,
+    n_jobs: int = 1,
+    journal_path: str = None,
+    timeout_s: float = None,
+    retry_failed: bool = False,
+    metrics_path: str = None,
+    prometheus_path: str = None,
 ):
-    sgf_paths = find_all_SGF_paths(directory)
-    print(f"there are {len(sgf_paths)} sgf files in {directory}.")
-
-    for path in sgf_paths:
-        success = False
-        get_settings().set_for_animated_diagram()
-        success = save_diagram(
-            path,
-            path[:-4] + out_path_addon + ".gif",
-            frame_delay_ms,
-            start_freeze_ms,
-            end_freeze_ms,
-            number_display_ms,
-        )
-        get_settings().set_for_static_diagram()
-        success = success and save_diagram(
-            path,
-            path[:-4] + out_path_addon + ".png",
-            frame_delay_ms,
-            start_freeze_ms,
-            end_freeze_ms,
-            number_display_ms,
-        )
+    journal = None if journal_path is None else BatchJournal(journal_path)
+    metrics = BatchMetrics(metrics_path, prometheus_path, n_jobs)
+
+    def generate_tasks():
+        for path in iter_SGF_paths(directory, recursive, include, exclude, symlinks):
+            if journal is not None and journal.is_finished(path, retry_failed):
+                metrics.record_skipped()
+                continue
+            yield (
+                path,
+                get_mirrored_out_path(
+                    path, directory, out_directory, out_path_addon, ".gif"
+                ),
+                get_mirrored_out_path(
+                    path, directory, out_directory, out_path_addon, ".png"
+                ),
+                frame_delay_ms,
+                start_freeze_ms,
+                end_freeze_ms,
+                number_display_ms,
+            )
+
+    try:
+        for args, succeeded, result, elapsed in run_tasks(
+            _process_file,
+            generate_tasks(),
+            n_jobs,
+            timeout_s,
+            get_settings(),
+            initializer=load_images,
+        ):
+            path = args[0]
+            task_metrics = None
+            if not succeeded:
+                print(f"{path} failed: {result}")
+            else:
+                task_metrics = result
+                if not result["succeeded"]:
+                    succeeded = False
+                    result = REASON_NOT_RENDERED
+
+            metrics.record(path, succeeded, result, elapsed, task_metrics)
+            if journal is not None:
+                status = STATUS_DONE if succeeded else STATUS_FAILED
+                journal.record(path, status, None if succeeded else result, elapsed)
+    finally:
+        if journal is not None:
+            journal.close()
+        metrics.close()
+
+    summary = metrics.get_summary()
+    print(f"there were {summary['n_files']} sgf files processed in {directory}.")
+    if summary["n_skipped"] > 0:
+        print(f"{summary['n_skipped']} sgf files were already in the journal.")
+    if summary["n_failed"] > 0:
+        print(f"{summary['n_failed']} sgf files could not be fully rendered.")
+    return summary
+
+
+# returns the metrics of rendering the file (see <get_task_metrics>),
+# with "succeeded" set to True if both the animated and static diagram were saved.
+def _process_file(
+    path,
+    gif_path,
+    png_path,
+    frame_delay_ms,
+    start_freeze_ms,
+    end_freeze_ms,
+    number_display_ms,
+):
+    before = get_metric_totals()
+    written_paths = []
+    get_settings().set_for_animated_diagram()
+    if save_diagram(
+        path,
+        gif_path,
+        frame_delay_ms,
+        start_freeze_ms,
+        end_freeze_ms,
+        number_display_ms,
+    ):
+        written_paths.append(gif_path)
+    get_settings().set_for_static_diagram()
+    if len(written_paths) > 0 and save_diagram(
+        path,
+        png_path,
+        frame_delay_ms,
+        start_freeze_ms,
+        end_freeze_ms,
+        number_display_ms,
+    ):
+        written_paths.append(png_path)
 
+    task_metrics = get_task_metrics(before)
+    task_metrics["succeeded"] = len(written_paths) == 2
+    task_metrics["n_written"] = len(written_paths)
+    task_metrics["n_bytes"] = sum(
+        os.path.getsize(out_path) for out_path in written_paths
+    )
+    return task_metrics
 
-def find_all_SGF_paths(directory: str):
-    all_paths = os.listdir(directory)
-    sgf_paths = [os.path.join(directory, p) for p in all_paths if p.endswith(".sgf")]
-    return sgf_paths
+
+# returns a list of the .sgf files in the given <directory>.
+def find_all_SGF_paths(directory: str, recursive: bool = False):
+    return list(iter_SGF_paths(directory, recursive))
 
 
 # returns True if saving the diagram was successful.
@@ -147,137 +245,632 @@ def save_diagram(
         print(f"could not open {sgf_path}.")
         return False
 
-    used_temp_file = False
-    temp_path = sgf_path[:-4] + "-temp.sgf"
+    with stage("read"):
+        content = _read_SGF(sgf_path)
+
+    if out_path.endswith(".svg"):
+        with stage("parse"):
+            game = _parse_content(content)
+        return game is not None and _render_SVG(game, sgf_path, out_path)
+
+    return _render_diagram(
+        content,
+        sgf_path,
+        out_path,
+        save_as_static,
+        frame_delay_ms,
+        start_freeze_ms,
+        end_freeze_ms,
+        number_display_ms,
+    )
+
+
+# returns the text of the SGF file at <sgf_path>.
+# files made by KaTrain are cleaned in memory so they can be read.
+def _read_SGF(sgf_path: str):
+    with open(sgf_path, "r", encoding="utf-8", errors="replace") as file:
+        content = file.read()
+    if is_katrain_content(content):
+        content = clean_katrain_content(content)
+    return content
 
-    def delete_temp_file():
-        # deletes the temporary .sft file if one was created.
-        if used_temp_file:
-            os.remove(temp_path)
 
-    if is_katrain_file(sgf_path):
-        used_temp_file = True
-        create_cleaned_katrain_file(in_path=sgf_path, out_path=temp_path)
-        sgf_path = temp_path
+# returns the bytes of a diagram rendered from the text <content> of an SGF,
+# or None if the diagram couldn't be rendered.
+# <out_format> is either "png", "gif" or "svg".
+# the other parameters are the same as those of <save_diagram>.
+def render_diagram(
+    content: str,
+    out_format: str = "png",
+    frame_delay_ms: int = 1500,
+    start_freeze_ms: int = 3000,
+    end_freeze_ms: int = 10000,
+    number_display_ms: int = 500,
+):
+    _check_out_format(out_format)
+    out_file = io.BytesIO()
+    if out_format == "svg":
+        with stage("parse"):
+            game = _parse_content(content)
+        success = game is not None and _render_SVG(game, None, out_file)
+        return out_file.getvalue() if success else None
+
+    success = _render_diagram(
+        content,
+        None,
+        out_file,
+        out_format == "png",
+        frame_delay_ms,
+        start_freeze_ms,
+        end_freeze_ms,
+        number_display_ms,
+    )
+    return out_file.getvalue() if success else None
+
+
+# returns the bytes of a diagram rendered from a CompiledGame,
+# such as one loaded from a GameArchive, without parsing any SGF text.
+# the other parameters are the same as those of <render_diagram>.
+def render_game(
+    game,
+    out_format: str = "png",
+    frame_delay_ms: int = 1500,
+    start_freeze_ms: int = 3000,
+    end_freeze_ms: int = 10000,
+    number_display_ms: int = 500,
+):
+    _check_out_format(out_format)
+    out_file = io.BytesIO()
+    if out_format == "svg":
+        success = _render_SVG(game, None, out_file)
+        return out_file.getvalue() if success else None
+
+    success = _render_game(
+        game,
+        None,
+        out_file,
+        out_format == "png",
+        frame_delay_ms,
+        start_freeze_ms,
+        end_freeze_ms,
+        number_display_ms,
+    )
+    return out_file.getvalue() if success else None
+
+
+# returns a list of the bytes of a diagram rendered from the text <content>
+# of an SGF at each of the given <sizes>, or None if they couldn't be rendered.
+# a size is either a number of pixels for a square diagram or
+# a (width, height) tuple, which are used in place of MAX_WIDTH and MAX_HEIGHT.
+# the SGF is only parsed and played once for all of the sizes.
+# the other parameters are the same as those of <render_diagram>.
+def render_diagram_sizes(
+    content: str,
+    sizes,
+    out_format: str = "png",
+    frame_delay_ms: int = 1500,
+    start_freeze_ms: int = 3000,
+    end_freeze_ms: int = 10000,
+    number_display_ms: int = 500,
+):
+    _check_out_format(out_format)
+    if out_format == "svg":
+        raise ValueError("an SVG scales to any size, so it only needs one render.")
+    with stage("parse"):
+        game = _parse_content(content)
+    if game is None:
+        return None
+
+    out_files = [io.BytesIO() for _ in sizes]
+    success = _render_views(
+        game,
+        None,
+        out_files,
+        list(sizes),
+        out_format == "png",
+        frame_delay_ms,
+        start_freeze_ms,
+        end_freeze_ms,
+        number_display_ms,
+    )
+    return [out_file.getvalue() for out_file in out_files] if success else None
+
+
+# saves a diagram of the SGF at <sgf_path> at several sizes,
+# where <out_paths> is a dict of {<size>: <out path>}
+# with sizes as described in <render_diagram_sizes>.
+# every out path must be a .gif or none of them can be.
+# returns True if saving every diagram was successful.
+# the other parameters are the same as those of <save_diagram>.
+def save_diagram_sizes(
+    sgf_path: str,
+    out_paths: dict,
+    frame_delay_ms: int = 1500,
+    start_freeze_ms: int = 3000,
+    end_freeze_ms: int = 10000,
+    number_display_ms: int = 500,
+):
+    if any(out_path.endswith(".svg") for out_path in out_paths.values()):
+        raise ValueError("an SVG scales to any size, so it only needs one render.")
+    n_gifs = sum(out_path.endswith(".gif") for out_path in out_paths.values())
+    if 0 < n_gifs < len(out_paths):
+        raise ValueError("out_paths can't mix .gif files with static diagrams.")
+    save_as_static = n_gifs == 0
 
-    with open(sgf_path, "r") as file:
-        content = file.read()
+    if not os.path.exists(sgf_path):
+        print(f"could not open {sgf_path}.")
+        return False
+
+    with stage("read"):
+        content = _read_SGF(sgf_path)
+    with stage("parse"):
+        game = _parse_content(content)
+    if game is None:
+        return False
+
+    return _render_views(
+        game,
+        sgf_path,
+        list(out_paths.values()),
+        list(out_paths.keys()),
+        save_as_static,
+        frame_delay_ms,
+        start_freeze_ms,
+        end_freeze_ms,
+        number_display_ms,
+    )
+
+
+def _check_out_format(out_format):
+    if out_format not in ["png", "gif", "svg"]:
+        raise ValueError(
+            f'out_format must be "png", "gif" or "svg", not {out_format!r}.'
+        )
+
+
+# renders the SGF <content> to <out>, which is a file path or a file object.
+# <sgf_path> is only used for messages and can be None.
+# returns True if saving the diagram was successful.
+def _render_diagram(
+    content,
+    sgf_path,
+    out,
+    save_as_static,
+    frame_delay_ms,
+    start_freeze_ms,
+    end_freeze_ms,
+    number_display_ms,
+):
+    with stage("parse"):
+        game = _parse_content(content)
+    if game is None:
+        return False
+
+    return _render_game(
+        game,
+        sgf_path,
+        out,
+        save_as_static,
+        frame_delay_ms,
+        start_freeze_ms,
+        end_freeze_ms,
+        number_display_ms,
+    )
+
+
+# renders the CompiledGame <game> to <out> in the same way as <_render_diagram>.
+def _render_game(
+    game,
+    sgf_path,
+    out,
+    save_as_static,
+    frame_delay_ms,
+    start_freeze_ms,
+    end_freeze_ms,
+    number_display_ms,
+):
+    return _render_views(
+        game,
+        sgf_path,
+        [out],
+        [None],
+        save_as_static,
+        frame_delay_ms,
+        start_freeze_ms,
+        end_freeze_ms,
+        number_display_ms,
+    )
+
+
+# renders the CompiledGame <game> at every one of the <sizes> to its
+# respective out in <outs> from a single replay of the game.
+# returns True if saving every diagram was successful.
+def _render_views(
+    game,
+    sgf_path,
+    outs,
+    sizes,
+    save_as_static,
+    frame_delay_ms,
+    start_freeze_ms,
+    end_freeze_ms,
+    number_display_ms,
+):
+    name = "the sgf" if sgf_path is None else sgf_path
+    if not _is_worth_rendering(game, save_as_static, name):
+        return False
+
+    view_states = []
+    steps = _iter_view_frames(sgf_path, game, save_as_static, sizes, view_states)
+    steps = timed_iter(steps, "replay")
+    if save_as_static or len(outs) > 1:
+        steps = list(steps)
+    if not save_as_static:
+        nodes_per_frame = _get_nodes_per_frame(
+            game,
+            frame_delay_ms,
+            start_freeze_ms,
+            end_freeze_ms,
+            number_display_ms,
+        )
+
+    # 4) saves the frame(s) of every view to file.
+    # the frames of a single animated view are encoded as they're drawn,
+    # instead of all of them being held at once.
+    for i, out in enumerate(outs):
+        if isinstance(steps, list):
+            set_view_state(view_states[i])
+        frames = (view_frames[i] for view_frames in steps)
+        if save_as_static:
+            frames = list(frames)
+        else:
+            frames = timed_iter(_group_frames(frames, nodes_per_frame), "replay")
+        try:
+            with stage("encode"):
+                _save_frames(
+                    out,
+                    frames,
+                    save_as_static,
+                    frame_delay_ms,
+                    start_freeze_ms,
+                    end_freeze_ms,
+                    number_display_ms,
+                )
+        except:
+            print(f"{name} could not be rendered.")
+            return False
+
+    return True
+
+
+# renders the CompiledGame <game> as an SVG to <out> without rasterizing it.
+# returns True if saving the diagram was successful.
+def _render_SVG(game, sgf_path, out):
+    name = "the sgf" if sgf_path is None else sgf_path
+    if not _is_worth_rendering(game, True, name):
+        return False
+
+    with stage("board"):
+        board = setup_view(sgf_path, game, None, draw_images=False)
+    with stage("replay"):
+        replay = play_static_cells(game, board)
+    try:
+        with stage("encode"):
+            save_SVG_to_file(out, replay, board)
+    except:
+        print(f"{name} could not be rendered.")
+        return False
+
+    return True
+
+
+def _save_frames(
+    out,
+    frames,
+    save_as_static,
+    frame_delay_ms,
+    start_freeze_ms,
+    end_freeze_ms,
+    number_display_ms,
+):
+    if save_as_static:
+        save_PNG_to_file(out, frames[0][0])
+    else:
+        save_GIF_to_file(
+            out,
+            frames,
+            frame_delay_ms,
+            start_freeze_ms,
+            end_freeze_ms,
+            number_display_ms,
+        )
+
+
+# returns the SGF <content> as a CompiledGame,
+# or None if a diagram can't be made from it.
+def _parse_content(content):
+    # 1) determines if the SGF is usable.
     content = content.replace("\n", "").replace("(", "").replace(")", "")
     content = _remove_comments(content)
     node_strings = content.split(";")
 
     if len(node_strings) == 0:
         print("No node strings were found.")
-        return False
+        return None
     while len(node_strings[0]) == 0:
         if len(node_strings) == 1:
             print("Only one node string was found.")
-            return False
+            return None
         node_strings = node_strings[1:]
 
-    command_lists = [_to_commands(node_str) for node_str in node_strings]
-    if len(node_strings) == 1 or (
-        len(node_strings) == 2
-        and not save_as_static
-        and all(
-            [(func_name in _ANNOTATION_FUNC_NAMES) for func_name, _ in command_lists[1]]
-        )
+    return compile_game([_to_commands(node_str) for node_str in node_strings])
+
+
+# returns False if a diagram of the CompiledGame <game> wouldn't show anything.
+def _is_worth_rendering(game, save_as_static, name):
+    if len(game.nodes) == 1 or (
+        len(game.nodes) == 2 and not save_as_static and game.nodes[1].is_annotation_only
     ):
-        print(f"{sgf_path} doesn't need a GIF.")
+        print(f"{name} doesn't need a GIF.")
         return False
+    return True
 
-    # 2) sets all the components up.
-    board = setup_board(sgf_path, command_lists)
-    stones_image = _create_change_image()
-    annotations_image = _create_change_image()
-    play_setup_moves(command_lists, stones_image, annotations_image, board)
 
-    base_image = Image.alpha_composite(get_board_image(), stones_image)
-    base_image.alpha_composite(annotations_image)
-    if get_has_used_line_annotations():
-        base_image.alpha_composite(get_line_annotations_image())
+# yields the frames of the diagram as (<image>, <is extra frame>) tuples,
+# each one as soon as it's been drawn. after the first frame, every frame
+# only contains the cells that changed. a static diagram is yielded
+# as a single frame once all of the nodes have been played.
+def _iter_frames(sgf_path, game, save_as_static):
+    for view_frames in _iter_view_frames(sgf_path, game, save_as_static, [None]):
+        yield view_frames[0]
+
+
+# yields the frames of the diagram at every one of the <sizes> (see <setup_view>)
+# as lists of one (<image>, <is extra frame>) tuple for each view,
+# in the same way as <_iter_frames>. the game is only parsed and played once;
+# each view has its own board images and sprites of its cell size.
+# if <view_states> is given, it's filled with the state of every view,
+# which needs to be made current before a view's frames are encoded.
+def _iter_view_frames(sgf_path, game, save_as_static, sizes, view_states=None):
+    # 2) sets all the components up.
+    # the game is only played on the board of the first view.
+    states = [] if view_states is None else view_states
+    board = None
+    base_images = []
+    stones_images = []
+    annotations_images = []
+    for size in sizes:
+        with stage("board"):
+            view_board = setup_view(sgf_path, game, size)
+        if board is None:
+            board = view_board
+        reset_annotations()
+        stones_images.append(_create_change_image())
+        annotations_images.append(_create_change_image())
+        states.append(get_view_state())
+
+    for op in game.nodes[0].ops:
+        cleared_points = apply_command(op, board)
+        for i, state in enumerate(states):
+            set_view_state(state)
+            draw_command(
+                op, cleared_points, stones_images[i], annotations_images[i], board
+            )
+            states[i] = get_view_state()
+
+    for i, state in enumerate(states):
+        set_view_state(state)
+        finish_setup_moves()
+        base_image = Image.alpha_composite(get_board_image(), stones_images[i])
+        base_image.alpha_composite(annotations_images[i])
+        if get_has_used_line_annotations():
+            base_image.alpha_composite(get_line_annotations_image())
+        base_images.append(base_image)
+        states[i] = get_view_state()
 
     if not save_as_static:
-        frames = []
-        frames.append((base_image, False))
-        stones_image = _create_change_image()
-        annotations_image = _create_change_image()
+        yield [(base_image, False) for base_image in base_images]
+        _reset_change_images(states, stones_images, annotations_images)
 
     # 3) executes the commands contained in every node.
-    for i in range(1, len(node_strings)):
-        commands = command_lists[i]
-
+    for node in game.nodes[1:]:
         # any move number command will always be run first.
-        for j, command in enumerate(commands):
-            function_name, parameters = command
-
-            if function_name == "MN":
-                set_move_num(int(parameters[0]))
-                del commands[j]
-                break
+        if node.move_num is not None:
+            for i, state in enumerate(states):
+                set_view_state(state)
+                set_move_num(node.move_num)
+                states[i] = get_view_state()
 
         # runs the rest of the commands.
-        extra_frame = None
+        extra_frames = [None for _ in states]
         move_was_pass = False
-        for command in commands:
-            command_extra_frame, was_pass = run_command(
-                command, stones_image, annotations_image, board
-            )
-            if command_extra_frame is not None:
-                extra_frame = command_extra_frame
-            if was_pass:
-                move_was_pass = True
-
-        # frame is dropped if set to do so with a passing move
-        # or if the node consisted only of annotative commands.
-        if (move_was_pass and get_settings().MAINTAIN_NUMBERS_AT_END) or (
-            all([(func_name in _ANNOTATION_FUNC_NAMES) for func_name, _ in commands])
-        ):
+        for op in node.ops:
+            cleared_points = apply_command(op, board)
+            for i, state in enumerate(states):
+                set_view_state(state)
+                command_extra_frame, was_pass = draw_command(
+                    op, cleared_points, stones_images[i], annotations_images[i], board
+                )
+                states[i] = get_view_state()
+                if command_extra_frame is not None:
+                    extra_frames[i] = command_extra_frame
+                if was_pass:
+                    move_was_pass = True
+
+        if not is_frame_node(node, move_was_pass):
             continue
 
         if not save_as_static:
-            stones_image.alpha_composite(annotations_image)
-            if get_has_used_line_annotations():
-                stones_image.alpha_composite(get_line_annotations_image())
-            frames.append((stones_image, False))
-
-            if extra_frame is not None:
+            for i, state in enumerate(states):
+                set_view_state(state)
+                _composite_overlays(stones_images[i], annotations_images[i])
+                if extra_frames[i] is not None:
+                    _composite_overlays(extra_frames[i], None)
+            yield [(stones_image, False) for stones_image in stones_images]
+
+            if extra_frames[0] is not None:
                 # the image of the stone w/o annotations
                 # is added after the frame where the move number is shown
                 # in order to make the move number on the stone disappear.
-                if get_has_used_line_annotations():
-                    extra_frame.alpha_composite(get_line_annotations_image())
-                frames.append((extra_frame, True))
+                yield [(extra_frame, True) for extra_frame in extra_frames]
 
-            stones_image = _create_change_image()
-            annotations_image = _create_change_image()
+            _reset_change_images(states, stones_images, annotations_images)
 
-    # 4) saves the frame(s) to file.
-    try:
-        if save_as_static:
-            base_image.alpha_composite(stones_image)
-            base_image.alpha_composite(annotations_image)
+    if save_as_static:
+        view_frames = []
+        for i, state in enumerate(states):
+            set_view_state(state)
+            base_images[i].alpha_composite(stones_images[i])
+            base_images[i].alpha_composite(annotations_images[i])
             if get_has_used_line_annotations():
-                base_image.alpha_composite(get_line_annotations_image())
-
-            base_image = base_image.convert("RGB")
-            base_image.save(out_path, format="PNG", compress_level=9)
+                base_images[i].alpha_composite(get_line_annotations_image())
+            view_frames.append((base_images[i], False))
+        yield view_frames
+
+
+# composites the annotations and lines onto a frame's change <image>.
+# the annotations are only composited within the cells drawn since the last
+# frame and the lines only within their box, since the layers are clear
+# everywhere else. the lines are still composited onto every frame,
+# which keeps the parts of the GIF's frames that don't change the same.
+def _composite_overlays(image, annotations_image):
+    box = get_dirty_box()
+    if annotations_image is not None and box is not None:
+        image.alpha_composite(annotations_image, box[:2], box)
+    if get_has_used_line_annotations():
+        box = get_line_annotations_box()
+        if box is not None:
+            image.alpha_composite(get_line_annotations_image(), box[:2], box)
+
+
+# replaces the change images of every view with clear ones.
+def _reset_change_images(states, stones_images, annotations_images):
+    for i, state in enumerate(states):
+        set_view_state(state)
+        stones_images[i] = _create_change_image()
+        annotations_images[i] = _create_change_image()
+        reset_dirty_box()
+        states[i] = get_view_state()
+
+
+# returns how many nodes need to be shown in each frame of a GIF
+# in order to keep it within the MAX_FRAMES and MAX_DURATION_MS settings.
+# a GIF always shows its first frame and at least one group of nodes after it,
+# so it has at least 2 frames (or 3 if the move numbers disappear)
+# however low MAX_FRAMES is.
+def _get_nodes_per_frame(
+    game,
+    frame_delay_ms,
+    start_freeze_ms,
+    end_freeze_ms,
+    number_display_ms,
+):
+    max_frames = get_settings().MAX_FRAMES
+    max_duration_ms = get_settings().MAX_DURATION_MS
+    if max_frames is None and max_duration_ms is None:
+        return 1
+
+    # counts the nodes that each create a frame.
+    n_frame_nodes = 0
+    for node in game.nodes[1:]:
+        if is_frame_node(node, node.is_pass):
+            n_frame_nodes += 1
+
+    # a node is shown in two frames if the move number disappears after a while.
+    frames_per_node = 1
+    if (
+        get_settings().SHOW_STONE_NUMBERS
+        and not get_settings().MAINTAIN_STONE_NUMBERS
+        and frame_delay_ms > number_display_ms
+    ):
+        frames_per_node = 2
+
+    # determines how many groups of nodes can be shown after the first frame.
+    n_groups = n_frame_nodes
+    if max_frames is not None:
+        n_groups = min(n_groups, (max_frames - 1) // frames_per_node)
+    if max_duration_ms is not None:
+        middle_ms = max_duration_ms - start_freeze_ms - end_freeze_ms
+        n_groups = min(n_groups, middle_ms // max(1, frame_delay_ms) + 1)
+    n_groups = max(1, n_groups)
+
+    return max(1, -(-n_frame_nodes // n_groups))
+
+
+# yields the given frames of a GIF, except that the changes made by every
+# <nodes_per_frame> nodes are combined so that they're shown in one frame.
+# if the SHOW_GROUPED_MOVE_NUMBERS setting is True, that frame shows
+# the move numbers of all its nodes rather than only the last one.
+def _group_frames(frames, nodes_per_frame):
+    frames = iter(frames)
+    if nodes_per_frame <= 1:
+        yield from frames
+        return
+
+    first_frame = next(frames, None)
+    if first_frame is None:
+        return
+    yield first_frame
+
+    # the image that's shown by the GIF is tracked when move numbers are grouped.
+    shown_image = None
+    if get_settings().SHOW_GROUPED_MOVE_NUMBERS:
+        shown_image = first_frame[0].copy()
+
+    # every node is given as a frame with its changes, optionally followed by
+    # an extra frame which makes its move number disappear.
+    nodes = []
+    frame = next(frames, None)
+    while frame is not None:
+        next_frame = next(frames, None)
+        if next_frame is not None and next_frame[1]:
+            nodes.append((frame[0], next_frame[0]))
+            next_frame = next(frames, None)
         else:
-            save_GIF_to_file(
-                out_path,
-                frames,
-                frame_delay_ms,
-                start_freeze_ms,
-                end_freeze_ms,
-                number_display_ms,
-            )
-    except:
-        print(f"{sgf_path} could not be rendered.")
-        delete_temp_file()
-        return False
+            nodes.append((frame[0], None))
+        frame = next_frame
+
+        if len(nodes) == nodes_per_frame or frame is None:
+            yield from _combine_nodes(nodes, shown_image)
+            nodes = []
+
+
+# returns the frame (and extra frame) that show all the changes of <nodes>.
+# <shown_image> is the image shown before the nodes, which is updated
+# when move numbers are grouped.
+def _combine_nodes(nodes, shown_image):
+    group_numbers = get_settings().SHOW_GROUPED_MOVE_NUMBERS
+    combined = nodes[0][0].copy()
+    cleared = nodes[0][0].copy()
+    for i, (node_frame, extra_frame) in enumerate(nodes):
+        if i > 0:
+            combined.alpha_composite(node_frame)
+            cleared.alpha_composite(node_frame)
+        if extra_frame is None:
+            continue
 
-    delete_temp_file()
-    return True
+        cleared.alpha_composite(extra_frame)
+        if i < len(nodes) - 1 and not group_numbers:
+            combined.alpha_composite(extra_frame)
+
+    last_extra_frame = nodes[-1][1]
+    if not group_numbers:
+        if last_extra_frame is None:
+            return [(combined, False)]
+        return [(combined, False), (last_extra_frame, True)]
+
+    # the extra frame replaces every changed pixel with how it looks once
+    # all the move numbers are gone, since any semi-transparent pixels
+    # can't be composited over the numbered frame to get the same result.
+    # it's needed whenever any node showed a move number,
+    # even if the group ends with a pass which didn't.
+    shown_image.alpha_composite(cleared)
+    if all(extra_frame is None for _, extra_frame in nodes):
+        return [(combined, False)]
+    mask = cleared.getchannel("A").point(lambda alpha: 255 if alpha > 0 else 0)
+    extra_frame = Image.new("RGBA", shown_image.size, (0, 0, 0, 0))
+    extra_frame.paste(shown_image, (0, 0), mask)
+    return [(combined, False), (extra_frame, True)]
 
 
 # returns the given string with all comment commands removed.
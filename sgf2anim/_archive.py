@@ -0,0 +1,227 @@
+import mmap
+import struct
+from ._compile import CompiledGame, CompiledNode, Op
+
+# the extension given to archive files.
+ARCHIVE_EXTENSION = ".sgfa"
+
+# an archive begins with a header of:
+#   magic, version, (reserved), number of games, offset of the index.
+# the games are stored one after another, followed by the index,
+# which holds the (offset, length) of every game.
+_MAGIC = b"SGF2ANIM"
+_VERSION = 1
+_HEADER = struct.Struct("<8sHHIQ")
+_INDEX_ENTRY = struct.Struct("<QI")
+
+# a game begins with:
+#   board width, board height, bounds (min x, min y, max x, max y),
+#   number of nodes, length of the name,
+# followed by the name's UTF-8 bytes and every node.
+_GAME_HEADER = struct.Struct("<BB4BIH")
+
+# a node begins with its flags, move number and number of ops.
+_NODE_HEADER = struct.Struct("<BiH")
+_NODE_HAS_MOVE_NUM = 1
+_NODE_IS_ANNOTATION_ONLY = 2
+_NODE_IS_PASS = 4
+
+# an op begins with its code and number of items,
+# followed by its points (two bytes each) or lines (four bytes each).
+# a label op is then followed by every label's length and UTF-8 bytes.
+_OP_HEADER = struct.Struct("<BH")
+_OP_NAMES = ("AB", "AW", "AE", "B", "W", "CR", "DD", "MA", "SL", "SQ", "TR", "LB", "LN")
+_OP_CODES = {name: code for code, name in enumerate(_OP_NAMES)}
+_LABEL_LENGTH = struct.Struct("<H")
+
+
+# writes every game of <named_contents>, an iterable of (<name>, <SGF text>),
+# to a new archive at <archive_path>. games are compiled and written one at
+# a time, so the SGF text of a large collection never needs to be in memory
+# all at once. games that can't be parsed are skipped.
+# returns the number of games that were written.
+def write_archive(archive_path: str, named_contents):
+    from . import _parse_content
+
+    index = []
+    with open(archive_path, "wb") as file:
+        file.write(_HEADER.pack(_MAGIC, _VERSION, 0, 0, 0))
+        offset = _HEADER.size
+        for name, content in named_contents:
+            game = _parse_content(content)
+            if game is None:
+                print(f"{name} could not be archived.")
+                continue
+            data = pack_game(game, name)
+            file.write(data)
+            index.append((offset, len(data)))
+            offset += len(data)
+
+        for entry in index:
+            file.write(_INDEX_ENTRY.pack(*entry))
+        file.seek(0)
+        file.write(_HEADER.pack(_MAGIC, _VERSION, 0, len(index), offset))
+
+    return len(index)
+
+
+# returns the bytes of a CompiledGame with the given <name> in the archive format.
+def pack_game(game, name=""):
+    name_bytes = name.encode("utf-8")
+    parts = [
+        _GAME_HEADER.pack(
+            game.width, game.height, *game.bounds, len(game.nodes), len(name_bytes)
+        ),
+        name_bytes,
+    ]
+    for node in game.nodes:
+        flags = 0
+        if node.move_num is not None:
+            flags |= _NODE_HAS_MOVE_NUM
+        if node.is_annotation_only:
+            flags |= _NODE_IS_ANNOTATION_ONLY
+        if node.is_pass:
+            flags |= _NODE_IS_PASS
+        move_num = 0 if node.move_num is None else node.move_num
+        parts.append(_NODE_HEADER.pack(flags, move_num, len(node.ops)))
+
+        for op in node.ops:
+            if op.name == "LN":
+                items = [
+                    coord for line in op.values for point in line for coord in point
+                ]
+                parts.append(_OP_HEADER.pack(_OP_CODES[op.name], len(op.values)))
+            else:
+                items = [coord for point in op.points for coord in point]
+                parts.append(_OP_HEADER.pack(_OP_CODES[op.name], len(op.points)))
+            parts.append(bytes(items))
+
+            if op.name == "LB":
+                for string in op.values:
+                    string_bytes = string.encode("utf-8")
+                    parts.append(_LABEL_LENGTH.pack(len(string_bytes)))
+                    parts.append(string_bytes)
+
+    return b"".join(parts)
+
+
+# returns (<CompiledGame>, <name>) from the bytes of a game
+# starting at <offset> in <data>.
+def unpack_game(data, offset=0):
+    width, height, *bounds, n_nodes, name_length = _GAME_HEADER.unpack_from(
+        data, offset
+    )
+    offset += _GAME_HEADER.size
+    name = bytes(data[offset : offset + name_length]).decode("utf-8")
+    offset += name_length
+
+    nodes = []
+    for _ in range(n_nodes):
+        flags, move_num, n_ops = _NODE_HEADER.unpack_from(data, offset)
+        offset += _NODE_HEADER.size
+
+        ops = []
+        for _ in range(n_ops):
+            code, n_items = _OP_HEADER.unpack_from(data, offset)
+            offset += _OP_HEADER.size
+            op_name = _OP_NAMES[code]
+
+            if op_name == "LN":
+                coords = data[offset : offset + n_items * 4]
+                offset += n_items * 4
+                values = tuple(
+                    ((coords[i], coords[i + 1]), (coords[i + 2], coords[i + 3]))
+                    for i in range(0, len(coords), 4)
+                )
+                ops.append(Op(op_name, (), values))
+                continue
+
+            coords = data[offset : offset + n_items * 2]
+            offset += n_items * 2
+            points = tuple((coords[i], coords[i + 1]) for i in range(0, len(coords), 2))
+
+            values = None
+            if op_name == "LB":
+                strings = []
+                for _ in range(n_items):
+                    (length,) = _LABEL_LENGTH.unpack_from(data, offset)
+                    offset += _LABEL_LENGTH.size
+                    strings.append(
+                        bytes(data[offset : offset + length]).decode("utf-8")
+                    )
+                    offset += length
+                values = tuple(strings)
+            ops.append(Op(op_name, points, values))
+
+        nodes.append(
+            CompiledNode(
+                tuple(ops),
+                move_num if flags & _NODE_HAS_MOVE_NUM else None,
+                bool(flags & _NODE_IS_ANNOTATION_ONLY),
+                bool(flags & _NODE_IS_PASS),
+            )
+        )
+
+    return CompiledGame(width, height, tuple(bounds), nodes), name
+
+
+# a read-only archive of compiled games.
+# the file is memory-mapped, so opening it is instant no matter its size,
+# and a game is only read once it's requested by its index.
+class GameArchive:
+    def __init__(self, archive_path: str):
+        self._file = open(archive_path, "rb")
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # an empty file can't be mapped.
+            self._file.close()
+            raise ValueError(f"{archive_path} is not an archive of games.")
+
+        if len(self._data) < _HEADER.size:
+            self.close()
+            raise ValueError(f"{archive_path} is not an archive of games.")
+        magic, version, _, n_games, index_offset = _HEADER.unpack_from(self._data)
+        if magic != _MAGIC:
+            self.close()
+            raise ValueError(f"{archive_path} is not an archive of games.")
+        if version != _VERSION:
+            self.close()
+            raise ValueError(f"{archive_path} has unsupported version {version}.")
+        self._n_games = n_games
+        self._index_offset = index_offset
+
+    def __len__(self):
+        return self._n_games
+
+    def __getitem__(self, index):
+        return self.get_game(index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # returns the CompiledGame at <index>.
+    def get_game(self, index):
+        return unpack_game(self._data, self._get_offset(index))[0]
+
+    # returns the name the game at <index> was archived with.
+    def get_name(self, index):
+        offset = self._get_offset(index)
+        name_length = _GAME_HEADER.unpack_from(self._data, offset)[-1]
+        offset += _GAME_HEADER.size
+        return bytes(self._data[offset : offset + name_length]).decode("utf-8")
+
+    def _get_offset(self, index):
+        if index < 0:
+            index += self._n_games
+        if not 0 <= index < self._n_games:
+            raise IndexError("game index out of range.")
+        entry_offset = self._index_offset + index * _INDEX_ENTRY.size
+        return _INDEX_ENTRY.unpack_from(self._data, entry_offset)[0]
+
+    def close(self):
+        self._data.close()
+        self._file.close()
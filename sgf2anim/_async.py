@@ -0,0 +1,150 @@
+import asyncio
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from ._image_resources import load_images
+from ._settings import get_settings
+from ._views import get_view_state, set_view_state
+
+# the maximum number of renders that can be waiting on an executor at once.
+MAX_PENDING_RENDERS = 8
+
+# the rendering modules keep their state in globals,
+# so every render in this process is run on this one thread.
+_render_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sgf2anim")
+_render_limits = weakref.WeakKeyDictionary()
+
+
+# asynchronously yields (<image>, <duration ms>) for every frame of the
+# animated diagram of the given SGF text, as soon as each one is rendered.
+# every yielded image is the complete RGBA frame, not just the cells that changed.
+# rendering pauses whenever <max_buffered_frames> frames are waiting to be used,
+# which leaves the render thread free for other renders in the meantime.
+# the other parameters are the same as those of <save_diagram>.
+async def render_frames(
+    sgf_content: str,
+    frame_delay_ms: int = 1500,
+    start_freeze_ms: int = 3000,
+    end_freeze_ms: int = 10000,
+    number_display_ms: int = 500,
+    max_buffered_frames: int = 4,
+):
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=max(1, max_buffered_frames))
+    timing = (frame_delay_ms, start_freeze_ms, end_freeze_ms, number_display_ms)
+    stream = _FrameStream(sgf_content, timing, get_settings().to_dict())
+
+    async def produce():
+        # each frame is rendered by a call of its own, and waiting for room
+        # in the queue is done here rather than on the render thread.
+        while True:
+            try:
+                item = await loop.run_in_executor(_render_thread, stream.step)
+            except asyncio.CancelledError:
+                raise
+            except BaseException as error:
+                item = error
+            await queue.put(item)
+            if item is None or isinstance(item, BaseException):
+                return
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # stops rendering if the frames stopped being used early.
+        # a frame that's already being rendered is finished and dropped.
+        producer.cancel()
+        try:
+            await producer
+        except asyncio.CancelledError:
+            pass
+
+
+# renders the frames of a <render_frames> stream one at a time.
+# every render in this process shares the render thread, so each step
+# loads the stream's settings and view before it and saves its view after it.
+class _FrameStream:
+    def __init__(self, sgf_content, timing, settings_values):
+        self._sgf_content = sgf_content
+        self._timing = timing
+        self._settings_values = settings_values
+        self._frames = None
+        self._view_state = None
+
+    # returns the next (<image>, <duration ms>) frame, or None after the last one.
+    def step(self):
+        get_settings().load_dict(self._settings_values)
+        if self._frames is None:
+            self._frames = self._iter_frames()
+        else:
+            load_images()
+            set_view_state(self._view_state)
+        try:
+            return next(self._frames, None)
+        finally:
+            self._view_state = get_view_state()
+
+    def _iter_frames(self):
+        from . import _iter_frames, _parse_content, _get_nodes_per_frame, _group_frames
+        from . import _is_worth_rendering
+        from ._save_gif import iter_GIF_frames
+
+        game = _parse_content(self._sgf_content)
+        if game is None or not _is_worth_rendering(game, False, "the sgf"):
+            return
+        frames = _iter_frames(None, game, False)
+        frames = _group_frames(frames, _get_nodes_per_frame(game, *self._timing))
+        canvas = None
+        for frame, duration in iter_GIF_frames(frames, *self._timing):
+            if canvas is None:
+                canvas = frame.copy()
+            else:
+                canvas.alpha_composite(frame)
+            yield canvas.copy(), duration
+
+
+# returns the bytes of the diagram rendered from the given SGF text,
+# or None if it couldn't be rendered. the render is run on <executor>,
+# which is this process's render thread if it's None. a ProcessPoolExecutor
+# can be given in order to render several diagrams in parallel.
+# at most MAX_PENDING_RENDERS renders will wait on an executor at once,
+# and any others will wait here until one of them finishes.
+# the other parameters are the same as those of <render_diagram>.
+async def render(
+    sgf_content: str,
+    out_format: str = "png",
+    frame_delay_ms: int = 1500,
+    start_freeze_ms: int = 3000,
+    end_freeze_ms: int = 10000,
+    number_display_ms: int = 500,
+    executor=None,
+):
+    loop = asyncio.get_running_loop()
+    limit = _render_limits.get(loop)
+    if limit is None:
+        limit = asyncio.Semaphore(MAX_PENDING_RENDERS)
+        _render_limits[loop] = limit
+
+    timing = (frame_delay_ms, start_freeze_ms, end_freeze_ms, number_display_ms)
+    async with limit:
+        return await loop.run_in_executor(
+            _render_thread if executor is None else executor,
+            _render_with_settings,
+            sgf_content,
+            out_format,
+            timing,
+            get_settings().to_dict(),
+        )
+
+
+def _render_with_settings(sgf_content, out_format, timing, settings_values):
+    from . import render_diagram
+
+    get_settings().load_dict(settings_values)
+    return render_diagram(sgf_content, out_format, *timing)
@@ -0,0 +1,267 @@
+import json
+import os
+import time
+import traceback
+
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+REASON_TIMEOUT = "timeout"
+REASON_WORKER_DIED = "worker died"
+REASON_NOT_RENDERED = "not rendered"
+
+# the number of times in a row a worker can fail to start,
+# such as because its initializer raised, before it's given up on.
+MAX_STARTUP_FAILURES = 3
+
+
+# an append-only record of the files a batch job has finished,
+# which allows a job that was stopped to resume where it left off.
+# each line of the file is a JSON object describing one file.
+class BatchJournal:
+    def __init__(self, path):
+        self._path = path
+        self._statuses = {}
+
+        last_line = "\n"
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                for line in file:
+                    last_line = line
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # the last line could be cut off if the job was killed.
+                        continue
+                    self._statuses[entry["path"]] = entry["status"]
+
+        self._file = open(path, "a", encoding="utf-8")
+        if not last_line.endswith("\n"):
+            # ends the cut off line, so the next entry isn't appended to it.
+            self._file.write("\n")
+
+    def get_status(self, path):
+        return self._statuses.get(os.path.abspath(path))
+
+    # returns True if the given file doesn't need to be processed again.
+    def is_finished(self, path, retry_failed=False):
+        status = self.get_status(path)
+        if status == STATUS_FAILED:
+            return not retry_failed
+        return status == STATUS_DONE
+
+    def record(self, path, status, reason=None, elapsed=None):
+        path = os.path.abspath(path)
+        entry = {"path": path, "status": status, "time": round(time.time(), 3)}
+        if reason is not None:
+            entry["reason"] = reason
+        if elapsed is not None:
+            entry["seconds"] = round(elapsed, 3)
+        self._statuses[path] = status
+
+        # every entry is flushed so it survives the job being killed.
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+# runs <func>(*args) for every tuple of <args> in <tasks>,
+# yielding (<args>, <succeeded>, <result or failure reason>, <elapsed seconds>)
+# as each task finishes. tasks are pulled from <tasks> only as needed,
+# so it can be a generator that's still discovering files.
+#
+# if <n_jobs> is 1 and there's no <timeout_s>, the tasks are run in this process.
+# otherwise every task is run in one of <n_jobs> worker processes, and any task
+# that runs longer than <timeout_s> has its worker terminated and replaced.
+# each worker loads the given <settings> and runs <initializer> (if any)
+# before it's given tasks, so warming up doesn't count toward the timeout.
+# a worker that fails to start MAX_STARTUP_FAILURES times in a row isn't
+# started again, and once every worker has failed, the remaining tasks fail
+# with the reason the last worker couldn't start.
+def run_tasks(func, tasks, n_jobs=1, timeout_s=None, settings=None, initializer=None):
+    if n_jobs <= 1 and timeout_s is None:
+        for args in tasks:
+            start_time = time.perf_counter()
+            try:
+                result = func(*args)
+            except Exception as error:
+                yield args, False, _describe_error(error), _since(start_time)
+                continue
+            yield args, True, result, _since(start_time)
+        return
+
+    # multiprocessing is only imported once workers are needed.
+    from multiprocessing.connection import wait
+
+    settings_values = None if settings is None else settings.to_dict()
+    workers = [_Worker(settings_values, initializer) for _ in range(max(1, n_jobs))]
+    tasks = iter(tasks)
+    has_more_tasks = True
+    try:
+        while True:
+            if all(worker.is_dead for worker in workers):
+                reason = workers[-1].startup_error
+                for args in tasks:
+                    yield args, False, reason, 0.0
+                return
+
+            # gives every idle worker a new task.
+            for worker in workers:
+                if worker.is_idle() and has_more_tasks:
+                    args = next(tasks, None)
+                    if args is None:
+                        has_more_tasks = False
+                    else:
+                        worker.start_task(func, args)
+
+            active_workers = [
+                worker
+                for worker in workers
+                if not worker.is_dead
+                and (not worker.is_ready or worker.task is not None)
+            ]
+            if not has_more_tasks and all(worker.task is None for worker in workers):
+                return
+
+            wait_s = None
+            busy_workers = [worker for worker in workers if worker.task is not None]
+            if timeout_s is not None and len(busy_workers) > 0:
+                now = time.perf_counter()
+                earliest_start = min(worker.start_time for worker in busy_workers)
+                wait_s = max(0, earliest_start + timeout_s - now)
+            ready = wait([worker.connection for worker in active_workers], wait_s)
+
+            for worker in active_workers:
+                args = worker.task
+                if worker.connection in ready:
+                    try:
+                        message = worker.connection.recv()
+                    except (EOFError, OSError):
+                        # the worker process crashed.
+                        if not worker.is_ready:
+                            worker.fail_startup(REASON_WORKER_DIED)
+                            continue
+                        worker.restart()
+                        if args is not None:
+                            elapsed = _since(worker.start_time)
+                            yield args, False, REASON_WORKER_DIED, elapsed
+                        continue
+                    if not worker.is_ready:
+                        # the worker sends None once it's ready,
+                        # or why it couldn't start.
+                        if message is None:
+                            worker.is_ready = True
+                            worker.n_startup_failures = 0
+                        else:
+                            worker.fail_startup(message)
+                        continue
+                    elapsed = _since(worker.start_time)
+                    worker.task = None
+                    succeeded, result = message
+                    yield args, succeeded, result, elapsed
+
+                elif args is not None and timeout_s is not None:
+                    elapsed = _since(worker.start_time)
+                    if elapsed >= timeout_s:
+                        worker.restart()
+                        yield args, False, REASON_TIMEOUT, elapsed
+    finally:
+        for worker in workers:
+            worker.stop()
+
+
+# a worker process that runs one task at a time, sent through a pipe.
+class _Worker:
+    def __init__(self, settings_values, initializer):
+        self._settings_values = settings_values
+        self._initializer = initializer
+        self.task = None
+        self.start_time = None
+        self.n_startup_failures = 0
+        self.startup_error = None
+        self.is_dead = False
+        self._start_process()
+
+    def _start_process(self):
+        import multiprocessing
+
+        self.is_ready = False
+        self.connection, child_connection = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=_worker_loop,
+            args=(child_connection, self._settings_values, self._initializer),
+            daemon=True,
+        )
+        self._process.start()
+        child_connection.close()
+
+    def is_idle(self):
+        return self.is_ready and self.task is None
+
+    def start_task(self, func, args):
+        self.task = args
+        self.start_time = time.perf_counter()
+        self.connection.send((func, args))
+
+    # records that the worker process failed before it was ready because of
+    # <reason>, and starts it again unless it has failed MAX_STARTUP_FAILURES
+    # times in a row.
+    def fail_startup(self, reason):
+        self.n_startup_failures += 1
+        self.startup_error = reason
+        if self.n_startup_failures < MAX_STARTUP_FAILURES:
+            self.restart()
+        else:
+            self.stop()
+            self.is_dead = True
+
+    # replaces the worker process with a new one.
+    def restart(self):
+        self.stop()
+        self.task = None
+        self._start_process()
+
+    def stop(self):
+        if self._process.is_alive():
+            self._process.terminate()
+        self._process.join()
+        self.connection.close()
+
+
+def _worker_loop(connection, settings_values, initializer):
+    from ._settings import get_settings
+
+    try:
+        if settings_values is not None:
+            get_settings().load_dict(settings_values)
+        if initializer is not None:
+            initializer()
+    except Exception as error:
+        traceback.print_exc()
+        connection.send(_describe_error(error))
+        return
+    connection.send(None)  # tells the batch that the worker is ready.
+
+    while True:
+        try:
+            func, args = connection.recv()
+        except EOFError:
+            return
+        if settings_values is not None:
+            get_settings().load_dict(settings_values)
+        try:
+            message = (True, func(*args))
+        except Exception as error:
+            traceback.print_exc()
+            message = (False, _describe_error(error))
+        connection.send(message)
+
+
+def _describe_error(error):
+    return f"{type(error).__name__}: {error}"
+
+
+def _since(start_time):
+    return time.perf_counter() - start_time
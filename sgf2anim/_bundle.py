@@ -0,0 +1,315 @@
+import json
+import math
+import os
+from PIL import Image
+from ._cells import LABEL_PREFIX, CellReplay, get_line_pixels
+from ._compile import is_frame_node
+from ._image_resources import (
+    get_board_image,
+    get_board_image_no_lines,
+    get_cell_size,
+    get_draw_cell_size,
+    get_scaled_margin,
+    get_show_height,
+    get_show_width,
+    get_stone_images,
+)
+from ._image_text import create_cell_text
+from ._profile import stage
+from ._save_gif import iter_timed_frames
+from ._save_png import encode_PNG
+from ._settings import get_settings
+from ._views import setup_view
+
+BUNDLE_VERSION = 1
+BOARD_NAME = "board.png"
+BOARD_NO_LINES_NAME = "board-no-lines.png"
+ATLAS_NAME = "atlas.png"
+SCRIPT_NAME = "script.json"
+
+
+# saves a bundle that lets a browser animate the diagram of the SGF at
+# <sgf_path> itself to <out_directory>, instead of playing a rasterized GIF.
+# the bundle holds the board (board.png), the board without its lines
+# (board-no-lines.png), every sprite the game uses (atlas.png)
+# and the script of every step of the animation (script.json).
+# the parameters are the same as those of <save_diagram>.
+# returns True if saving the bundle was successful.
+def save_playback_bundle(
+    sgf_path: str,
+    out_directory: str,
+    frame_delay_ms: int = 1500,
+    start_freeze_ms: int = 3000,
+    end_freeze_ms: int = 10000,
+    number_display_ms: int = 500,
+):
+    from . import _read_SGF
+
+    if not os.path.exists(sgf_path):
+        print(f"could not open {sgf_path}.")
+        return False
+    with stage("read"):
+        content = _read_SGF(sgf_path)
+
+    files = _render_bundle(
+        content,
+        sgf_path,
+        frame_delay_ms,
+        start_freeze_ms,
+        end_freeze_ms,
+        number_display_ms,
+    )
+    if files is None:
+        return False
+
+    os.makedirs(out_directory, exist_ok=True)
+    with stage("write"):
+        for name, data in files.items():
+            with open(os.path.join(out_directory, name), "wb") as file:
+                file.write(data)
+    return True
+
+
+# returns the files of a playback bundle as {<file name>: <bytes>}
+# from the text <content> of an SGF, or None if it couldn't be made.
+# the other parameters are the same as those of <save_playback_bundle>.
+def render_playback_bundle(
+    content: str,
+    frame_delay_ms: int = 1500,
+    start_freeze_ms: int = 3000,
+    end_freeze_ms: int = 10000,
+    number_display_ms: int = 500,
+):
+    return _render_bundle(
+        content,
+        None,
+        frame_delay_ms,
+        start_freeze_ms,
+        end_freeze_ms,
+        number_display_ms,
+    )
+
+
+def _render_bundle(
+    content,
+    sgf_path,
+    frame_delay_ms,
+    start_freeze_ms,
+    end_freeze_ms,
+    number_display_ms,
+):
+    from . import _parse_content, _is_worth_rendering
+
+    name = "the sgf" if sgf_path is None else sgf_path
+    with stage("parse"):
+        game = _parse_content(content)
+    if game is None or not _is_worth_rendering(game, False, name):
+        return None
+
+    with stage("board"):
+        board = setup_view(sgf_path, game, None)
+    with stage("replay"):
+        steps = _time_steps(
+            _iter_steps(game, board),
+            frame_delay_ms,
+            start_freeze_ms,
+            end_freeze_ms,
+            number_display_ms,
+        )
+        script = _create_script(steps)
+        sprite_names = sorted(
+            {name for step in steps for cell in step[0].values() for name in cell}
+            - {None}
+        )
+        atlas, script["sprites"] = _create_atlas(sprite_names)
+
+    with stage("encode"):
+        return {
+            BOARD_NAME: encode_PNG(get_board_image()),
+            BOARD_NO_LINES_NAME: encode_PNG(get_board_image_no_lines()),
+            ATLAS_NAME: encode_PNG(atlas),
+            SCRIPT_NAME: json.dumps(script, separators=(",", ":")).encode("utf-8"),
+        }
+
+
+# yields every step of the animation as ((<cells>, <lines>), <is extra step>),
+# where <cells> is {(<column>, <row>): (<stone>, <overlay>)} of the cells that
+# changed and <lines> is every line that was added, in the same way as
+# the frames that are yielded by <_iter_frames>.
+def _iter_steps(game, board):
+    replay = CellReplay(board)
+    for op in game.nodes[0].ops:
+        replay.run(op)
+    # lines of the setup node aren't drawn, as with the diagrams.
+    replay.lines = []
+    yield (_name_sprites(replay.get_cells()), []), False
+    replay.stones, replay.annotations = {}, {}
+
+    for node in game.nodes[1:]:
+        if node.move_num is not None:
+            replay.move_num = node.move_num
+        extra_step = None
+        move_was_pass = False
+        for op in node.ops:
+            op_extra_step, was_pass = replay.run(op)
+            if op_extra_step is not None:
+                extra_step = op_extra_step
+            if was_pass:
+                move_was_pass = True
+
+        if not is_frame_node(node, move_was_pass):
+            continue
+
+        yield (_name_sprites(replay.get_cells()), replay.lines), False
+        if extra_step is not None:
+            yield (_name_sprites(extra_step), []), True
+        replay.stones, replay.annotations, replay.lines = {}, {}, []
+
+
+# returns the steps as a list of [<cells>, <lines>, <duration ms>],
+# timed by <iter_timed_frames> in the same way as the frames of a GIF.
+# steps that don't change anything are merged into the step before them.
+def _time_steps(
+    steps, frame_delay_ms, start_freeze_ms, end_freeze_ms, number_display_ms
+):
+    settings = get_settings()
+    timed_steps = iter_timed_frames(
+        steps,
+        frame_delay_ms,
+        start_freeze_ms,
+        end_freeze_ms,
+        number_display_ms,
+        combine=_combine_steps,
+    )
+
+    # drops the cells that already show the same thing.
+    shown = {}
+    merged_steps = []
+    for (cells, lines), duration in timed_steps:
+        cells = {
+            cell: value
+            for cell, value in cells.items()
+            if shown.get(cell, (None, None)) != value
+        }
+        shown.update(cells)
+        if (
+            settings.MERGE_DUPLICATE_FRAMES
+            and len(merged_steps) > 0
+            and len(cells) == 0
+            and len(lines) == 0
+        ):
+            merged_steps[-1][2] += duration
+            continue
+        merged_steps.append([cells, lines, duration])
+    return merged_steps
+
+
+# returns the given {<cell>: (<stone>, <overlay>)} with every overlay that's
+# drawn on a stone named after that stone too, such as "B+B12". its sprite
+# is the stone with the overlay on it, as the annotations of a GIF draw it,
+# so the stone is drawn twice in the same way as in the GIF's frames.
+def _name_sprites(cells):
+    return {
+        cell: (
+            stone,
+            overlay if stone is None or overlay is None else f"{stone}+{overlay}",
+        )
+        for cell, (stone, overlay) in cells.items()
+    }
+
+
+# returns the (<cells>, <lines>) step that shows the cells of <extra_step>
+# under those of <step>, for an extra step that isn't shown on its own.
+def _combine_steps(extra_step, step):
+    return {**extra_step[0], **step[0]}, step[1]
+
+
+# returns the contents of script.json, without its sprites.
+def _create_script(steps):
+    settings = get_settings()
+    cell_size = get_cell_size()
+    offset = cell_size - get_draw_cell_size()
+    # the same square as <_create_label_background>, which is placed
+    # before its size is rounded down.
+    label_background_size = cell_size * settings.LABEL_TEXT_SCALE * 1.15
+    label_background_start = int(cell_size / 2 - label_background_size / 2)
+    label_background_size = int(label_background_size)
+    return {
+        "version": BUNDLE_VERSION,
+        "width": get_board_image().width,
+        "height": get_board_image().height,
+        "margin": get_scaled_margin(),
+        "cell_size": cell_size,
+        "sprite_offset": offset,
+        "columns": get_show_width(),
+        "rows": get_show_height(),
+        "label_background": [
+            label_background_start + offset,
+            label_background_start + offset,
+            label_background_size,
+        ],
+        "line_color": list(settings.ANNOTATE_LINE_COLOR),
+        "line_width": int(settings.ANNOTATE_LINE_THICKNESS + cell_size * 0.03),
+        "steps": [
+            {
+                "ms": duration,
+                "cells": [
+                    [column, row, stone, overlay]
+                    for (column, row), (stone, overlay) in sorted(cells.items())
+                ],
+                "lines": [get_line_pixels(line) for line in lines],
+            }
+            for cells, lines, duration in steps
+        ],
+    }
+
+
+# returns an image of every sprite with the given names
+# and a dict of {<name>: [x, y, width, height]} of where each one is.
+def _create_atlas(sprite_names):
+    size = get_draw_cell_size()
+    n_columns = max(1, math.ceil(math.sqrt(len(sprite_names))))
+    n_rows = max(1, math.ceil(len(sprite_names) / n_columns))
+    atlas = Image.new("RGBA", (n_columns * size, n_rows * size), (0, 0, 0, 0))
+    index = {}
+    for i, name in enumerate(sprite_names):
+        x = (i % n_columns) * size
+        y = (i // n_columns) * size
+        atlas.paste(_create_sprite(name), (x, y))
+        index[name] = [x, y, size, size]
+    return atlas, index
+
+
+def _create_sprite(name):
+    settings = get_settings()
+    size = get_draw_cell_size()
+    if name in get_stone_images()[size]:
+        return get_stone_images()[size][name]
+    if name[1:2] == "+":
+        # an overlay on a stone, such as "B+B12".
+        sprite = get_stone_images()[size][name[0]].copy()
+        sprite.alpha_composite(_create_sprite(name[2:]))
+        return sprite
+    if name == "marker":
+        return create_cell_text(
+            size, "0", settings.PLACEMENT_MARKER_COLOR, settings.NUMBER_TEXT_SCALE
+        )
+    if name.startswith(LABEL_PREFIX):
+        return create_cell_text(
+            size,
+            name[len(LABEL_PREFIX) :],
+            settings.LABEL_COLOR,
+            settings.LABEL_TEXT_SCALE,
+        )
+
+    # a move number, such as "B12".
+    move_num_str = name[1:]
+    color_for_black = settings.NUMBER_COLOR_FOR_BLACK
+    color_for_white = settings.NUMBER_COLOR_FOR_WHITE
+    return create_cell_text(
+        size,
+        move_num_str,
+        color_for_black if name[0] == "B" else color_for_white,
+        settings.NUMBER_TEXT_SCALE
+        + (len(move_num_str) - 1) * settings.DIGIT_TEXT_SCALE_FACTOR,
+    )
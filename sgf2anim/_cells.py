@@ -0,0 +1,127 @@
+from .weiqi_board import BLACK_NUM, WHITE_NUM
+from ._commands import apply_command
+from ._image_resources import get_board_start_point, get_cell_size, get_scaled_margin
+from ._settings import get_settings
+
+MARKUP_NAMES = ("CR", "DD", "MA", "SL", "SQ", "TR")
+
+# the start of the overlay name of a label, such as "label-a".
+LABEL_PREFIX = "label-"
+
+
+# plays a game in the same way as the commands that draw its frames,
+# but only keeps track of what each cell shows: a (<stone>, <overlay>) tuple
+# of the names of the sprites drawn over the board, either of which can be None.
+class CellReplay:
+    def __init__(self, board):
+        self.board = board
+        self.stones = {}  # the cells drawn over since the last frame.
+        self.annotations = {}  # drawn over the stones.
+        self.lines = []  # the lines drawn since the last frame.
+        self.move_num = 1
+        self._names = {}  # {<cell>: <function name>} of every annotated cell.
+        self._start_x, self._start_y = get_board_start_point()
+
+    # runs a compiled Op, returning an extra step (if any)
+    # and a boolean which states if the move was a pass.
+    def run(self, op):
+        cleared_points = apply_command(op, self.board)
+        settings = get_settings()
+        if op.name in ["AB", "AW"]:
+            self._paste_stones(op.name[1], op.points)
+        elif op.name == "AE":
+            self._clear(self.stones, op.points)
+            self._clear(self.annotations, op.points)
+        elif op.name in ["B", "W"]:
+            if len(op.points) == 0:
+                return None, True
+            if settings.RENDER_CAPTURES:
+                self._clear(self.stones, cleared_points)
+                self._clear(self.annotations, cleared_points)
+            self._paste_stones(op.name, op.points)
+
+            extra_step = None
+            if settings.SHOW_STONE_NUMBERS:
+                if not settings.MAINTAIN_STONE_NUMBERS:
+                    extra_step = {**self.stones, **self.annotations}
+                if settings.MARKER_INSTEAD_OF_NUMBERS:
+                    overlay = "marker"
+                else:
+                    overlay = f"{op.name}{self.move_num}"
+                self._paste_annotation(op.name, overlay, op.points)
+            self.move_num += 1
+            return extra_step, False
+        elif op.name in MARKUP_NAMES:
+            if len(op.points) == 0 and op.name in ["DD", "SL"]:
+                points = [
+                    (cell[0] + self._start_x, cell[1] + self._start_y)
+                    for cell, name in self._names.items()
+                    if name == op.name
+                ]
+                self._clear(self.annotations, points)
+            else:
+                self._paste_annotation(op.name, op.name, op.points)
+        elif op.name == "LB":
+            for point, string in zip(op.points, op.values):
+                self._paste_annotation("LB", LABEL_PREFIX + string, [point])
+        elif op.name == "LN":
+            self.lines.extend(op.values)
+        return None, False
+
+    def _get_cell(self, point):
+        return (point[0] - self._start_x, point[1] - self._start_y)
+
+    def _paste_stones(self, stone, points):
+        for point in points:
+            cell = self._get_cell(point)
+            self._names[cell] = None
+            self.stones[cell] = (stone, None)
+
+    def _clear(self, layer, points):
+        for point in points:
+            cell = self._get_cell(point)
+            self._names[cell] = None
+            layer[cell] = (None, None)
+
+    def _paste_annotation(self, function_name, overlay, points):
+        for point in points:
+            cell = self._get_cell(point)
+            if self._names.get(cell) == function_name:
+                continue
+            self._names[cell] = function_name
+            stone = {BLACK_NUM: "B", WHITE_NUM: "W"}.get(
+                self.board.get_player_num(point)
+            )
+            self.annotations[cell] = (stone, overlay)
+
+    # returns {<cell>: (<stone>, <overlay>)} of every cell drawn over
+    # since the last frame, with the annotations over the stones.
+    def get_cells(self):
+        return {**self.stones, **self.annotations}
+
+
+# plays every node of <game> on the <board> without resetting anything,
+# returning the CellReplay of what the static diagram shows.
+def play_static_cells(game, board):
+    replay = CellReplay(board)
+    for op in game.nodes[0].ops:
+        replay.run(op)
+    # lines of the setup node aren't drawn, as with the diagrams.
+    replay.lines = []
+    for node in game.nodes[1:]:
+        if node.move_num is not None:
+            replay.move_num = node.move_num
+        for op in node.ops:
+            replay.run(op)
+    return replay
+
+
+# returns the pixel coordinates [x1, y1, x2, y2] of the centers of the cells
+# at both ends of a line.
+def get_line_pixels(line):
+    start_x, start_y = get_board_start_point()
+    pixels = []
+    for x, y in line:
+        pixels.append(int(get_scaled_margin() + (x - start_x + 0.5) * get_cell_size()))
+        pixels.append(int(get_scaled_margin() + (y - start_y + 0.5) * get_cell_size()))
+    return pixels
@@ -0,0 +1,485 @@
+import argparse
+import os
+import shutil
+import sys
+from PIL import Image
+from ._archive import ARCHIVE_EXTENSION, GameArchive, write_archive
+from ._batch import BatchJournal, STATUS_DONE, STATUS_FAILED, run_tasks
+from ._find_paths import SYMLINKS_FILES, iter_SGF_paths, get_mirrored_out_path
+from ._image_resources import load_images
+from ._image_text import RESAMPLE_FILTERS
+from ._metrics import BatchMetrics, get_metric_totals, get_task_metrics
+from ._profile import (
+    add_stage_peaks,
+    format_stage_peaks,
+    format_stage_times,
+    get_stage_peaks,
+    stage,
+    start_memory_trace,
+)
+from ._settings import get_settings
+from ._thumbnail import ContactSheetWriter, encode_thumbnail, render_thumbnail
+
+_FORMATS = ("png", "gif", "svg", "thumb")
+_DEFAULT_FORMATS = ("png", "gif")
+_EXTENSIONS = {"png": "png", "gif": "gif", "svg": "svg", "thumb": "thumb.png"}
+
+
+def main(argv=None):
+    args = _create_parser().parse_args(argv)
+    settings = get_settings()
+    if args.style is not None:
+        settings.STYLE_NAME = args.style
+    if args.max_size is not None:
+        settings.MAX_WIDTH = args.max_size
+        settings.MAX_HEIGHT = args.max_size
+    if args.memory_budget_mb is not None:
+        settings.MEMORY_BUDGET_MB = args.memory_budget_mb
+    if args.quality is not None:
+        settings.RENDER_QUALITY = args.quality
+    if args.pack is not None:
+        n_games = write_archive(args.pack, _iter_named_contents(args))
+        print(f"{n_games} games were written to {args.pack}.")
+        return 0
+
+    formats = args.formats if args.formats else list(_DEFAULT_FORMATS)
+    timing = (
+        args.frame_delay_ms,
+        args.start_freeze_ms,
+        args.end_freeze_ms,
+        args.number_display_ms,
+    )
+    options = (
+        formats,
+        timing,
+        args.cache_dir,
+        args.incremental,
+        args.thumbnail_size,
+        args.trace_memory,
+    )
+    contact_sheet = None
+    if args.contact_sheet is not None:
+        # thumbnails are sent back to be packed instead of being saved.
+        options = (["sheet"],) + options[1:]
+        contact_sheet = ContactSheetWriter(args.contact_sheet, args.thumbnail_size)
+
+    def generate_tasks():
+        for path, in_directory in _iter_input_paths(args):
+            if path.endswith(ARCHIVE_EXTENSION):
+                yield from _iter_archive_tasks(path, args, options, journal, metrics)
+                continue
+            if journal is not None and journal.is_finished(path, args.retry_failed):
+                metrics.record_skipped()
+                continue
+            out_directory = args.out_dir
+            if out_directory is not None and in_directory is None:
+                in_directory = os.path.dirname(path)
+            out_stem = get_mirrored_out_path(
+                path, in_directory, out_directory, args.addon, ""
+            )
+            yield path, out_stem, options
+
+    journal = None if args.journal is None else BatchJournal(args.journal)
+    metrics = BatchMetrics(args.metrics, args.prometheus_textfile, args.jobs)
+    stage_peaks = {}
+    n_up_to_date = 0
+    try:
+        for task, succeeded, result, elapsed in run_tasks(
+            render_file,
+            generate_tasks(),
+            args.jobs,
+            args.timeout,
+            settings,
+            initializer=load_images,
+        ):
+            path = _get_task_name(task[0], task[3] if len(task) > 3 else None)
+            task_metrics = None
+            if succeeded:
+                task_metrics = result
+                add_stage_peaks(stage_peaks, result["peaks"])
+                n_up_to_date += result["n_up_to_date"]
+                for name, size, pixels in result.get("thumbnails", []):
+                    image = Image.frombytes("RGB", size, pixels)
+                    contact_sheet.add(name, image)
+                if result["n_failed"] > 0:
+                    succeeded = False
+                    result = f"{result['n_failed']} diagrams not rendered"
+            if not succeeded:
+                print(f"{path} failed: {result}", file=sys.stderr)
+            metrics.record(path, succeeded, result, elapsed, task_metrics)
+            if journal is not None:
+                status = STATUS_DONE if succeeded else STATUS_FAILED
+                journal.record(path, status, None if succeeded else result, elapsed)
+    finally:
+        if journal is not None:
+            journal.close()
+        if contact_sheet is not None:
+            contact_sheet.close()
+        metrics.close()
+    summary = metrics.get_summary()
+    n_files = summary["n_files"]
+    n_failed = summary["n_failed"]
+    n_written = summary["n_written"]
+    wall_seconds = summary["seconds"]
+
+    print(
+        f"{n_files} sgf files: {n_written} diagrams written, "
+        f"{summary['n_cached']} from the cache, {n_up_to_date} already up to date, "
+        f"{n_failed} files failed, {summary['n_skipped']} already in the journal."
+    )
+    if contact_sheet is not None:
+        n_sheets = len(contact_sheet.sheet_paths)
+        games_per_second = n_written / wall_seconds if wall_seconds > 0 else 0
+        print(
+            f"{n_written} thumbnails were saved to {n_sheets} contact sheets "
+            f"({games_per_second:.1f} games per second)."
+        )
+    if args.profile:
+        print(format_stage_times(summary["stage_seconds"], n_files, wall_seconds))
+    if args.trace_memory:
+        print(format_stage_peaks(stage_peaks))
+    return 1 if n_failed > 0 else 0
+
+
+# renders every game in the SGF file at <path> in every requested format,
+# saving each one to <out_stem> plus the format's extension.
+# the games of a collection file are numbered, such as "<out_stem>-2.png".
+# if <game_index> is given, <path> is an archive and only that game is rendered.
+# returns a dict of counts, the bytes written, the metrics of rendering
+# (see <get_task_metrics>) and, if memory is traced,
+# the peak memory of every stage so far in this process.
+def render_file(path, out_stem, options, game_index=None):
+    from . import render_diagram, render_game
+
+    formats, timing, cache_dir, incremental, thumbnail_size, trace_memory = options
+    if trace_memory:
+        start_memory_trace()
+    before = get_metric_totals()
+    counts = {"n_written": 0, "n_cached": 0, "n_up_to_date": 0, "n_failed": 0}
+    counts["n_bytes"] = 0
+    counts["thumbnails"] = []
+    sgf_mtime = os.path.getmtime(path)
+
+    games = None
+    for out_format in formats:
+        if out_format in ["png", "svg"]:
+            get_settings().set_for_static_diagram()
+        elif out_format == "gif":
+            get_settings().set_for_animated_diagram()
+
+        if out_format == "sheet":
+            if games is None:
+                with stage("read"):
+                    games = _read_games(path, game_index)
+            for i, content in enumerate(games):
+                image = render_thumbnail(content, thumbnail_size)
+                if image is None:
+                    counts["n_failed"] += 1
+                    continue
+                name = _get_task_name(path, game_index)
+                if len(games) > 1:
+                    name = f"{name}-{i + 1}"
+                counts["thumbnails"].append((name, image.size, image.tobytes()))
+                counts["n_written"] += 1
+            continue
+
+        n_games = 1 if games is None else len(games)
+        out_paths = _get_game_out_paths(out_stem, out_format, n_games)
+        if incremental and _are_up_to_date(out_paths, sgf_mtime):
+            counts["n_up_to_date"] += len(out_paths)
+            continue
+
+        if games is None:
+            with stage("read"):
+                games = _read_games(path, game_index)
+            out_paths = _get_game_out_paths(out_stem, out_format, len(games))
+
+        for content, out_path in zip(games, out_paths):
+            if incremental and _are_up_to_date([out_path], sgf_mtime):
+                counts["n_up_to_date"] += 1
+                continue
+
+            cache_path = None
+            if cache_dir is not None and isinstance(content, str):
+                cache_format = out_format
+                if out_format == "thumb":
+                    cache_format = f"thumb{thumbnail_size}"
+                cache_path = _get_cache_path(cache_dir, content, cache_format, timing)
+                if os.path.exists(cache_path):
+                    with stage("write"):
+                        shutil.copyfile(cache_path, out_path)
+                    counts["n_cached"] += 1
+                    counts["n_bytes"] += os.path.getsize(out_path)
+                    continue
+
+            if out_format == "thumb":
+                image = render_thumbnail(content, thumbnail_size)
+                data = None if image is None else encode_thumbnail(image)
+            elif isinstance(content, str):
+                data = render_diagram(content, out_format, *timing)
+            else:
+                data = render_game(content, out_format, *timing)
+            if data is None:
+                counts["n_failed"] += 1
+                continue
+            with stage("write"):
+                with open(out_path, "wb") as file:
+                    file.write(data)
+                if cache_path is not None:
+                    _write_cache_file(cache_path, data)
+            counts["n_written"] += 1
+            counts["n_bytes"] += len(data)
+
+    counts.update(get_task_metrics(before))
+    counts["peaks"] = get_stage_peaks()
+    return counts
+
+
+# returns the games of the SGF file at <path>,
+# or only the game at <game_index> if <path> is an archive.
+def _read_games(path, game_index):
+    from . import _read_SGF
+    from ._sgf_collection import split_SGF_collection
+
+    if game_index is None:
+        return split_SGF_collection(_read_SGF(path))
+    return [_open_archive(path).get_game(game_index)]
+
+
+# yields (<sgf path>, <directory it was found in, or None>)
+# for every file given on the command line and every file in its directories.
+def _iter_input_paths(args):
+    include = args.include if args.include else ["*.sgf"]
+    exclude = args.exclude if args.exclude else []
+    for path in args.paths:
+        if os.path.isdir(path):
+            for sgf_path in iter_SGF_paths(
+                path, args.recursive, include, exclude, SYMLINKS_FILES
+            ):
+                yield sgf_path, path
+        elif os.path.exists(path):
+            yield path, None
+        else:
+            print(f"could not open {path}.", file=sys.stderr)
+
+
+# yields a task for every game in the archive at <path>. each game is saved
+# under the name it was archived with, in the archive's directory
+# (or the --out-dir). games the <journal> has finished are recorded as skipped.
+def _iter_archive_tasks(path, args, options, journal, metrics):
+    archive = _open_archive(path)
+    out_directory = args.out_dir
+    if out_directory is None:
+        out_directory = os.path.dirname(path)
+    for game_index in range(len(archive)):
+        if journal is not None and journal.is_finished(
+            _get_task_name(path, game_index), args.retry_failed
+        ):
+            metrics.record_skipped()
+            continue
+        out_stem = os.path.join(out_directory, archive.get_name(game_index))
+        os.makedirs(os.path.dirname(out_stem) or ".", exist_ok=True)
+        yield path, out_stem + args.addon, options, game_index
+
+
+# returns the name a task is reported and journaled under.
+def _get_task_name(path, game_index=None):
+    if game_index is None:
+        return path
+    return f"{path}#{game_index + 1}"
+
+
+# archives are kept open, since every task of an archive reads from it.
+_open_archives = {}
+
+
+def _open_archive(path):
+    archive = _open_archives.get(path)
+    if archive is None:
+        archive = GameArchive(path)
+        _open_archives[path] = archive
+    return archive
+
+
+# yields (<name>, <SGF text>) for every game of the input files,
+# named after their paths in the same way as the diagrams rendered from them.
+def _iter_named_contents(args):
+    from . import _read_SGF
+    from ._sgf_collection import split_SGF_collection
+
+    for path, in_directory in _iter_input_paths(args):
+        if path.endswith(ARCHIVE_EXTENSION):
+            print(f"{path} is already an archive.", file=sys.stderr)
+            continue
+        if in_directory is None:
+            stem = os.path.basename(path)
+        else:
+            stem = os.path.relpath(path, in_directory)
+        stem = os.path.splitext(stem)[0]
+
+        games = split_SGF_collection(_read_SGF(path))
+        for i, content in enumerate(games):
+            yield (stem if len(games) == 1 else f"{stem}-{i + 1}"), content
+
+
+def _get_game_out_paths(out_stem, out_format, n_games):
+    extension = _EXTENSIONS[out_format]
+    if n_games == 1:
+        return [f"{out_stem}.{extension}"]
+    return [f"{out_stem}-{i + 1}.{extension}" for i in range(n_games)]
+
+
+def _are_up_to_date(out_paths, sgf_mtime):
+    return all(
+        os.path.exists(out_path) and os.path.getmtime(out_path) >= sgf_mtime
+        for out_path in out_paths
+    )
+
+
+# returns where the diagram of <content> is kept in the <cache_dir>,
+# named by a hash of the SGF and everything that affects its rendering.
+def _get_cache_path(cache_dir, content, out_format, timing):
+    from ._server import make_render_key
+
+    key = make_render_key(content, out_format, timing, get_settings().to_dict())
+    return os.path.join(cache_dir, key[:2], f"{key}.{out_format}")
+
+
+def _write_cache_file(cache_path, data):
+    # the file is renamed into place so other workers never see a partial file.
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(data)
+    os.replace(temp_path, cache_path)
+
+
+def _create_parser():
+    parser = argparse.ArgumentParser(
+        prog="sgf2anim",
+        description="Renders .sgf files into static (.png) and animated (.gif) "
+        "diagrams. Every game of a collection file is rendered separately.",
+    )
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        help=f"the .sgf files, {ARCHIVE_EXTENSION} archives and directories to render.",
+    )
+    parser.add_argument(
+        "--pack",
+        metavar="ARCHIVE",
+        help="instead of rendering, parse every game once and save them all "
+        f"to a {ARCHIVE_EXTENSION} archive, which renders without parsing again.",
+    )
+    parser.add_argument(
+        "-o",
+        "--out-dir",
+        help="the directory to save diagrams to, in a tree that mirrors the input. "
+        "by default, diagrams are saved next to their .sgf files.",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        dest="formats",
+        action="append",
+        choices=_FORMATS,
+        help="a format to render. can be given more than once (default: png and gif). "
+        "svg saves a static diagram as a vector image. "
+        "thumb saves a small image of the final position.",
+    )
+    parser.add_argument(
+        "-a",
+        "--addon",
+        default="",
+        help="text added to the end of the name of every diagram.",
+    )
+    parser.add_argument(
+        "-r", "--recursive", action="store_true", help="search subdirectories."
+    )
+    parser.add_argument("--include", action="append", help="a glob of files to use.")
+    parser.add_argument("--exclude", action="append", help="a glob of files to skip.")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1, help="the number of worker processes."
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        help="the number of seconds a file can take before it's skipped.",
+    )
+    parser.add_argument(
+        "--journal",
+        help="a file recording finished files, so a stopped job can be resumed.",
+    )
+    parser.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="render the files that the journal recorded as failed again.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="a directory of rendered diagrams, reused for identical games "
+        "with identical settings. games from archives aren't cached.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="skip diagrams that are newer than their .sgf file.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print how much time was spent in each stage of rendering.",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="print the peak memory of each stage of rendering, "
+        "traced with tracemalloc.",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="FILE",
+        help="a file that a JSON line of the metrics of every file, "
+        "and of the whole job when it ends, is appended to.",
+    )
+    parser.add_argument(
+        "--prometheus-textfile",
+        metavar="FILE",
+        help="a .prom file that the metrics of the job so far are kept in, "
+        "for the textfile collector of a Prometheus node exporter.",
+    )
+    parser.add_argument(
+        "--thumbnail-size",
+        type=int,
+        default=128,
+        help="the largest width and height of a thumbnail (default: 128).",
+    )
+    parser.add_argument(
+        "--contact-sheet",
+        metavar="PREFIX",
+        help="instead of saving diagrams, pack a thumbnail of every game "
+        "into images named PREFIX-1.png, PREFIX-2.png and so on, "
+        "each with a .json index of where every game is.",
+    )
+    parser.add_argument("--style", help="the name of the style to use.")
+    parser.add_argument(
+        "--max-size", type=int, help="the maximum width and height of a diagram."
+    )
+    parser.add_argument(
+        "--quality",
+        choices=list(RESAMPLE_FILTERS),
+        help="final (the default), or draft for fast previews: graphics are scaled "
+        "with a cheaper filter, the board is a flat color and files are "
+        "compressed less.",
+    )
+    parser.add_argument(
+        "--memory-budget-mb",
+        type=float,
+        help="the megabytes that the frames of a GIF and the cached graphics "
+        "can use in each worker before frames are held on disk.",
+    )
+    parser.add_argument("--frame-delay-ms", type=int, default=1500)
+    parser.add_argument("--start-freeze-ms", type=int, default=3000)
+    parser.add_argument("--end-freeze-ms", type=int, default=10000)
+    parser.add_argument("--number-display-ms", type=int, default=500)
+    return parser
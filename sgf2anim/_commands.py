@@ -1,14 +1,13 @@
-import os
 from PIL import Image
-from .weiqi_board import WeiqiBoard, BLACK_NUM, WHITE_NUM
-from ._decode_coords import decode_lines, decode_labels, decode_letter_coords
+from .weiqi_board import BLACK_NUM, WHITE_NUM
 from ._draw import (
     find_board_points_with_annotation,
     mass_clear,
     mass_paste_stone,
     mass_paste_annotation,
     mass_draw_lines,
-    reset_annotations,
+    get_dirty_box,
+    union_boxes,
 )
 from ._image_text import create_cell_text
 from ._image_resources import (
@@ -21,6 +20,8 @@ from ._settings import get_settings
 _move_num = 0
 _has_used_line_annotations = False
 _line_annotations_image = None
+# the box of every line on the image of the lines, outside of which it's clear.
+_line_annotations_box = None
 
 
 def get_has_used_line_annotations():
@@ -31,133 +32,207 @@ def get_line_annotations_image():
     return _line_annotations_image
 
 
+def get_line_annotations_box():
+    return _line_annotations_box
+
+
 def set_move_num(move_num):
     global _move_num
     _move_num = move_num
 
 
-def play_setup_moves(commands_lists, stones_image, annotations_image, board):
+# returns the state of the commands drawn so far, which is
+# kept separately for every view when a game is drawn at several sizes.
+def get_view_state():
+    return (
+        _move_num,
+        _has_used_line_annotations,
+        _line_annotations_image,
+        _line_annotations_box,
+    )
+
+
+def set_view_state(state):
+    global _move_num, _has_used_line_annotations, _line_annotations_image
+    global _line_annotations_box
+    (
+        _move_num,
+        _has_used_line_annotations,
+        _line_annotations_image,
+        _line_annotations_box,
+    ) = state
+
+
+# readies the move numbers and lines once the setup moves have been drawn.
+def finish_setup_moves():
     global _move_num, _has_used_line_annotations
-    reset_annotations()
-    for command in commands_lists[0]:
-        run_command(command, stones_image, annotations_image, board)
     _move_num = 1
     _has_used_line_annotations = False
 
 
-# returns an extra frame (if any)
-# and a boolean which states if the move was a pass.
-def run_command(command, stones_image, annotations_image, board):
-    global _move_num, _has_used_line_annotations, _line_annotations_image
-    function_name, parameters = command
-    if function_name == "AB":
-        # adds initial black stone.
-        points = decode_letter_coords(parameters)
-        for point in points:
-            board.add_initial_stone(point, BLACK_NUM)
-        paste_graphic = get_stone_images()[get_draw_cell_size()]["B"]
-        mass_paste_stone(stones_image, paste_graphic, points)
-
-    elif function_name == "AW":
-        # adds initial white stone.
-        points = decode_letter_coords(parameters)
-        for point in points:
-            board.add_initial_stone(point, WHITE_NUM)
-        paste_graphic = get_stone_images()[get_draw_cell_size()]["W"]
-        mass_paste_stone(stones_image, paste_graphic, points)
-
-    elif function_name == "AE":
-        # clears initial cell.
-        points = decode_letter_coords(parameters)
-        for point in points:
+# changes the <board> by a compiled Op without drawing anything,
+# returning the points of any stones that were captured.
+def apply_command(op, board):
+    if op.name in ["AB", "AW"]:
+        # adds initial black or white stones.
+        player_num = BLACK_NUM if op.name == "AB" else WHITE_NUM
+        for point in op.points:
+            board.add_initial_stone(point, player_num)
+    elif op.name == "AE":
+        for point in op.points:
             board.set_empty_space(point)
-        mass_clear(stones_image, points)
-        mass_clear(annotations_image, points)
-
-    elif function_name in ["B", "W"]:
-        if len(parameters) == 0:
-            # move was a pass.
-            return None, True
-
-        # plays stone.
-        point = decode_letter_coords(parameters)[0]
-        player_num = BLACK_NUM if function_name == "B" else WHITE_NUM
-        was_legal, cleared_points = board.make_move(point, player_num)
-
-        if get_settings().RENDER_CAPTURES:
-            mass_clear(stones_image, cleared_points)
-            mass_clear(annotations_image, cleared_points)
-
-        stone_graphic = get_stone_images()[get_draw_cell_size()][function_name]
-        mass_paste_stone(stones_image, stone_graphic, [point])
-
-        extra_frame = None
-        if get_settings().SHOW_STONE_NUMBERS:
-            if not get_settings().MAINTAIN_STONE_NUMBERS:
-                # an extra frame is added
-                # which obscures (reverts) the shown stone number.
-                extra_frame = stones_image.copy()
-                extra_frame.alpha_composite(annotations_image)  # UNCERTAIN
-
-            use_marker = get_settings().MARKER_INSTEAD_OF_NUMBERS
-            if use_marker:
-                paste_graphic = create_cell_text(
-                    get_draw_cell_size(),
-                    "0",
-                    get_settings().PLACEMENT_MARKER_COLOR,
-                    get_settings().NUMBER_TEXT_SCALE,
-                )
-            else:
-                move_num_str = str(_move_num)
-                n_digits = 1 if use_marker else len(move_num_str)
-                color_for_black = get_settings().NUMBER_COLOR_FOR_BLACK
-                color_for_white = get_settings().NUMBER_COLOR_FOR_WHITE
-                factor = get_settings().DIGIT_TEXT_SCALE_FACTOR
-                paste_graphic = create_cell_text(
-                    get_draw_cell_size(),
-                    move_num_str,
-                    color_for_black if function_name == "B" else color_for_white,
-                    get_settings().NUMBER_TEXT_SCALE + (n_digits - 1) * factor,
-                )
-
-            mass_paste_annotation(
-                function_name, annotations_image, paste_graphic, [point], board
-            )
+    elif op.name in ["B", "W"] and len(op.points) > 0:
+        player_num = BLACK_NUM if op.name == "B" else WHITE_NUM
+        was_legal, cleared_points = board.make_move(op.points[0], player_num)
+        return cleared_points
+    return []
 
-        _move_num += 1
-        return extra_frame, False
 
-    elif function_name in ["CR", "DD", "MA", "SL", "SQ", "TR"]:
-        if len(parameters) == 0 and function_name in ["DD", "SL"]:
-            clears = find_board_points_with_annotation(function_name)
-            mass_clear(annotations_image, clears)
-        else:
-            paste_graphic = get_stone_images()[get_draw_cell_size()][function_name]
-            points = decode_letter_coords(parameters)
-            mass_paste_annotation(
-                function_name, annotations_image, paste_graphic, points, board
-            )
+# draws a compiled Op that has already been applied to the <board>,
+# returning an extra frame (if any) and a boolean which states if the move was a pass.
+def draw_command(op, cleared_points, stones_image, annotations_image, board):
+    command_func = _COMMAND_FUNCS.get(op.name)
+    if command_func is None:
+        return None, False
+    return command_func(op, cleared_points, stones_image, annotations_image, board)
+
+
+def _add_initial_stones(op, cleared_points, stones_image, annotations_image, board):
+    paste_graphic = get_stone_images()[get_draw_cell_size()][op.name[1]]
+    mass_paste_stone(stones_image, paste_graphic, op.points)
+    return None, False
+
+
+def _clear_initial_cells(op, cleared_points, stones_image, annotations_image, board):
+    mass_clear(stones_image, op.points)
+    mass_clear(annotations_image, op.points)
+    return None, False
 
-    elif function_name == "LB":
-        points, strings = decode_labels(parameters)
-        for i in range(len(points)):
-            point = points[i]
-            string = strings[i]
-            paste_graphic = create_cell_text(
-                get_draw_cell_size(),
-                string,
-                get_settings().LABEL_COLOR,
-                get_settings().LABEL_TEXT_SCALE,
+
+def _play_stone(op, cleared_points, stones_image, annotations_image, board):
+    global _move_num
+    function_name = op.name
+    if len(op.points) == 0:
+        # move was a pass.
+        return None, True
+
+    # plays stone.
+    point = op.points[0]
+
+    if get_settings().RENDER_CAPTURES:
+        mass_clear(stones_image, cleared_points)
+        mass_clear(annotations_image, cleared_points)
+
+    stone_graphic = get_stone_images()[get_draw_cell_size()][function_name]
+    mass_paste_stone(stones_image, stone_graphic, [point])
+
+    extra_frame = None
+    if get_settings().SHOW_STONE_NUMBERS:
+        if not get_settings().MAINTAIN_STONE_NUMBERS:
+            # an extra frame is added
+            # which obscures (reverts) the shown stone number.
+            # only the drawn cells of the annotations can show anything.
+            extra_frame = stones_image.copy()
+            box = get_dirty_box()
+            if box is not None:
+                extra_frame.alpha_composite(annotations_image, box[:2], box)
+
+        use_marker = get_settings().MARKER_INSTEAD_OF_NUMBERS
+        if use_marker:
+            text_key = (
+                "0",
+                get_settings().PLACEMENT_MARKER_COLOR,
+                get_settings().NUMBER_TEXT_SCALE,
             )
-            mass_paste_annotation(
-                function_name, annotations_image, paste_graphic, [point], board
+        else:
+            move_num_str = str(_move_num)
+            n_digits = 1 if use_marker else len(move_num_str)
+            color_for_black = get_settings().NUMBER_COLOR_FOR_BLACK
+            color_for_white = get_settings().NUMBER_COLOR_FOR_WHITE
+            factor = get_settings().DIGIT_TEXT_SCALE_FACTOR
+            text_key = (
+                move_num_str,
+                color_for_black if function_name == "B" else color_for_white,
+                get_settings().NUMBER_TEXT_SCALE + (n_digits - 1) * factor,
             )
+        paste_graphic = create_cell_text(get_draw_cell_size(), *text_key)
+
+        # the stone and its number are pasted as one tile.
+        mass_paste_annotation(
+            function_name,
+            annotations_image,
+            paste_graphic,
+            [point],
+            board,
+            graphic_key=text_key,
+        )
+
+    _move_num += 1
+    return extra_frame, False
+
+
+def _paste_markup(op, cleared_points, stones_image, annotations_image, board):
+    function_name = op.name
+    if len(op.points) == 0 and function_name in ["DD", "SL"]:
+        clears = find_board_points_with_annotation(function_name)
+        mass_clear(annotations_image, clears)
+    else:
+        paste_graphic = get_stone_images()[get_draw_cell_size()][function_name]
+        mass_paste_annotation(
+            function_name,
+            annotations_image,
+            paste_graphic,
+            op.points,
+            board,
+            graphic_key=function_name,
+        )
+    return None, False
+
+
+def _paste_labels(op, cleared_points, stones_image, annotations_image, board):
+    for point, string in zip(op.points, op.values):
+        text_key = (
+            string,
+            get_settings().LABEL_COLOR,
+            get_settings().LABEL_TEXT_SCALE,
+        )
+        paste_graphic = create_cell_text(get_draw_cell_size(), *text_key)
+        mass_paste_annotation(
+            op.name,
+            annotations_image,
+            paste_graphic,
+            [point],
+            board,
+            graphic_key=text_key,
+        )
+    return None, False
 
-    elif function_name == "LN":
-        lines = decode_lines(parameters)
-        if not _has_used_line_annotations:
-            _line_annotations_image = Image.new("RGBA", stones_image.size, (0, 0, 0, 0))
-            _has_used_line_annotations = True
-        mass_draw_lines(_line_annotations_image, lines)
 
+def _draw_lines(op, cleared_points, stones_image, annotations_image, board):
+    global _has_used_line_annotations, _line_annotations_image
+    global _line_annotations_box
+    if not _has_used_line_annotations:
+        _line_annotations_image = Image.new("RGBA", stones_image.size, (0, 0, 0, 0))
+        _line_annotations_box = None
+        _has_used_line_annotations = True
+    box = mass_draw_lines(_line_annotations_image, op.values)
+    _line_annotations_box = union_boxes(_line_annotations_box, box)
     return None, False
+
+
+# the function that runs each kind of Op.
+_COMMAND_FUNCS = {
+    "AB": _add_initial_stones,
+    "AW": _add_initial_stones,
+    "AE": _clear_initial_cells,
+    "B": _play_stone,
+    "W": _play_stone,
+    "CR": _paste_markup,
+    "DD": _paste_markup,
+    "MA": _paste_markup,
+    "SL": _paste_markup,
+    "SQ": _paste_markup,
+    "TR": _paste_markup,
+    "LB": _paste_labels,
+    "LN": _draw_lines,
+}
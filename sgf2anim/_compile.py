@@ -0,0 +1,124 @@
+from collections import namedtuple
+from ._decode_coords import decode_lines, decode_labels, decode_letter_coords
+from ._settings import get_settings
+
+# the commands that only annotate the board and never change the stones.
+ANNOTATION_FUNC_NAMES = frozenset(
+    ["AR", "C", "CR", "DD", "LB", "LN", "MA", "MN", "SL", "SQ", "TR"]
+)
+
+# the commands that paste a graphic onto each of their points.
+MARKUP_FUNC_NAMES = frozenset(["CR", "DD", "MA", "SL", "SQ", "TR"])
+
+DEFAULT_BOARD_SIZE = 19
+
+# a decoded command.
+# <points> is a tuple of (x, y) board points. a "B" or "W" op without points
+# is a pass. <values> is a tuple of label strings (one for each point)
+# for "LB", a tuple of ((x, y), (x, y)) lines for "LN", and None otherwise.
+Op = namedtuple("Op", ["name", "points", "values"])
+
+# the ops of a node, in the order they're run.
+# <move_num> is the number given by the node's "MN" command (or None).
+# a node that <is_annotation_only> doesn't create a frame of its own.
+CompiledNode = namedtuple(
+    "CompiledNode", ["ops", "move_num", "is_annotation_only", "is_pass"]
+)
+
+# a whole game, ready to be replayed. <nodes>[0] contains the setup.
+# <bounds> is (min x, min y, max x, max y) of every point the game uses.
+CompiledGame = namedtuple("CompiledGame", ["width", "height", "bounds", "nodes"])
+
+
+# returns whether <node> is shown in a frame of its own once it has been run.
+# it isn't if it only has annotations, or if <move_was_pass>
+# and the move numbers are maintained at the end.
+def is_frame_node(node, move_was_pass):
+    if node.is_annotation_only:
+        return False
+    return not (move_was_pass and get_settings().MAINTAIN_NUMBERS_AT_END)
+
+
+# returns a CompiledGame made from the lists of (<function name>, <parameters>)
+# commands of every node, decoding every coordinate only once.
+def compile_game(command_lists):
+    width, height = _get_board_size(command_lists[0])
+
+    bounds = [99, 99, 0, 0]
+    nodes = []
+    for commands in command_lists:
+        ops = []
+        move_num = None
+        is_pass = False
+        for function_name, parameters in commands:
+            op = _compile_command(function_name, parameters, width, height)
+            _extend_bounds(bounds, function_name, parameters, op)
+
+            if function_name == "MN" and move_num is None:
+                # any move number command will always be run first.
+                move_num = int(parameters[0])
+            elif op is not None:
+                ops.append(op)
+                if op.name in ["B", "W"] and len(op.points) == 0:
+                    is_pass = True
+
+        is_annotation_only = all(
+            function_name in ANNOTATION_FUNC_NAMES for function_name, _ in commands
+        )
+        nodes.append(CompiledNode(tuple(ops), move_num, is_annotation_only, is_pass))
+
+    return CompiledGame(width, height, tuple(bounds), nodes)
+
+
+# returns the Op of a command, or None if the command isn't drawn.
+def _compile_command(function_name, parameters, width, height):
+    if function_name in ["AB", "AW", "AE"]:
+        return Op(function_name, tuple(decode_letter_coords(parameters)), None)
+
+    if function_name in ["B", "W"]:
+        points = decode_letter_coords(parameters[:1])
+        # a move off of the board (such as "tt" in older files) is a pass.
+        if len(points) == 0 or points[0][0] >= width or points[0][1] >= height:
+            return Op(function_name, (), None)
+        return Op(function_name, (points[0],), None)
+
+    if function_name in MARKUP_FUNC_NAMES:
+        return Op(function_name, tuple(decode_letter_coords(parameters)), None)
+
+    if function_name == "LB":
+        points, strings = decode_labels(parameters)
+        return Op(function_name, tuple(points), tuple(strings))
+
+    if function_name == "LN":
+        return Op(function_name, (), tuple(decode_lines(parameters)))
+
+    return None
+
+
+# widens <bounds> to include every point of the given command.
+def _extend_bounds(bounds, function_name, parameters, op):
+    if function_name == "LN":
+        points = [point for line in op.values for point in line]
+    elif op is not None and function_name != "B" and function_name != "W":
+        points = op.points
+    else:
+        # the parameters of other commands are read as points too,
+        # in the same way that the viewport has always been found.
+        points = decode_letter_coords(parameters)
+
+    for x, y in points:
+        bounds[0] = min(bounds[0], x)
+        bounds[1] = min(bounds[1], y)
+        bounds[2] = max(bounds[2], x)
+        bounds[3] = max(bounds[3], y)
+
+
+# returns the (<width>, <height>) given by the "SZ" command of the root node.
+def _get_board_size(root_commands):
+    for function_name, parameters in root_commands:
+        if function_name == "SZ":
+            parameters = parameters[0].split(":")
+            if len(parameters) == 1:
+                return int(parameters[0]), int(parameters[0])
+            return int(parameters[0]), int(parameters[1])
+    return DEFAULT_BOARD_SIZE, DEFAULT_BOARD_SIZE
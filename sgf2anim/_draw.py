@@ -3,6 +3,7 @@ from .weiqi_board import BLACK_NUM, WHITE_NUM
 from ._settings import get_settings
 from ._image_resources import (
     get_stone_images,
+    get_stone_tiles,
     get_board_image,
     get_board_image_no_lines,
     get_board_start_point,
@@ -16,6 +17,10 @@ from ._image_resources import (
 
 
 _annotations = None
+# the box of every cell that was drawn since <reset_dirty_box>, or None.
+_dirty_box = None
+# the label backgrounds of the view's cells, as {(<show x>, <show y>): <image>}.
+_label_backgrounds = {}
 
 
 def find_board_points_with_annotation(function_name):
@@ -40,9 +45,10 @@ def mass_clear(image, board_points):
         _clear_cell(image, show_x, show_y)
 
 
+# the graphics are composited onto each cell's own area,
+# since they never reach past their cells.
 def mass_paste_stone(stones_image, paste_graphic, board_points):
     global _annotations
-    comp = Image.new("RGBA", stones_image.size, (0, 0, 0, 0))
     for point in board_points:
         show_x = point[0] - get_board_start_point()[0]
         show_y = point[1] - get_board_start_point()[1]
@@ -50,17 +56,20 @@ def mass_paste_stone(stones_image, paste_graphic, board_points):
         bbox = _clear_cell(stones_image, show_x, show_y)
         draw_x, draw_y, _, _ = bbox
         diff = get_cell_size() - get_draw_cell_size()
-        comp.paste(paste_graphic, (draw_x + diff, draw_y + diff))
-    stones_image.alpha_composite(comp)
+        stones_image.alpha_composite(paste_graphic, (draw_x + diff, draw_y + diff))
 
 
+# a stone beneath an annotation is drawn with it as one tile, which is kept
+# by the <graphic_key> that identifies the <paste_graphic> if it's given.
 def mass_paste_annotation(
-    function_name, annotations_image, paste_graphic, board_points, board
+    function_name,
+    annotations_image,
+    paste_graphic,
+    board_points,
+    board,
+    graphic_key=None,
 ):
     global _annotations
-    has_new_annotations = False
-
-    comp = Image.new("RGBA", annotations_image.size, (0, 0, 0, 0))
     for point in board_points:
         show_x = point[0] - get_board_start_point()[0]
         show_y = point[1] - get_board_start_point()[1]
@@ -68,7 +77,6 @@ def mass_paste_annotation(
         if _annotations[show_x][show_y] == function_name:
             continue
 
-        has_new_annotations = True
         _annotations[show_x][show_y] = function_name
         bbox = _clear_cell(annotations_image, show_x, show_y)
         draw_x, draw_y, _, _ = bbox
@@ -76,27 +84,34 @@ def mass_paste_annotation(
 
         # draws a pre-existing stone beneath a new annotation.
         underneath_stone = board.get_player_num(point)
-        stone_graphic = None
+        stone_key = None
         if underneath_stone == BLACK_NUM:
-            stone_graphic = get_stone_images()[get_draw_cell_size()]["B"]
+            stone_key = "B"
         elif underneath_stone == WHITE_NUM:
-            stone_graphic = get_stone_images()[get_draw_cell_size()]["W"]
-
-        if stone_graphic is not None:  # UNCERTAIN
+            stone_key = "W"
+
+        if stone_key is not None:  # UNCERTAIN
+            tile = None
+            if graphic_key is not None:
+                tile = _get_stone_tile(stone_key, paste_graphic, graphic_key)
+            if tile is not None:
+                annotations_image.paste(tile, (draw_x, draw_y))
+                continue
+            stone_graphic = get_stone_images()[get_draw_cell_size()][stone_key]
             annotations_image.paste(stone_graphic, (draw_x, draw_y))
 
         elif function_name == "LB":
-            bg_cell = get_board_image_no_lines().crop(bbox)
-            label_bg = _create_label_background(bg_cell)
-            label_comp = Image.new("RGBA", annotations_image.size, (0, 0, 0, 0))
-            label_comp.paste(label_bg, (draw_x + diff, draw_y + diff))
-            annotations_image.alpha_composite(label_comp)
-        comp.paste(paste_graphic, (draw_x + diff, draw_y + diff))
-
-    if has_new_annotations:
-        annotations_image.alpha_composite(comp)
+            label_bg = _label_backgrounds.get((show_x, show_y))
+            if label_bg is None:
+                bg_cell = get_board_image_no_lines().crop(bbox)
+                label_bg = _create_label_background(bg_cell)
+                _label_backgrounds[(show_x, show_y)] = label_bg
+            annotations_image.alpha_composite(label_bg, (draw_x + diff, draw_y + diff))
+        annotations_image.alpha_composite(paste_graphic, (draw_x + diff, draw_y + diff))
 
 
+# draws the <lines> onto the <image>,
+# then returns the bounding box of everything that was drawn.
 def mass_draw_lines(image, lines):
     draw = ImageDraw.Draw(image)
     line_color = get_settings().ANNOTATE_LINE_COLOR
@@ -156,11 +171,50 @@ def mass_draw_lines(image, lines):
     for draw_line in draw_lines:
         draw.line(draw_line, fill=line_color, width=line_width)
 
+    points = [point for draw_line in draw_lines for point in draw_line]
+    if len(points) == 0:
+        return None
+    return clip_box(
+        (
+            min(x for x, _ in points) - line_width,
+            min(y for _, y in points) - line_width,
+            max(x for x, _ in points) + line_width + 1,
+            max(y for _, y in points) + line_width + 1,
+        ),
+        image.size,
+    )
+
+
+# returns the cell of the stone of <stone_key> with the <paste_graphic> on top
+# of it, in the same way as <mass_paste_annotation> draws them, or None if
+# the graphic reaches past the stone. tiles are kept by the <graphic_key>.
+def _get_stone_tile(stone_key, paste_graphic, graphic_key):
+    tiles = get_stone_tiles()
+    diff = get_cell_size() - get_draw_cell_size()
+    key = (get_draw_cell_size(), diff, stone_key, graphic_key)
+    if key in tiles:
+        return tiles[key]
+
+    # the graphic is offset by <diff>, so any part of it past the stone
+    # is drawn over the board instead.
+    size = get_draw_cell_size()
+    tile = None
+    if diff == 0 or (
+        paste_graphic.crop((size - diff, 0, size, size)).getbbox() is None
+        and paste_graphic.crop((0, size - diff, size, size)).getbbox() is None
+    ):
+        tile = get_stone_images()[size][stone_key].copy()
+        tile.alpha_composite(paste_graphic, (diff, diff))
+    tiles[key] = tile
+    return tile
+
 
 # clears the given <image> at the cell located at <show_x>, <show_y>,
 # then returns the bounding box of the selected cell.
 def _clear_cell(image, show_x, show_y):
+    global _dirty_box
     crop_box = _get_cell_crop(show_x, show_y)
+    _dirty_box = union_boxes(_dirty_box, crop_box)
     graphic = get_board_image().crop(crop_box)
     image.paste(graphic, (crop_box[0], crop_box[1]))
     return crop_box
@@ -176,10 +230,58 @@ def _get_cell_crop(show_x, show_y):
 
 
 def reset_annotations():
-    global _annotations
+    global _annotations, _label_backgrounds
     _annotations = [
         [None for _ in range(get_show_height())] for _ in range(get_show_width())
     ]
+    _label_backgrounds = {}
+
+
+# returns the box of every cell that was drawn since the last
+# <reset_dirty_box>, outside of which the change images are still clear,
+# or None if nothing was drawn.
+def get_dirty_box():
+    return _dirty_box
+
+
+def reset_dirty_box():
+    global _dirty_box
+    _dirty_box = None
+
+
+# returns the smallest box holding both boxes, either of which can be None.
+def union_boxes(box, other_box):
+    if box is None:
+        return other_box
+    if other_box is None:
+        return box
+    return (
+        min(box[0], other_box[0]),
+        min(box[1], other_box[1]),
+        max(box[2], other_box[2]),
+        max(box[3], other_box[3]),
+    )
+
+
+# returns the part of the <box> within an image of the given <size>,
+# or None if there's none.
+def clip_box(box, size):
+    if box is None:
+        return None
+    left, top = max(0, box[0]), max(0, box[1])
+    right, bottom = min(size[0], box[2]), min(size[1], box[3])
+    if left >= right or top >= bottom:
+        return None
+    return (left, top, right, bottom)
+
+
+def get_view_state():
+    return (_annotations, _dirty_box, _label_backgrounds)
+
+
+def set_view_state(state):
+    global _annotations, _dirty_box, _label_backgrounds
+    _annotations, _dirty_box, _label_backgrounds = state
 
 
 # creates a background for a label with the <board_cell_image> (no lines).
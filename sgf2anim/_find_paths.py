@@ -0,0 +1,95 @@
+import fnmatch
+import os
+
+# the symlink policies that can be given to <iter_SGF_paths>.
+SYMLINKS_IGNORE = "ignore"  # symlinked files and directories are skipped.
+SYMLINKS_FILES = "files"  # symlinked files are used, but not directories.
+SYMLINKS_FOLLOW = "follow"  # symlinked files and directories are both used.
+_SYMLINK_POLICIES = (SYMLINKS_IGNORE, SYMLINKS_FILES, SYMLINKS_FOLLOW)
+
+_DEFAULT_INCLUDE = ("*.sgf",)
+
+
+# yields the path of every .sgf file in the given <directory> as it is found,
+# so that rendering can begin before the whole tree has been listed.
+# <include> and <exclude> are globs matched case-insensitively against
+# each file name, so "*.sgf" also matches "GAME.SGF".
+# if <recursive> is True, subdirectories are searched as well.
+# <symlinks> is one of "ignore", "files" or "follow".
+def iter_SGF_paths(
+    directory: str,
+    recursive: bool = False,
+    include=_DEFAULT_INCLUDE,
+    exclude=(),
+    symlinks: str = SYMLINKS_FILES,
+):
+    if symlinks not in _SYMLINK_POLICIES:
+        raise ValueError(f"unknown symlink policy {symlinks!r}.")
+
+    include = [pattern.lower() for pattern in include]
+    exclude = [pattern.lower() for pattern in exclude]
+
+    # the real paths of visited directories prevent symlink loops.
+    visited = set()
+    pending = [directory]
+    while len(pending) > 0:
+        current_dir = pending.pop()
+        real_dir = os.path.realpath(current_dir)
+        if real_dir in visited:
+            continue
+        visited.add(real_dir)
+
+        try:
+            entries = sorted(os.scandir(current_dir), key=lambda e: e.name)
+        except OSError as error:
+            print(f"could not search {current_dir}: {error}")
+            continue
+
+        sub_dirs = []
+        for entry in entries:
+            is_link = entry.is_symlink()
+            try:
+                if entry.is_dir(follow_symlinks=symlinks == SYMLINKS_FOLLOW):
+                    if recursive and (not is_link or symlinks == SYMLINKS_FOLLOW):
+                        sub_dirs.append(entry.path)
+                    continue
+                if not entry.is_file(follow_symlinks=symlinks != SYMLINKS_IGNORE):
+                    continue
+            except OSError:
+                continue
+
+            if is_link and symlinks == SYMLINKS_IGNORE:
+                continue
+            if _matches_name(entry.name, include) and not _matches_name(
+                entry.name, exclude
+            ):
+                yield entry.path
+
+        # subdirectories are searched in alphabetical order.
+        pending.extend(reversed(sub_dirs))
+
+
+# returns the path that an output file should be written to so that
+# the tree of <out_directory> mirrors the tree of <in_directory>.
+# the extension of <sgf_path> is replaced with <out_path_addon> + <extension>.
+# any missing directories of the output path are created.
+def get_mirrored_out_path(
+    sgf_path: str,
+    in_directory: str,
+    out_directory: str = None,
+    out_path_addon: str = "",
+    extension: str = ".png",
+):
+    stem = os.path.splitext(sgf_path)[0]
+    if out_directory is None:
+        return stem + out_path_addon + extension
+
+    relative_stem = os.path.relpath(stem, in_directory)
+    out_path = os.path.join(out_directory, relative_stem + out_path_addon + extension)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    return out_path
+
+
+def _matches_name(name, patterns):
+    name = name.lower()
+    return any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
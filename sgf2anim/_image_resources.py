@@ -1,8 +1,14 @@
 import os
 from PIL import Image, ImageDraw
 from .weiqi_board import WeiqiBoard
-from ._decode_coords import decode_lines, decode_labels, decode_letter_coords
-from ._image_text import load_font, make_color_copy
+from ._image_text import (
+    create_quality_caches,
+    get_render_quality,
+    load_font,
+    make_color_copy,
+)
+from ._memory import ResourceCache
+from ._profile import stage
 from ._settings import get_settings
 
 
@@ -16,15 +22,45 @@ _STONE_IMAGE_PATHS = {
     "SQ": "square.png",
     "TR": "triangle.png",
 }
+# the number of cell sizes (or line widths) whose scaled graphics are kept.
+MAX_CACHED_SPRITE_SIZES = 16
+# the number of tiles of stones with a graphic on top of them that are kept.
+MAX_CACHED_STONE_TILES = 2048
+# the color a board is filled with beneath its texture (or instead of it in a draft).
+BOARD_COLOR = (243, 176, 109)
+
 _last_loaded_style = None
-_STONE_IMAGES = {}
-_CORNER_CIRCLE_IMAGES = {}
-_STAR_POINT_IMAGES = {}
+# the style's graphics at full size, which are scaled for each size as needed.
+_raw_images = {}
+# the scaled graphics of each RENDER_QUALITY,
+# as {<quality>: {<cell size>: {<key>: <image>}}}.
+_STONE_IMAGES = create_quality_caches(
+    MAX_CACHED_SPRITE_SIZES,
+    lambda cell_size, resample: {
+        key: image.resize((cell_size, cell_size), resample=resample)
+        for key, image in _raw_images.items()
+        if key in _STONE_IMAGE_PATHS
+    },
+)
+# the cells of stones with a graphic on top of them, which are made as needed.
+_STONE_TILES = create_quality_caches(MAX_CACHED_STONE_TILES)
+# corner circles are only drawn at the "final" RENDER_QUALITY.
+_CORNER_CIRCLE_IMAGES = ResourceCache(
+    MAX_CACHED_SPRITE_SIZES,
+    lambda line_width: _raw_images["corner circle"].resize(
+        (line_width, line_width), resample=Image.LANCZOS
+    ),
+)
+_STAR_POINT_IMAGES = create_quality_caches(
+    MAX_CACHED_SPRITE_SIZES,
+    lambda cell_size, resample: _raw_images["star point"].resize(
+        (cell_size, cell_size), resample=resample
+    ),
+)
 _BOARD_TEXTURE = None
 _BOARD_IMAGE = None
 _BOARD_IMAGE_NO_LINES = None
 
-_MAX_BOARD_LINE_WIDTH = None
 _start_x = None
 _start_y = None
 _show_width = None
@@ -35,14 +71,25 @@ _cell_size = None
 _draw_cell_size = None
 
 
+# returns the scaled graphics of the current RENDER_QUALITY,
+# as {<cell size>: {<key>: <image>}}.
 def get_stone_images():
-    return _STONE_IMAGES
+    return _STONE_IMAGES[get_render_quality()]
+
+
+def get_stone_tiles():
+    return _STONE_TILES[get_render_quality()]
 
 
 def get_board_image():
     return _BOARD_IMAGE
 
 
+# returns the style's board texture at full size.
+def get_board_texture():
+    return _BOARD_TEXTURE
+
+
 def get_board_image_no_lines():
     return _BOARD_IMAGE_NO_LINES
 
@@ -76,29 +123,98 @@ def get_draw_cell_size():
     return _draw_cell_size
 
 
+# returns the viewport and board images made by the last <setup_board>,
+# so that several views of one game can be drawn one after another.
+def get_view_state():
+    return (
+        _start_x,
+        _start_y,
+        _show_width,
+        _show_height,
+        _scaled_margin,
+        _board_line_width,
+        _cell_size,
+        _draw_cell_size,
+        _BOARD_IMAGE,
+        _BOARD_IMAGE_NO_LINES,
+    )
+
+
+def set_view_state(state):
+    global _start_x, _start_y, _show_width, _show_height, _scaled_margin, _board_line_width, _cell_size, _draw_cell_size, _BOARD_IMAGE, _BOARD_IMAGE_NO_LINES
+    (
+        _start_x,
+        _start_y,
+        _show_width,
+        _show_height,
+        _scaled_margin,
+        _board_line_width,
+        _cell_size,
+        _draw_cell_size,
+        _BOARD_IMAGE,
+        _BOARD_IMAGE_NO_LINES,
+    ) = state
+
+
+# returns the directory of the current style's resources.
+def get_style_directory():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(current_dir, "_res", get_settings().STYLE_NAME)
+
+
+# returns the names of every style in the _res directory.
+def get_style_names():
+    res_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "_res")
+    return sorted(
+        name
+        for name in os.listdir(res_dir)
+        if os.path.exists(os.path.join(res_dir, name, "placement.png"))
+    )
+
+
+# returns the path of the style's image of the given <key>, such as "B" or "CR".
+def get_style_image_path(key):
+    return os.path.join(get_style_directory(), _STONE_IMAGE_PATHS[key])
+
+
+def get_board_texture_path():
+    board_path = os.path.join(get_style_directory(), "board.png")
+    if not os.path.exists(board_path):
+        board_path = os.path.join(get_style_directory(), "board.jpg")
+    return board_path
+
+
+# loads the resources for the current style ahead of time,
+# which otherwise happens when the first diagram is rendered.
+def load_images():
+    _load_images()
+
+
 # loads and creates image resources.
+# the scaled graphics of each cell size are only made once it's used.
 def _load_images():
-    global _last_loaded_style, _STONE_IMAGES, _CORNER_CIRCLE_IMAGES, _STAR_POINT_IMAGES, _BOARD_TEXTURE, _MAX_BOARD_LINE_WIDTH
-    if len(_STONE_IMAGES) > 0 and _last_loaded_style == get_settings().STYLE_NAME:
+    global _last_loaded_style, _BOARD_TEXTURE
+    if _BOARD_TEXTURE is not None and _last_loaded_style == get_style_key():
         return
 
-    _last_loaded_style = get_settings().STYLE_NAME
+    _last_loaded_style = get_style_key()
     print(
         f'\nloading the "{get_settings().STYLE_NAME}" style resources... ',
         end="",
         flush=True,
     )
-    thickness = get_settings().LINE_THICKNESS
-    _MAX_BOARD_LINE_WIDTH = max(
-        1, int(thickness * get_settings().MAX_CELL_SIZE * (1 / 23))
-    )
-
     load_font(get_settings().STYLE_NAME)
+    _raw_images.clear()
+    _CORNER_CIRCLE_IMAGES.clear()
+    for caches in [_STONE_IMAGES, _STONE_TILES, _STAR_POINT_IMAGES]:
+        for cache in caches.values():
+            cache.clear()
 
     # creates a raw corner circle image that will be scaled down later.
     corner_circle_image = Image.new("RGBA", (256, 256), (0, 0, 0, 0))
     draw = ImageDraw.Draw(corner_circle_image)
     draw.ellipse((0, 0, 256, 256), fill=get_settings().LINE_COLOR)
+    _raw_images["corner circle"] = corner_circle_image
 
     # creates the raw star point image that will be scaled down later.
     star_point_image = Image.new("RGBA", (512, 512), (0, 0, 0, 0))
@@ -106,97 +222,68 @@ def _load_images():
     radius = 50  # determines the size of the star point.
     bbox = (256 - radius, 256 - radius, 256 + radius, 256 + radius)
     draw.ellipse(bbox, fill=get_settings().LINE_COLOR)
+    _raw_images["star point"] = star_point_image
 
     # loads the image resources from file.
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    load_dir = os.path.join(current_dir, "_res", get_settings().STYLE_NAME)
-    board_path = os.path.join(load_dir, "board.png")
-    if not os.path.exists(board_path):
-        board_path = os.path.join(load_dir, "board.jpg")
-    _BOARD_TEXTURE = Image.open(board_path)
+    _BOARD_TEXTURE = Image.open(get_board_texture_path())
 
-    loaded_images = {}
-    for key, value in _STONE_IMAGE_PATHS.items():
-        path = os.path.join(load_dir, value)
-        loaded_images[key] = Image.open(path)
+    for key in _STONE_IMAGE_PATHS:
+        _raw_images[key] = Image.open(get_style_image_path(key))
         if key not in ["B", "W", "DD"]:
             # most annotative images are colored to match specified styling.
-            loaded_images[key] = make_color_copy(
-                loaded_images[key], get_settings().MARKER_COLOR
+            _raw_images[key] = make_color_copy(
+                _raw_images[key], get_settings().MARKER_COLOR
             )
+        _raw_images[key].load()
 
-    # creates scaled copies of the loaded resources and stores
-    # them in memory in order to save on processing time.
-    for cell_size in range(
-        get_settings().MIN_CELL_SIZE, get_settings().MAX_CELL_SIZE + 1
-    ):
-        _STONE_IMAGES[cell_size] = {}
-        for key, value in _STONE_IMAGE_PATHS.items():
-            _STONE_IMAGES[cell_size][key] = loaded_images[key].resize(
-                (cell_size, cell_size), resample=Image.LANCZOS
-            )
-
-        _STAR_POINT_IMAGES[cell_size] = star_point_image.resize(
-            (cell_size, cell_size), resample=Image.LANCZOS
-        )
+    print("done.")
 
-    for line_width in range(3, _MAX_BOARD_LINE_WIDTH + 5):
-        _CORNER_CIRCLE_IMAGES[line_width] = corner_circle_image.resize(
-            (line_width, line_width), resample=Image.LANCZOS
-        )
 
-    print("done.")
+# returns the values of every setting that the loaded resources depend on,
+# so that the resources are reloaded whenever one of them is changed.
+def get_style_key():
+    settings = get_settings()
+    return (
+        settings.STYLE_NAME,
+        settings.MIN_CELL_SIZE,
+        settings.MAX_CELL_SIZE,
+        settings.LINE_COLOR,
+        settings.LINE_THICKNESS,
+        settings.MARKER_COLOR,
+        settings.LABEL_COLOR,
+        settings.PLACEMENT_MARKER_COLOR,
+        settings.NUMBER_COLOR_FOR_BLACK,
+        settings.NUMBER_COLOR_FOR_WHITE,
+        settings.LEFTWARD_ONE_CLIP_FACTOR,
+        settings.CENTER_LABELS_VERTICALLY,
+        settings.LETTERS_PADDING_BOTTOM_PERCENT,
+        settings.NUMBERS_PADDING_BOTTOM_PERCENT,
+    )
 
 
-# returns a Weiqi board object after determining viewport and cell size.
-def setup_board(sgf_path, commands_lists):
+# returns a Weiqi board object after determining viewport and cell size
+# for the given CompiledGame. the board images are only made if <draw_images>.
+def setup_board(sgf_path, game, draw_images=True):
     global _start_x, _start_y, _show_width, _show_height, _cell_size, _scaled_margin, _board_line_width, _draw_cell_size
-    _load_images()
+    with stage("style"):
+        _load_images()
 
     # 1) determines the coord ranges that every played point finds itself in.
-    min_x = 99
-    min_y = 99
-    max_x = 0
-    max_y = 0
-    for command_list in commands_lists:
-        for command in command_list:
-            function_name, parameters = command
-            if function_name == "LN":
-                lines = decode_lines(parameters)
-                points = []
-                for line in lines:
-                    points.extend([line[0], line[1]])
-            elif function_name == "LB":
-                points, _ = decode_labels(parameters)
-            else:
-                points = decode_letter_coords(parameters)
-            for point in points:
-                min_x = min(min_x, point[0])
-                min_y = min(min_y, point[1])
-                max_x = max(max_x, point[0])
-                max_y = max(max_y, point[1])
-
-    # 2) determines the size of the board from a single "SZ" command.
-    board = None
-    for command in commands_lists[0]:
-        function_name, parameters = command
-        if function_name == "SZ":
-            parameters = parameters[0].split(":")
-            if len(parameters) == 1:
-                width = int(parameters[0])
-                height = int(parameters[0])
-            else:
-                width = int(parameters[0])
-                height = int(parameters[1])
-            board = WeiqiBoard(width, height, n_players=2)
-            break
+    min_x, min_y, max_x, max_y = game.bounds
+
+    # 2) determines the size of the board.
+    board = WeiqiBoard(game.width, game.height, n_players=2)
 
     # 3) determines the viewport's beginning and ending points.
     n_found_cells_wide = max_x - min_x + 1
     n_found_cells_high = max_y - min_y + 1
 
-    original_img_name = sgf_path[:-4] + ".png"
-    if get_settings().DOING_SENSEIS_FORMAT and os.path.exists(original_img_name):
+    original_img_name = None if sgf_path is None else sgf_path[:-4] + ".png"
+    if (
+        get_settings().DOING_SENSEIS_FORMAT
+        and original_img_name is not None
+        and os.path.exists(original_img_name)
+    ):
         # determines viewport size from a pre-existing accompanying image.
         image = Image.open(original_img_name)
         n_cells_wide = int((image.size[0] - 4) / 23)
@@ -285,7 +372,8 @@ def setup_board(sgf_path, commands_lists):
         _draw_cell_size = _cell_size
 
     # 9) creates the board images.
-    _draw_board_images(board)
+    if draw_images:
+        _draw_board_images(board)
 
     return board
 
@@ -305,24 +393,23 @@ def _draw_board_images(board):
         _scaled_margin * 2 + _cell_size * _show_width,
         _scaled_margin * 2 + _cell_size * _show_height,
     )
-    _BOARD_IMAGE = Image.new("RGBA", image_size, (243, 176, 109, 255))
-    smallest_dim = min(board.get_width(), board.get_height())
-    dim = _scaled_margin * 2 + _cell_size * smallest_dim
-    board_texture = _BOARD_TEXTURE.resize((dim, dim), Image.LANCZOS)
-    texture_begin = (-1 * _start_x * _cell_size, -1 * _start_y * _cell_size)
-    _BOARD_IMAGE.paste(board_texture, texture_begin)
+    is_draft = get_render_quality() == "draft"
+    _BOARD_IMAGE = Image.new("RGBA", image_size, BOARD_COLOR + (255,))
+    if not is_draft:
+        # a draft's board is only filled with the flat color.
+        smallest_dim = min(board.get_width(), board.get_height())
+        dim = _scaled_margin * 2 + _cell_size * smallest_dim
+        board_texture = _BOARD_TEXTURE.resize((dim, dim), Image.LANCZOS)
+        texture_begin = (-1 * _start_x * _cell_size, -1 * _start_y * _cell_size)
+        _BOARD_IMAGE.paste(board_texture, texture_begin)
     _BOARD_IMAGE_NO_LINES = _BOARD_IMAGE.copy()
 
     draw = ImageDraw.Draw(_BOARD_IMAGE)
     px_offset = _scaled_margin + _cell_size // 2
     line_color = get_settings().LINE_COLOR
+    min_x, min_y, max_x, max_y = get_board_line_extents(board)
 
     # 1) draws the vertical lines.
-    min_y = -10 if _start_y > 0 else px_offset
-    if _start_y + _show_height < board.get_height():
-        max_y = image_size[1] + 10
-    else:
-        max_y = _cell_size * (_show_height - 1) + px_offset
     for x in range(_show_width):
         pixel_x = x * _cell_size + px_offset
         start = (pixel_x, min_y)
@@ -330,11 +417,6 @@ def _draw_board_images(board):
         draw.line([start, end], fill=line_color, width=_board_line_width)
 
     # 2) draws the horizontal lines.
-    min_x = -10 if _start_x > 0 else px_offset
-    if _start_x + _show_width < board.get_width():
-        max_x = image_size[0] + 10
-    else:
-        max_x = _cell_size * (_show_width - 1) + px_offset
     for y in range(_show_height):
         pixel_y = y * _cell_size + px_offset
         start = (min_x, pixel_y)
@@ -342,7 +424,8 @@ def _draw_board_images(board):
         draw.line([start, end], fill=line_color, width=_board_line_width)
 
     # 3) draws circles to make corner intersections have a smooth transition.
-    if _board_line_width >= 3:
+    # drafts skip them.
+    if _board_line_width >= 3 and not is_draft:
         inc = 1
         circle = _CORNER_CIRCLE_IMAGES[_board_line_width + inc]
         corner_comp = Image.new("RGBA", image_size, (0, 0, 0, 0))
@@ -362,20 +445,7 @@ def _draw_board_images(board):
         _BOARD_IMAGE.alpha_composite(corner_comp)
 
     # 4) determines the positions of star points on the board.
-    star_points = set()
-    w, h = board.get_width(), board.get_height()
-    if w > 10 and h > 10:
-        star_points.update([(3, 3), (3, h - 4), (w - 4, 3), (w - 4, h - 4)])
-
-    if board.get_width() > 13 and board.get_width() % 2 == 1:
-        star_points.update([(w // 2, 3), (w // 2, h - 4)])
-
-    if board.get_height() > 13 and board.get_height() % 2 == 1:
-        star_points.update([(3, h // 2), (w - 4, h // 2)])
-
-    if board.get_width() % 2 == 1 and board.get_height() % 2 == 1:
-        star_points.add((w // 2, h // 2))
-
+    star_points = get_star_points(board)
     if len(star_points) == 0:
         return
 
@@ -387,7 +457,7 @@ def _draw_board_images(board):
         star_point_size = _cell_size + (_cell_size % 2)
         off = 1 - _cell_size % 2
 
-    star_point_graphic = _STAR_POINT_IMAGES[star_point_size]
+    star_point_graphic = _STAR_POINT_IMAGES[get_render_quality()][star_point_size]
     comp = Image.new("RGBA", image_size, (0, 0, 0, 0))
     for point in star_points:
         show_x = point[0] - _start_x
@@ -397,3 +467,42 @@ def _draw_board_images(board):
         comp.paste(star_point_graphic, (draw_x, draw_y))
 
     _BOARD_IMAGE.alpha_composite(comp)
+
+
+# returns the pixels (min x, min y, max x, max y) where the board's lines begin
+# and end. lines that continue past the viewport go past the image's edges.
+def get_board_line_extents(board):
+    px_offset = _scaled_margin + _cell_size // 2
+    image_width = _scaled_margin * 2 + _cell_size * _show_width
+    image_height = _scaled_margin * 2 + _cell_size * _show_height
+
+    min_x = -10 if _start_x > 0 else px_offset
+    if _start_x + _show_width < board.get_width():
+        max_x = image_width + 10
+    else:
+        max_x = _cell_size * (_show_width - 1) + px_offset
+
+    min_y = -10 if _start_y > 0 else px_offset
+    if _start_y + _show_height < board.get_height():
+        max_y = image_height + 10
+    else:
+        max_y = _cell_size * (_show_height - 1) + px_offset
+    return min_x, min_y, max_x, max_y
+
+
+# returns the set of the board points of the star points of the <board>.
+def get_star_points(board):
+    star_points = set()
+    w, h = board.get_width(), board.get_height()
+    if w > 10 and h > 10:
+        star_points.update([(3, 3), (3, h - 4), (w - 4, 3), (w - 4, h - 4)])
+
+    if board.get_width() > 13 and board.get_width() % 2 == 1:
+        star_points.update([(w // 2, 3), (w // 2, h - 4)])
+
+    if board.get_height() > 13 and board.get_height() % 2 == 1:
+        star_points.update([(3, h // 2), (w - 4, h // 2)])
+
+    if board.get_width() % 2 == 1 and board.get_height() % 2 == 1:
+        star_points.add((w // 2, h // 2))
+    return star_points
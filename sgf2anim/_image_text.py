@@ -1,70 +1,112 @@
+import functools
 import os
 import re
-import numpy as np
 from PIL import Image, ImageDraw, ImageFont
+from ._memory import ResourceCache
 from ._settings import get_settings
 
 _MAX_MOVE_NUM_IMG = 500
-_fonts = {}
-_char_images = {}
-_num_images_for_black = []
-_num_images_for_white = []
+# the number of images of text that are kept by <create_cell_text>.
+MAX_CACHED_TEXT_IMAGES = 1024
+# the number of font sizes and of raw graphics of text that are kept.
+MAX_CACHED_FONT_SIZES = 16
+MAX_CACHED_GLYPHS = 128
+# the filter that graphics are scaled with at each RENDER_QUALITY.
+RESAMPLE_FILTERS = {"final": Image.LANCZOS, "draft": Image.BOX}
+
+
+# returns the RENDER_QUALITY setting, which is one of RESAMPLE_FILTERS.
+def get_render_quality():
+    quality = get_settings().RENDER_QUALITY
+    if quality not in RESAMPLE_FILTERS:
+        raise ValueError(
+            f"RENDER_QUALITY must be one of {list(RESAMPLE_FILTERS)}, not {quality!r}."
+        )
+    return quality
+
+
+def get_resample_filter():
+    return RESAMPLE_FILTERS[get_render_quality()]
 
 
-# loads the style's font and creates image resources to speed up processing time.
+# returns {<quality>: <ResourceCache>} with a cache for every RENDER_QUALITY,
+# so graphics of every quality can be kept at once. if <create> is given,
+# a missing entry is made by calling create(<key>, <resample filter>).
+def create_quality_caches(max_entries, create=None):
+    caches = {}
+    for quality, resample in RESAMPLE_FILTERS.items():
+        if create is None:
+            caches[quality] = ResourceCache(max_entries)
+        else:
+            caches[quality] = ResourceCache(
+                max_entries, functools.partial(create, resample=resample)
+            )
+    return caches
+
+
+_font_path = None
+_placement_image = None
+_fonts = ResourceCache(
+    MAX_CACHED_FONT_SIZES, lambda font_size: ImageFont.truetype(_font_path, font_size)
+)
+# the raw graphics of text that will be scaled down later, as {(<text>, <color>): <image>}.
+_glyphs = ResourceCache(
+    MAX_CACHED_GLYPHS, lambda key: _render_cropped_text(256, key[0], key[1])
+)
+_text_images = create_quality_caches(MAX_CACHED_TEXT_IMAGES)
+
+
+# loads the style's font. the font of each size and the raw graphics
+# of letters and numbers are only made once they're used.
 def load_font(style_name):
-    global _fonts, _char_images, _num_images_for_black, _num_images_for_white
+    global _font_path, _placement_image
 
-    _fonts = {}
-    _char_images = {}
-    _num_images_for_black = []
-    _num_images_for_white = []
+    _fonts.clear()
+    _glyphs.clear()
+    for text_images in _text_images.values():
+        text_images.clear()
 
-    # loads the style's font in multiple sizes.
     current_dir = os.path.dirname(os.path.abspath(__file__))
     load_dir = os.path.join(current_dir, "_res", get_settings().STYLE_NAME)
-    path = os.path.join(load_dir, "font.ttf")
-    if not os.path.exists(path):
-        path = os.path.join(load_dir, "font.otf")
-    for font_size in range(
-        get_settings().MIN_CELL_SIZE, get_settings().MAX_CELL_SIZE + 1
-    ):
-        _fonts[font_size] = ImageFont.truetype(path, font_size)
-
-    # creates raw images for every letter A-Z that will be scaled down later.
-    for i in range(ord("a"), ord("z") + 1):
-        _char_images[chr(i)] = _render_cropped_text(
-            256, chr(i), get_settings().LABEL_COLOR
-        )
+    _font_path = os.path.join(load_dir, "font.ttf")
+    if not os.path.exists(_font_path):
+        _font_path = os.path.join(load_dir, "font.otf")
 
-    # creates the placement symbol and the raw graphics for numbers.
+    # creates the placement symbol.
     path = os.path.join(load_dir, "placement.png")
-    placement_image = make_color_copy(
+    _placement_image = make_color_copy(
         Image.open(path), get_settings().PLACEMENT_MARKER_COLOR
     )
-    _num_images_for_black.append(placement_image)
-    _num_images_for_white.append(placement_image)
-    COLOR_FOR_BLACK = get_settings().NUMBER_COLOR_FOR_BLACK
-    COLOR_FOR_WHITE = get_settings().NUMBER_COLOR_FOR_WHITE
-    for i in range(1, _MAX_MOVE_NUM_IMG + 1):
-        _num_images_for_black.append(_render_cropped_text(256, str(i), COLOR_FOR_BLACK))
-        _num_images_for_white.append(_render_cropped_text(256, str(i), COLOR_FOR_WHITE))
 
 
 # returns a copy of the given <image> with all of its pixels
 # changed to the given <color> while maintaining the original alpha channel.
+# every channel only depends on the alpha, so each one is a lookup of it.
 def make_color_copy(image, color):
-    data = np.array(image)
-    new_color = np.array(color + (255,), dtype=np.uint8)
-    alpha_strengths = data[..., 3:] / 255.0
-    data = new_color * alpha_strengths
-    new_image = Image.fromarray(data.astype(np.uint8))
-    return new_image
+    alpha = image.getchannel("A")
+    bands = [
+        alpha.point([int(value * (strength / 255.0)) for strength in range(256)])
+        for value in color[:3] + (255,)
+    ]
+    return Image.merge("RGBA", bands)
 
 
 # returns an image of <cell_size> that contains the given <text>.
 # the text inside the result will be relatively scaled by <scale>.
+# the last MAX_CACHED_TEXT_IMAGES images of each RENDER_QUALITY are kept until
+# the style changes, so the returned image is shared and must not be drawn on.
 def create_cell_text(cell_size, text, color, scale):
+    text_images = _text_images[get_render_quality()]
+    key = (cell_size, text, tuple(color), scale)
+    if key in text_images:
+        return text_images[key]
+
+    image = _create_cell_text(cell_size, text, color, scale)
+    text_images[key] = image
+    return image
+
+
+def _create_cell_text(cell_size, text, color, scale):
     image = Image.new("RGBA", (cell_size, cell_size), (0, 0, 0, 0))
     if len(text) == 0:
         return image
@@ -72,17 +114,19 @@ def create_cell_text(cell_size, text, color, scale):
     # determines what image graphic will be scaled down to fit inside <image>.
     render_as_placement_marker = False
     if len(text) == 1 and ord("a") <= ord(text[0]) <= ord("z"):
-        graphic = _char_images[text[0]]
+        graphic = _glyphs[(text[0], get_settings().LABEL_COLOR)]
     elif re.fullmatch(r"\d+", text):
         # the <text> only contains digits.
         move_num = int(text)
         if move_num == 0:
             render_as_placement_marker = True
-        if move_num <= _MAX_MOVE_NUM_IMG:
+            graphic = _placement_image
+        elif move_num <= _MAX_MOVE_NUM_IMG:
             if color == get_settings().NUMBER_COLOR_FOR_BLACK:
-                graphic = _num_images_for_black[move_num]
+                number_color = get_settings().NUMBER_COLOR_FOR_BLACK
             else:
-                graphic = _num_images_for_white[move_num]
+                number_color = get_settings().NUMBER_COLOR_FOR_WHITE
+            graphic = _glyphs[(str(move_num), number_color)]
         else:
             graphic = _render_cropped_text(cell_size, text, color)
     else:
@@ -107,7 +151,7 @@ def create_cell_text(cell_size, text, color, scale):
             new_height = int(cell_size * scale)
 
     # scales and then pastes the graphic onto the blank image.
-    graphic = graphic.resize((new_width, new_height), resample=Image.LANCZOS)
+    graphic = graphic.resize((new_width, new_height), resample=get_resample_filter())
     center_x = int(cell_size / 2 - new_width / 2)
     center_y = int(cell_size / 2 - new_height / 2)
     image.paste(graphic, (center_x, center_y))
@@ -0,0 +1,141 @@
+import weakref
+from collections import OrderedDict
+from PIL import Image
+from ._settings import get_settings
+
+# the share of the MEMORY_BUDGET_MB setting that the style's caches can use.
+# the rest is left for the frames of the diagram being rendered.
+CACHE_BUDGET_SHARE = 0.25
+
+# every cache that still exists. a cache that's made for one object,
+# such as the checkpoints of a PositionRenderer, stops counting once it's gone.
+_caches = weakref.WeakSet()
+
+
+# an LRU of the resources made for a style, such as the sprites of one cell size,
+# which keeps at most <max_entries> entries, and entries of at most <max_bytes>
+# if it's given. if <create> is given, a missing entry is made by calling
+# create(<key>) when it's looked up.
+# while the MEMORY_BUDGET_MB setting is set, the oldest entries of every cache
+# are also evicted once the caches together use more than their share of it.
+class ResourceCache:
+    def __init__(self, max_entries, create=None, max_bytes=None):
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._create = create
+        self._entries = OrderedDict()  # {<key>: (<value>, <number of bytes>)}
+        self.n_bytes = 0
+        self.n_hits = 0
+        self.n_misses = 0
+        _caches.add(self)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __getitem__(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.n_hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+        if self._create is None:
+            raise KeyError(key)
+        value = self._create(key)
+        self[key] = value
+        return value
+
+    # a key that wasn't in the cache counts as a miss.
+    def __setitem__(self, key, value):
+        if key in self._entries:
+            self.n_bytes -= self._entries.pop(key)[1]
+        else:
+            self.n_misses += 1
+        n_bytes = get_n_bytes(value)
+        self._entries[key] = (value, n_bytes)
+        self.n_bytes += n_bytes
+        while len(self._entries) > self._max_entries:
+            self._evict_oldest()
+        # the entry that was just added is kept, even if it's too big on its own.
+        while (
+            self._max_bytes is not None
+            and self.n_bytes > self._max_bytes
+            and len(self._entries) > 1
+        ):
+            self._evict_oldest()
+        _trim_caches(self, key)
+
+    def clear(self):
+        self._entries.clear()
+        self.n_bytes = 0
+
+    def _evict_oldest(self):
+        _, (_, n_bytes) = self._entries.popitem(last=False)
+        self.n_bytes -= n_bytes
+
+
+# returns the number of bytes of the pixels of an image,
+# or of every image in a dict, list or tuple of them.
+def get_n_bytes(value):
+    if isinstance(value, Image.Image):
+        return value.width * value.height * len(value.getbands())
+    if isinstance(value, dict):
+        return sum(get_n_bytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(get_n_bytes(item) for item in value)
+    return 0
+
+
+# returns the MEMORY_BUDGET_MB setting in bytes, or None if it isn't set.
+def get_memory_budget():
+    budget_mb = get_settings().MEMORY_BUDGET_MB
+    if budget_mb is None:
+        return None
+    return int(budget_mb * 1024 * 1024)
+
+
+# returns the number of bytes used by every cache of the style's resources.
+def get_cache_bytes():
+    return sum(cache.n_bytes for cache in _caches)
+
+
+# returns the (<hits>, <misses>) of every cache of the style's resources so far.
+def get_cache_hits():
+    return (
+        sum(cache.n_hits for cache in _caches),
+        sum(cache.n_misses for cache in _caches),
+    )
+
+
+# returns the number of bytes the frames of a diagram can be held in
+# before they're moved to disk, or None if there's no limit.
+def get_frame_budget():
+    budget = get_memory_budget()
+    if budget is None:
+        return None
+    return max(0, budget - get_cache_bytes())
+
+
+# evicts the oldest entries of the biggest caches until every cache fits within
+# its share of the budget. the <new_key> that was just added to <new_cache>
+# is kept, since it's about to be used.
+def _trim_caches(new_cache, new_key):
+    budget = get_memory_budget()
+    if budget is None:
+        return
+    max_bytes = budget * CACHE_BUDGET_SHARE
+    while get_cache_bytes() > max_bytes:
+        caches = [
+            cache
+            for cache in _caches
+            if cache.n_bytes > 0
+            and not (cache is new_cache and len(cache._entries) == 1)
+        ]
+        if len(caches) == 0:
+            return
+        cache = max(caches, key=lambda cache: cache.n_bytes)
+        if cache is new_cache and next(iter(cache._entries)) == new_key:
+            cache._entries.move_to_end(new_key)
+        cache._evict_oldest()
@@ -0,0 +1,295 @@
+import json
+import os
+import time
+from ._batch import REASON_NOT_RENDERED, REASON_TIMEOUT, REASON_WORKER_DIED
+from ._memory import get_cache_hits
+from ._profile import (
+    STAGE_NAMES,
+    add_stage_times,
+    get_counts,
+    get_stage_times,
+    subtract_stage_times,
+)
+
+# the Prometheus textfile is written again at most this often while a batch runs.
+PROMETHEUS_WRITE_INTERVAL_S = 10.0
+
+# the upper bounds of the buckets of each histogram.
+SECONDS_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+FRAMES_BUCKETS = (1, 10, 25, 50, 100, 200, 300, 500, 1000)
+
+_PREFIX = "sgf2anim"
+
+
+# returns everything that's measured while rendering in this process so far,
+# which the metrics of a single task are measured from (see <get_task_metrics>).
+def get_metric_totals():
+    n_hits, n_misses = get_cache_hits()
+    return {
+        "stages": get_stage_times(),
+        "n_frames": get_counts().get("frames", 0),
+        "n_resource_hits": n_hits,
+        "n_resource_misses": n_misses,
+    }
+
+
+# returns the metrics of the work done in this process since <before>,
+# which was returned by <get_metric_totals>: the seconds spent in every stage,
+# the number of GIF frames encoded and the hits and misses of the style's caches.
+def get_task_metrics(before):
+    after = get_metric_totals()
+    metrics = {"stages": subtract_stage_times(after["stages"], before["stages"])}
+    for name in ["n_frames", "n_resource_hits", "n_resource_misses"]:
+        metrics[name] = after[name] - before[name]
+    return metrics
+
+
+# returns the kind of failure that a failure reason of <run_tasks> is,
+# which is the type of the error that was raised, if there was one.
+# kinds are kept few, so each one can be a label of a metric.
+def get_failure_kind(reason):
+    if reason in [REASON_TIMEOUT, REASON_WORKER_DIED]:
+        return reason
+    error_name = str(reason).split(":", 1)[0]
+    if error_name.isidentifier():
+        return error_name
+    return REASON_NOT_RENDERED
+
+
+# collects the metrics of a batch job as its files finish. if <jsonl_path>
+# is given, a JSON line of every file and of the whole batch is appended to it.
+# if <prometheus_path> is given, the metrics of the batch so far are written
+# there in the Prometheus text format, which a node exporter's textfile
+# collector can scrape while the batch is still running.
+# <n_jobs> is the number of workers, which their utilisation is measured from.
+class BatchMetrics:
+    def __init__(self, jsonl_path=None, prometheus_path=None, n_jobs=1):
+        self._prometheus_path = prometheus_path
+        self._n_jobs = max(1, n_jobs)
+        self._start_time = time.perf_counter()
+        self._start_timestamp = time.time()
+        self._last_write_time = None
+        self._is_running = True
+
+        self.n_done = 0
+        self.n_failed = 0
+        self.n_skipped = 0
+        self.n_written = 0
+        self.n_cached = 0
+        self.n_frames = 0
+        self.n_bytes = 0
+        self.n_resource_hits = 0
+        self.n_resource_misses = 0
+        self.busy_seconds = 0.0
+        self.failures = {}  # {<failure kind>: <number of files>}
+        self.stage_times = {}
+        self._file_seconds = _Histogram(SECONDS_BUCKETS)
+        self._stage_seconds = {}  # {<stage name>: <_Histogram>}
+        self._frames = _Histogram(FRAMES_BUCKETS)
+
+        self._file = None
+        if jsonl_path is not None:
+            self._file = open(jsonl_path, "a", encoding="utf-8")
+        self._write_prometheus()
+
+    # records that the file at <path> finished after <elapsed> seconds.
+    # <reason> is why it failed, if it didn't succeed. <task_metrics> is a dict
+    # of what was measured while rendering it (see <get_task_metrics>),
+    # with "n_bytes" written and the number of diagrams that were "n_written"
+    # and "n_cached", any of which can be left out.
+    def record(self, path, succeeded, reason, elapsed, task_metrics=None):
+        task_metrics = {} if task_metrics is None else task_metrics
+        stages = task_metrics.get("stages", {})
+        n_frames = task_metrics.get("n_frames", 0)
+        n_bytes = task_metrics.get("n_bytes", 0)
+
+        if succeeded:
+            self.n_done += 1
+        else:
+            self.n_failed += 1
+            kind = get_failure_kind(reason)
+            self.failures[kind] = self.failures.get(kind, 0) + 1
+        self.n_written += task_metrics.get("n_written", 0)
+        self.n_cached += task_metrics.get("n_cached", 0)
+        self.n_frames += n_frames
+        self.n_bytes += n_bytes
+        self.n_resource_hits += task_metrics.get("n_resource_hits", 0)
+        self.n_resource_misses += task_metrics.get("n_resource_misses", 0)
+        self.busy_seconds += elapsed
+        add_stage_times(self.stage_times, stages)
+        self._file_seconds.observe(elapsed)
+        for name, seconds in stages.items():
+            if name not in self._stage_seconds:
+                self._stage_seconds[name] = _Histogram(SECONDS_BUCKETS)
+            self._stage_seconds[name].observe(seconds)
+        if n_frames > 0:
+            self._frames.observe(n_frames)
+
+        if self._file is not None:
+            entry = {
+                "event": "file",
+                "time": round(time.time(), 3),
+                "path": path,
+                "status": "done" if succeeded else "failed",
+                "seconds": round(elapsed, 3),
+                "stages": {name: round(seconds, 4) for name, seconds in stages.items()},
+                "frames": n_frames,
+                "bytes": n_bytes,
+            }
+            if not succeeded:
+                entry["reason"] = str(reason)
+            self._write_line(entry)
+
+        now = time.perf_counter()
+        if now - self._last_write_time >= PROMETHEUS_WRITE_INTERVAL_S:
+            self._write_prometheus()
+
+    # records that a file was skipped, such as because the journal had it.
+    def record_skipped(self):
+        self.n_skipped += 1
+
+    # returns a dict of the totals of the batch so far.
+    def get_summary(self):
+        wall_seconds = time.perf_counter() - self._start_time
+        n_files = self.n_done + self.n_failed
+        n_renders = self.n_written + self.n_cached
+        n_lookups = self.n_resource_hits + self.n_resource_misses
+        return {
+            "n_files": n_files,
+            "n_done": self.n_done,
+            "n_failed": self.n_failed,
+            "n_skipped": self.n_skipped,
+            "failures": dict(self.failures),
+            "seconds": wall_seconds,
+            "files_per_second": n_files / wall_seconds if wall_seconds > 0 else 0.0,
+            "worker_utilisation": _get_ratio(
+                self.busy_seconds, wall_seconds * self._n_jobs
+            ),
+            "stage_seconds": dict(self.stage_times),
+            "n_written": self.n_written,
+            "n_cached": self.n_cached,
+            "n_frames": self.n_frames,
+            "frames_per_file": _get_ratio(self.n_frames, self._frames.count),
+            "n_bytes": self.n_bytes,
+            "diagram_cache_hit_ratio": _get_ratio(self.n_cached, n_renders),
+            "resource_cache_hit_ratio": _get_ratio(self.n_resource_hits, n_lookups),
+        }
+
+    # writes the summary and the final metrics.
+    def close(self):
+        self._is_running = False
+        if self._file is not None:
+            self._write_line({"event": "summary", **self.get_summary()})
+            self._file.close()
+            self._file = None
+        self._write_prometheus()
+
+    def _write_line(self, entry):
+        # every line is flushed so it can be followed while the batch runs.
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+
+    def _write_prometheus(self):
+        self._last_write_time = time.perf_counter()
+        if self._prometheus_path is None:
+            return
+
+        summary = self.get_summary()
+        lines = []
+        _add_metric(lines, "running", "gauge", "1 while the batch is running.")
+        lines.append(f"{_PREFIX}_running {int(self._is_running)}")
+        _add_metric(lines, "start_time_seconds", "gauge", "when the batch started.")
+        lines.append(f"{_PREFIX}_start_time_seconds {self._start_timestamp:.3f}")
+
+        _add_metric(lines, "files_total", "counter", "files that finished.")
+        lines.append(f'{_PREFIX}_files_total{{status="done"}} {self.n_done}')
+        lines.append(f'{_PREFIX}_files_total{{status="failed"}} {self.n_failed}')
+        lines.append(f'{_PREFIX}_files_total{{status="skipped"}} {self.n_skipped}')
+        _add_metric(lines, "failures_total", "counter", "files that failed.")
+        for kind, n_files in sorted(self.failures.items()):
+            lines.append(
+                f'{_PREFIX}_failures_total{{reason="{_escape(kind)}"}} {n_files}'
+            )
+        _add_metric(lines, "files_per_second", "gauge", "files finished per second.")
+        lines.append(f"{_PREFIX}_files_per_second {summary['files_per_second']:.4f}")
+        _add_metric(
+            lines, "worker_utilisation", "gauge", "the share of time workers were busy."
+        )
+        lines.append(
+            f"{_PREFIX}_worker_utilisation {summary['worker_utilisation']:.4f}"
+        )
+
+        _add_metric(lines, "file_seconds", "histogram", "seconds to render a file.")
+        self._file_seconds.add_lines(lines, "file_seconds", "")
+        _add_metric(
+            lines, "stage_seconds", "histogram", "seconds spent in a stage per file."
+        )
+        names = [name for name in STAGE_NAMES if name in self._stage_seconds]
+        names += sorted(name for name in self._stage_seconds if name not in names)
+        for name in names:
+            self._stage_seconds[name].add_lines(
+                lines, "stage_seconds", f'stage="{_escape(name)}"'
+            )
+        _add_metric(lines, "frames", "histogram", "GIF frames encoded per file.")
+        self._frames.add_lines(lines, "frames", "")
+
+        _add_metric(lines, "bytes_written_total", "counter", "bytes of diagrams.")
+        lines.append(f"{_PREFIX}_bytes_written_total {self.n_bytes}")
+        _add_metric(lines, "diagrams_total", "counter", "diagrams saved.")
+        lines.append(f'{_PREFIX}_diagrams_total{{source="rendered"}} {self.n_written}')
+        lines.append(f'{_PREFIX}_diagrams_total{{source="cache"}} {self.n_cached}')
+        _add_metric(
+            lines, "resource_cache_lookups_total", "counter", "style cache lookups."
+        )
+        lines.append(
+            f'{_PREFIX}_resource_cache_lookups_total{{result="hit"}} '
+            f"{self.n_resource_hits}"
+        )
+        lines.append(
+            f'{_PREFIX}_resource_cache_lookups_total{{result="miss"}} '
+            f"{self.n_resource_misses}"
+        )
+
+        # the file is renamed into place so it's never scraped half written.
+        temp_path = f"{self._prometheus_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(temp_path, self._prometheus_path)
+
+
+# a Prometheus histogram of values, with cumulative buckets.
+class _Histogram:
+    def __init__(self, bounds):
+        self._bounds = bounds
+        self._counts = [0] * len(bounds)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self._bounds):
+            if value <= bound:
+                self._counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def add_lines(self, lines, name, labels):
+        prefix = "" if labels == "" else labels + ","
+        for bound, n_values in zip(self._bounds, self._counts):
+            lines.append(f'{_PREFIX}_{name}_bucket{{{prefix}le="{bound}"}} {n_values}')
+        lines.append(f'{_PREFIX}_{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        labels = "" if labels == "" else "{" + labels + "}"
+        lines.append(f"{_PREFIX}_{name}_sum{labels} {self.sum:.6f}")
+        lines.append(f"{_PREFIX}_{name}_count{labels} {self.count}")
+
+
+def _add_metric(lines, name, metric_type, help_text):
+    lines.append(f"# HELP {_PREFIX}_{name} {help_text}")
+    lines.append(f"# TYPE {_PREFIX}_{name} {metric_type}")
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _get_ratio(numerator, denominator):
+    return numerator / denominator if denominator > 0 else 0.0
@@ -0,0 +1,244 @@
+import bisect
+import copy
+import hashlib
+import io
+from collections import OrderedDict
+from PIL import Image
+from ._commands import (
+    apply_command,
+    draw_command,
+    finish_setup_moves,
+    get_has_used_line_annotations,
+    get_line_annotations_image,
+    set_move_num,
+)
+from ._draw import reset_annotations
+from ._image_resources import get_board_image
+from ._memory import ResourceCache
+from ._profile import stage
+from ._save_png import save_PNG_to_file
+from ._settings import get_settings
+from ._views import get_view_state, set_view_state, setup_view
+
+# the number of games whose PositionRenderer is kept by <render_position>.
+MAX_CACHED_GAMES = 8
+
+# the megabytes of checkpoints that a PositionRenderer keeps by default.
+MAX_CHECKPOINT_MB = 32
+
+_renderers = OrderedDict()
+
+
+# renders the static diagram of any position of a game.
+# while the game is played, a checkpoint of the board and every drawn layer
+# is kept after every <checkpoint_interval> nodes, so a position is drawn
+# by restoring the nearest checkpoint before it and only playing the nodes
+# after that. stepping forward from the last rendered position continues
+# from it without restoring anything.
+# the checkpoints after the setup node are kept within <max_checkpoint_mb>
+# and count towards the MEMORY_BUDGET_MB setting, which both drop
+# the checkpoints used least recently first.
+# <game> is either the text of an SGF or a CompiledGame.
+# the checkpoints are made again whenever the settings have changed.
+class PositionRenderer:
+    def __init__(
+        self,
+        game,
+        sgf_path=None,
+        checkpoint_interval: int = 16,
+        max_checkpoint_mb: float = MAX_CHECKPOINT_MB,
+    ):
+        from . import _parse_content
+
+        if isinstance(game, str):
+            with stage("parse"):
+                game = _parse_content(game)
+            if game is None:
+                raise ValueError("the SGF could not be parsed.")
+        self._game = game
+        self._sgf_path = sgf_path
+        self._checkpoint_interval = max(1, checkpoint_interval)
+        self._settings_values = None
+        self._base_image = None
+        self._first_checkpoint = None  # the checkpoint of the setup node.
+        self._checkpoints = ResourceCache(
+            len(game.nodes), max_bytes=int(max_checkpoint_mb * 1024 * 1024)
+        )  # {<node index>: <checkpoint>}
+        self._checkpoint_indices = []  # sorted, including any that were dropped.
+        self._current = None  # the state of the last rendered position.
+
+    # the number of positions, one after every node (including the setup node).
+    def __len__(self):
+        return len(self._game.nodes)
+
+    # returns the RGBA image of the position after the node at <node_index>.
+    def render_image(self, node_index: int):
+        self._update_settings()
+        if node_index < 0:
+            node_index += len(self)
+        if not 0 <= node_index < len(self):
+            raise IndexError("node index out of range.")
+
+        with stage("replay"):
+            self._move_to(node_index)
+            image = self._base_image.copy()
+            image.alpha_composite(self._current["stones_image"])
+            image.alpha_composite(self._current["annotations_image"])
+            if get_has_used_line_annotations():
+                image.alpha_composite(get_line_annotations_image())
+        return image
+
+    # returns the PNG bytes of the position after the node at <node_index>.
+    def render(self, node_index: int):
+        image = self.render_image(node_index)
+        out_file = io.BytesIO()
+        with stage("encode"):
+            save_PNG_to_file(out_file, image)
+        return out_file.getvalue()
+
+    # sets up the board and the first checkpoint if the settings have changed.
+    def _update_settings(self):
+        from . import _create_change_image
+
+        settings_values = get_settings().to_dict()
+        if settings_values == self._settings_values:
+            set_view_state(self._current["view_state"])
+            return
+        self._settings_values = settings_values
+
+        with stage("board"):
+            board = setup_view(self._sgf_path, self._game, None)
+        reset_annotations()
+        stones_image = _create_change_image()
+        annotations_image = _create_change_image()
+        for op in self._game.nodes[0].ops:
+            cleared_points = apply_command(op, board)
+            draw_command(op, cleared_points, stones_image, annotations_image, board)
+        finish_setup_moves()
+
+        self._base_image = Image.alpha_composite(get_board_image(), stones_image)
+        self._base_image.alpha_composite(annotations_image)
+        self._current = {
+            "node_index": 0,
+            "board": board,
+            "stones_image": stones_image,
+            "annotations_image": annotations_image,
+            "view_state": get_view_state(),
+        }
+        self._first_checkpoint = _create_checkpoint(self._current)
+        self._checkpoints.clear()
+        self._checkpoint_indices = []
+
+    # makes the position after the node at <node_index> the current one.
+    def _move_to(self, node_index):
+        checkpoint = self._find_checkpoint(node_index)
+        current_index = self._current["node_index"]
+        if not checkpoint["node_index"] <= current_index <= node_index:
+            self._current = _restore_checkpoint(checkpoint, self._current["view_state"])
+            set_view_state(self._current["view_state"])
+
+        state = self._current
+        for index in range(state["node_index"] + 1, node_index + 1):
+            self._play_node(self._game.nodes[index])
+            state["node_index"] = index
+            if index % self._checkpoint_interval == 0:
+                state["view_state"] = get_view_state()
+                self._save_checkpoint()
+        state["view_state"] = get_view_state()
+
+    def _play_node(self, node):
+        state = self._current
+        if node.move_num is not None:
+            set_move_num(node.move_num)
+        for op in node.ops:
+            cleared_points = apply_command(op, state["board"])
+            draw_command(
+                op,
+                cleared_points,
+                state["stones_image"],
+                state["annotations_image"],
+                state["board"],
+            )
+
+    def _save_checkpoint(self):
+        node_index = self._current["node_index"]
+        if node_index not in self._checkpoints:
+            self._checkpoints[node_index] = _create_checkpoint(self._current)
+            if node_index not in self._checkpoint_indices:
+                bisect.insort(self._checkpoint_indices, node_index)
+
+    # returns the latest checkpoint that's still kept at or before <node_index>.
+    def _find_checkpoint(self, node_index):
+        i = bisect.bisect_right(self._checkpoint_indices, node_index) - 1
+        while i >= 0:
+            checkpoint_index = self._checkpoint_indices[i]
+            if checkpoint_index in self._checkpoints:
+                return self._checkpoints[checkpoint_index]
+            i -= 1
+        return self._first_checkpoint
+
+
+# returns the PNG bytes of the position after the node at <node_index>
+# of the game in the SGF text <content>. the PositionRenderer of the
+# last MAX_CACHED_GAMES games are kept, so the checkpoints of a game
+# are reused by every later position rendered from the same text.
+def render_position(content: str, node_index: int):
+    key = hashlib.sha256(content.encode("utf-8")).digest()
+    renderer = _renderers.get(key)
+    if renderer is None:
+        renderer = PositionRenderer(content)
+        _renderers[key] = renderer
+        while len(_renderers) > MAX_CACHED_GAMES:
+            _renderers.popitem(last=False)
+    else:
+        _renderers.move_to_end(key)
+    return renderer.render(node_index)
+
+
+# returns a checkpoint of a position's <state>, which holds a copy of
+# everything drawn so far but not the board images and label backgrounds
+# that every position of the game shares, so only its own images are counted.
+def _create_checkpoint(state):
+    _, draw_state, commands_state = state["view_state"]
+    annotations, dirty_box, _ = draw_state
+    move_num, has_used_lines, lines_image, lines_box = commands_state
+    return {
+        "node_index": state["node_index"],
+        "board": copy.deepcopy(state["board"]),
+        "stones_image": state["stones_image"].copy(),
+        "annotations_image": state["annotations_image"].copy(),
+        "lines_image": None if lines_image is None else lines_image.copy(),
+        "annotations": [list(column) for column in annotations],
+        "dirty_box": dirty_box,
+        "move_num": move_num,
+        "has_used_lines": has_used_lines,
+        "lines_box": lines_box,
+    }
+
+
+# returns a position's state from a <checkpoint>, which can be drawn on
+# without changing the checkpoint. the shared parts of the view are taken
+# from <view_state>, the view state of any position of the same game.
+def _restore_checkpoint(checkpoint, view_state):
+    resources_state, (_, _, label_backgrounds), _ = view_state
+    lines_image = checkpoint["lines_image"]
+    return {
+        "node_index": checkpoint["node_index"],
+        "board": copy.deepcopy(checkpoint["board"]),
+        "stones_image": checkpoint["stones_image"].copy(),
+        "annotations_image": checkpoint["annotations_image"].copy(),
+        "view_state": (
+            resources_state,
+            (
+                [list(column) for column in checkpoint["annotations"]],
+                checkpoint["dirty_box"],
+                label_backgrounds,
+            ),
+            (
+                checkpoint["move_num"],
+                checkpoint["has_used_lines"],
+                None if lines_image is None else lines_image.copy(),
+                checkpoint["lines_box"],
+            ),
+        ),
+    }
@@ -0,0 +1,188 @@
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on Windows.
+    resource = None
+
+# the names of the stages that rendering is timed in, in the order they happen.
+STAGE_NAMES = ("read", "parse", "style", "board", "replay", "encode", "write")
+
+_stage_seconds = {}
+_stage_counts = {}
+_stage_peaks = {}  # {<name>: [<traced peak bytes>, <resident peak growth bytes>]}
+_counts = {}
+_local = threading.local()
+_END = object()
+
+
+# times the code run inside of the with-block as part of the stage <name>.
+# time spent in a stage that's nested inside of another stage
+# is only counted toward the inner stage.
+# while memory is traced (see <start_memory_trace>), the peak memory
+# of the stage is recorded as well, including its nested stages.
+@contextmanager
+def stage(name):
+    # every thread has its own stack of
+    # [<name>, <seconds in nested stages>, <traced peak bytes so far>].
+    if not hasattr(_local, "stage_stack"):
+        _local.stage_stack = []
+    stage_stack = _local.stage_stack
+
+    is_tracing = tracemalloc.is_tracing()
+    if is_tracing:
+        if len(stage_stack) > 0:
+            stage_stack[-1][2] = max(stage_stack[-1][2], _get_traced_peak())
+        tracemalloc.reset_peak()
+        start_resident_peak = _get_resident_peak()
+
+    start_time = time.perf_counter()
+    stage_stack.append([name, 0.0, 0])
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start_time
+        _, nested_seconds, traced_peak = stage_stack.pop()
+        if len(stage_stack) > 0:
+            stage_stack[-1][1] += elapsed
+        _stage_seconds[name] = _stage_seconds.get(name, 0.0) + elapsed - nested_seconds
+        _stage_counts[name] = _stage_counts.get(name, 0) + 1
+
+        if is_tracing and tracemalloc.is_tracing():
+            traced_peak = max(traced_peak, _get_traced_peak())
+            if len(stage_stack) > 0:
+                stage_stack[-1][2] = max(stage_stack[-1][2], traced_peak)
+            resident_growth = _get_resident_peak() - start_resident_peak
+            peaks = _stage_peaks.setdefault(name, [0, 0])
+            peaks[0] = max(peaks[0], traced_peak)
+            peaks[1] = max(peaks[1], resident_growth)
+
+
+# yields every item of <iterable>, timing the work of producing each one
+# (such as by a generator) as part of the stage <name>.
+def timed_iter(iterable, name):
+    iterator = iter(iterable)
+    while True:
+        with stage(name):
+            item = next(iterator, _END)
+        if item is _END:
+            return
+        yield item
+
+
+# returns the total number of seconds spent in every stage so far.
+def get_stage_times():
+    return dict(_stage_seconds)
+
+
+def reset_stage_times():
+    _stage_seconds.clear()
+    _stage_counts.clear()
+    _stage_peaks.clear()
+    _counts.clear()
+
+
+# adds <n> to the count of <name>, such as the number of frames encoded.
+def add_count(name, n=1):
+    _counts[name] = _counts.get(name, 0) + n
+
+
+# returns the total of every count so far.
+def get_counts():
+    return dict(_counts)
+
+
+# starts tracing the memory allocated by Python (and numpy) with tracemalloc,
+# after which every stage also records its peak memory.
+# images made by Pillow aren't traced, so the growth of the process's
+# peak resident memory during each stage is recorded too, where it's known.
+def start_memory_trace():
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def stop_memory_trace():
+    tracemalloc.stop()
+
+
+# returns the peak memory of every stage as
+# {<name>: [<traced peak bytes>, <resident peak growth bytes>]}.
+# the traced peak is the most that was allocated at once during any run of the
+# stage, and the resident growth is how much the process's peak grew by.
+def get_stage_peaks():
+    return {name: list(peaks) for name, peaks in _stage_peaks.items()}
+
+
+# combines the stage peaks of <peaks> into <total_peaks>, keeping the largest.
+def add_stage_peaks(total_peaks, peaks):
+    for name, (traced_peak, resident_growth) in peaks.items():
+        total = total_peaks.setdefault(name, [0, 0])
+        total[0] = max(total[0], traced_peak)
+        total[1] = max(total[1], resident_growth)
+
+
+# returns the seconds spent in each stage between two results of <get_stage_times>.
+def subtract_stage_times(after, before):
+    return {
+        name: seconds - before.get(name, 0.0)
+        for name, seconds in after.items()
+        if seconds - before.get(name, 0.0) > 0
+    }
+
+
+# adds the stage times of <times> onto <total_times>.
+def add_stage_times(total_times, times):
+    for name, seconds in times.items():
+        total_times[name] = total_times.get(name, 0.0) + seconds
+
+
+# returns a printable table of the given stage times.
+def format_stage_times(times, n_files=None, wall_seconds=None):
+    names = [name for name in STAGE_NAMES if name in times]
+    names += sorted(name for name in times if name not in STAGE_NAMES)
+    total = sum(times.values())
+
+    lines = [f"{'stage':<10}{'seconds':>10}{'share':>9}{'ms/file':>10}"]
+    for name in names:
+        seconds = times[name]
+        share = 0.0 if total == 0 else seconds / total * 100
+        per_file = "" if not n_files else f"{seconds / n_files * 1000:.1f}"
+        lines.append(f"{name:<10}{seconds:>10.3f}{share:>8.1f}%{per_file:>10}")
+    lines.append(f"{'total':<10}{total:>10.3f}")
+
+    if wall_seconds is not None:
+        lines.append(f"{'wall':<10}{wall_seconds:>10.3f}")
+        if n_files and wall_seconds > 0:
+            lines.append(f"{n_files / wall_seconds:.2f} files per second.")
+    return "\n".join(lines)
+
+
+# returns a printable table of the given stage peaks.
+def format_stage_peaks(peaks):
+    names = [name for name in STAGE_NAMES if name in peaks]
+    names += sorted(name for name in peaks if name not in STAGE_NAMES)
+
+    lines = [f"{'stage':<10}{'traced MB':>12}{'resident MB':>14}"]
+    for name in names:
+        traced_peak, resident_growth = peaks[name]
+        lines.append(
+            f"{name:<10}{traced_peak / 2**20:>12.1f}{resident_growth / 2**20:>14.1f}"
+        )
+    return "\n".join(lines)
+
+
+def _get_traced_peak():
+    return tracemalloc.get_traced_memory()[1]
+
+
+# returns the peak resident memory of the process in bytes, or 0 if it's unknown.
+def _get_resident_peak():
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux gives kilobytes and macOS gives bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
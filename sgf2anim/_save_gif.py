@@ -1,6 +1,9 @@
-import numpy as np
-import imageio.v3 as imageio
+import tempfile
 from PIL import Image
+from ._image_text import get_render_quality
+from ._memory import get_frame_budget
+from ._profile import add_count
+from ._save_png import get_palette_image
 from ._settings import get_settings
 
 
@@ -12,25 +15,175 @@ def save_GIF_to_file(
     end_freeze_ms=10000,
     number_display_ms=500,
 ):
-    n_frames = len(frames)
-    extra_frame_ms = max(0, frame_delay_ms - number_display_ms)
+    frames = iter_GIF_frames(
+        frames, frame_delay_ms, start_freeze_ms, end_freeze_ms, number_display_ms
+    )
+    if get_render_quality() == "draft":
+        _save_draft_GIF(save_path, frames)
+        return
+
+    # imageio (and numpy) are only imported once a GIF is saved.
+    import imageio.v3 as imageio
+
+    durations = []
+    frame_buffer = _FrameBuffer(get_frame_budget())
+    try:
+        for frame, duration in frames:
+            durations.append(duration)
+            frame_buffer.append(frame)
 
+        imageio.imwrite(
+            save_path,
+            frame_buffer.get_frames(),
+            extension=".gif",
+            duration=durations,
+            loop=0,
+            subrectangles=True,
+        )
+        add_count("frames", len(durations))
+    finally:
+        frame_buffer.close()
+
+
+# saves the (<image>, <duration>) frames of a draft (see RENDER_QUALITY) as a GIF.
+# instead of a palette being found for every frame, each frame is drawn
+# as it's seen and given the style's palette (see <get_palette_image>),
+# which is several times faster. Pillow only saves what changed in each frame.
+def _save_draft_GIF(save_path, frames):
+    shown_image = None
+    images = []
     durations = []
-    save_frames = []
-    for i in range(n_frames):
-        frame = frames[i][0]
-        is_extra_frame = frames[i][1]
+    for frame, duration in frames:
+        if shown_image is None:
+            shown_image = frame.copy()
+        else:
+            shown_image.alpha_composite(frame)
+        image = shown_image.convert("RGB")
+        images.append(
+            image.quantize(palette=get_palette_image(), dither=Image.Dither.NONE)
+        )
+        durations.append(duration)
+
+    images[0].save(
+        save_path,
+        format="GIF",
+        save_all=True,
+        append_images=images[1:],
+        duration=durations,
+        loop=0,
+        optimize=False,  # the palette is already the style's.
+    )
+    add_count("frames", len(images))
+
+
+# holds the frames of a GIF until they're all encoded together.
+# once the frames would take more than <max_bytes>, every frame is moved
+# to a temporary file, which the encoder reads back one frame at a time.
+class _FrameBuffer:
+    def __init__(self, max_bytes=None):
+        self._max_bytes = max_bytes
+        self._frames = []
+        self._n_bytes = 0
+        self._file = None
+        self._shape = None
+        self._n_frames = 0
 
-        if not is_extra_frame and extra_frame_ms == 0 and i - 1 >= 0:
-            prev_frame = frames[i - 1][0]
-            prev_is_extra_frame = frames[i - 1][1]
-            if prev_is_extra_frame:
-                frame = Image.alpha_composite(prev_frame, frame)
+    def append(self, frame):
+        import numpy as np
+
+        data = np.array(frame, dtype=np.uint8)
+        self._shape = data.shape
+        self._n_frames += 1
+        self._n_bytes += data.nbytes
+        if (
+            self._file is None
+            and self._max_bytes is not None
+            and self._n_bytes > self._max_bytes
+        ):
+            self._file = tempfile.TemporaryFile(prefix="sgf2anim-frames-")
+            for buffered_data in self._frames:
+                self._file.write(buffered_data.tobytes())
+            self._frames = []
+
+        if self._file is None:
+            self._frames.append(data)
+        else:
+            self._file.write(data.tobytes())
+
+    # returns the frames as a list of arrays, or as one array
+    # mapped from the temporary file if they were moved to disk.
+    def get_frames(self):
+        import numpy as np
+
+        if self._file is None:
+            return self._frames
+        self._file.flush()
+        return np.memmap(
+            self._file, dtype=np.uint8, mode="r", shape=(self._n_frames,) + self._shape
+        )
+
+    def close(self):
+        self._frames = []
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# yields every frame that will be saved to the GIF with its duration,
+# from the (<image>, <is extra frame>) tuples that are given by <frames>.
+# <frames> can be a generator, since each frame is yielded
+# as soon as the frame after it has been given.
+def iter_GIF_frames(
+    frames,
+    frame_delay_ms=1500,
+    start_freeze_ms=3000,
+    end_freeze_ms=10000,
+    number_display_ms=500,
+):
+    frames = iter_timed_frames(
+        frames, frame_delay_ms, start_freeze_ms, end_freeze_ms, number_display_ms
+    )
+    if get_settings().MERGE_DUPLICATE_FRAMES:
+        frames = _merge_duplicate_frames(frames)
+    return frames
+
+
+# yields every frame that is shown with its duration, from the
+# (<frame>, <is extra frame>) tuples that are given by <frames>.
+# an extra frame that isn't shown on its own is combined into the frame after it
+# with <combine>(<extra frame>, <frame>), which composites images by default.
+# frames can be anything that <combine> accepts, so bundles are timed this way too.
+def iter_timed_frames(
+    frames,
+    frame_delay_ms,
+    start_freeze_ms,
+    end_freeze_ms,
+    number_display_ms,
+    combine=None,
+):
+    if combine is None:
+        combine = Image.alpha_composite
+    extra_frame_ms = max(0, frame_delay_ms - number_display_ms)
+
+    frames = iter(frames)
+    next_frame = next(frames, None)
+    prev_frame = None
+    pending = None  # the last frame to be saved, which is yielded later.
+    is_first = True
+    while next_frame is not None:
+        frame, is_extra_frame = next_frame
+        next_frame = next(frames, None)
+        is_last = next_frame is None
+
+        if not is_extra_frame and extra_frame_ms == 0 and prev_frame is not None:
+            if prev_frame[1]:
+                frame = combine(prev_frame[0], frame)
+        prev_frame = (frame, is_extra_frame)
 
         if (
             extra_frame_ms > 0
             or not is_extra_frame
-            or (i == n_frames - 1 and not get_settings().MAINTAIN_NUMBERS_AT_END)
+            or (is_last and not get_settings().MAINTAIN_NUMBERS_AT_END)
         ):
             if get_settings().MAINTAIN_STONE_NUMBERS:
                 duration = frame_delay_ms
@@ -38,11 +191,48 @@ def save_GIF_to_file(
                 duration = extra_frame_ms
             else:
                 duration = number_display_ms
-            durations.append(duration)
-            save_frames.append(np.array(frame, dtype=np.uint8))
 
-    durations[0] = start_freeze_ms
-    durations[-1] = end_freeze_ms
-    imageio.imwrite(
-        save_path, save_frames, duration=durations, loop=0, subrectangles=True
-    )
+            if pending is not None:
+                yield pending
+            if is_first:
+                duration = start_freeze_ms
+                is_first = False
+            pending = (frame, duration)
+
+    if pending is not None:
+        yield pending[0], end_freeze_ms
+
+
+# yields the given (<image>, <duration>) frames, except that any frame
+# which wouldn't visibly change the GIF is dropped and its duration
+# is added to the frame before it. after the first frame, every frame only
+# holds the cells that changed, so each one is only compared
+# with what's already shown within the region that it covers.
+def _merge_duplicate_frames(frames):
+    shown_image = None
+    pending = None
+    for frame, duration in frames:
+        if shown_image is None:
+            shown_image = frame.copy()
+            pending = [frame, duration]
+            continue
+
+        bbox = frame.getchannel("A").getbbox()
+        if bbox is not None:
+            shown_region = shown_image.crop(bbox)
+            new_region = Image.alpha_composite(shown_region, frame.crop(bbox))
+            if new_region.tobytes() == shown_region.tobytes():
+                bbox = None
+            else:
+                shown_image.paste(new_region, bbox[:2])
+
+        if bbox is None:
+            # the frame doesn't change anything.
+            pending[1] += duration
+            continue
+
+        yield tuple(pending)
+        pending = [frame, duration]
+
+    if pending is not None:
+        yield tuple(pending)
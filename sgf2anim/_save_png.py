@@ -0,0 +1,124 @@
+import io
+from PIL import Image, ImageDraw
+from ._image_resources import (
+    BOARD_COLOR,
+    get_board_texture,
+    get_stone_images,
+    get_style_key,
+)
+from ._image_text import create_cell_text, get_render_quality
+from ._memory import ResourceCache
+from ._settings import get_settings
+
+# the zlib compression level of each PNG_COMPRESSION tier.
+PNG_COMPRESS_LEVELS = {"fastest": 1, "balanced": 6, "smallest": 9}
+# the number of palettes that are kept, one for each style and RENDER_QUALITY.
+MAX_CACHED_PALETTES = 8
+
+# the cell size of the swatch that a palette is made from. it's always the same,
+# so the palette only depends on the style and not on which diagram came first.
+_SWATCH_CELL_SIZE = 64
+
+_palette_images = ResourceCache(MAX_CACHED_PALETTES)
+
+
+# saves the <image> of a static diagram as a PNG to <out>,
+# which is a file path or a file object.
+def save_PNG_to_file(out, image):
+    compress_level = get_compress_level()
+    image = image.convert("RGB")
+    if get_settings().PNG_PALETTE:
+        image = image.quantize(palette=get_palette_image(), dither=Image.Dither.NONE)
+    image.save(out, format="PNG", compress_level=compress_level)
+
+
+# returns the PNG bytes of <image> with all of its colors, at the zlib
+# <compress_level> (by default, the level of the PNG_COMPRESSION setting).
+def encode_PNG(image, compress_level=None):
+    if compress_level is None:
+        compress_level = get_compress_level()
+    out_file = io.BytesIO()
+    image.save(out_file, format="PNG", compress_level=compress_level)
+    return out_file.getvalue()
+
+
+# returns the zlib compression level of the PNG_COMPRESSION setting.
+# drafts (see RENDER_QUALITY) are always saved at the "fastest" level.
+def get_compress_level():
+    tier = get_settings().PNG_COMPRESSION
+    if tier not in PNG_COMPRESS_LEVELS:
+        raise ValueError(
+            f"PNG_COMPRESSION must be one of {list(PNG_COMPRESS_LEVELS)}, "
+            f"not {tier!r}."
+        )
+    if get_render_quality() == "draft":
+        return PNG_COMPRESS_LEVELS["fastest"]
+    return PNG_COMPRESS_LEVELS[tier]
+
+
+# returns an image whose palette holds the colors of the current style.
+# it's made once for every style and RENDER_QUALITY from a swatch of the board
+# and every stone, annotation and text color a diagram could contain,
+# so every diagram of a style gets the same palette whatever order they're in.
+def get_palette_image():
+    settings = get_settings()
+    key = get_style_key() + (
+        settings.ANNOTATE_LINE_COLOR,
+        settings.LABEL_TEXT_SCALE,
+        settings.NUMBER_TEXT_SCALE,
+        get_render_quality(),
+    )
+    if key not in _palette_images:
+        _palette_images[key] = _create_swatch().quantize(
+            colors=256, method=Image.Quantize.MEDIANCUT
+        )
+    return _palette_images[key]
+
+
+# returns an image of every graphic of the current style drawn over the board,
+# above the board's lines and a strip of the annotation lines' color.
+def _create_swatch():
+    settings = get_settings()
+    cell_size = _SWATCH_CELL_SIZE
+    stone_images = get_stone_images()[cell_size]
+    black_number = create_cell_text(
+        cell_size, "8", settings.NUMBER_COLOR_FOR_BLACK, settings.NUMBER_TEXT_SCALE
+    )
+    white_number = create_cell_text(
+        cell_size, "8", settings.NUMBER_COLOR_FOR_WHITE, settings.NUMBER_TEXT_SCALE
+    )
+    marker = create_cell_text(
+        cell_size, "0", settings.PLACEMENT_MARKER_COLOR, settings.NUMBER_TEXT_SCALE
+    )
+    label = create_cell_text(
+        cell_size, "a", settings.LABEL_COLOR, settings.LABEL_TEXT_SCALE
+    )
+
+    graphics = [stone_images[key] for key in stone_images] + [label]
+    graphics += [
+        Image.alpha_composite(stone_images["B"], black_number),
+        Image.alpha_composite(stone_images["W"], white_number),
+        Image.alpha_composite(stone_images["B"], marker),
+        Image.alpha_composite(stone_images["W"], marker),
+    ]
+
+    width = cell_size * len(graphics)
+    swatch = Image.new("RGBA", (width, cell_size * 3), BOARD_COLOR + (255,))
+    if get_render_quality() != "draft":
+        # a draft's board is only filled with the flat color.
+        texture = get_board_texture().convert("RGBA")
+        swatch.paste(texture.resize((width, width), Image.LANCZOS), (0, 0))
+    for i, graphic in enumerate(graphics):
+        swatch.alpha_composite(graphic, (i * cell_size, 0))
+
+    draw = ImageDraw.Draw(swatch)
+    for i in range(len(graphics)):
+        x = i * cell_size + cell_size // 2
+        draw.line(
+            [(x, cell_size), (x, cell_size * 2)],
+            fill=settings.LINE_COLOR,
+            width=i % 3 + 1,
+        )
+    line_color = settings.ANNOTATE_LINE_COLOR + (255,)
+    swatch.paste(line_color, (0, cell_size * 2, width, swatch.height))
+    return swatch.convert("RGB")
@@ -0,0 +1,335 @@
+import base64
+import os
+from PIL import Image
+from ._cells import LABEL_PREFIX, get_line_pixels
+from ._image_resources import (
+    BOARD_COLOR,
+    get_board_line_extents,
+    get_board_line_width,
+    get_board_start_point,
+    get_board_texture_path,
+    get_cell_size,
+    get_draw_cell_size,
+    get_scaled_margin,
+    get_show_height,
+    get_show_width,
+    get_star_points,
+    get_style_directory,
+    get_style_image_path,
+    get_style_key,
+)
+from ._image_text import make_color_copy
+from ._save_png import encode_PNG
+from ._settings import get_settings
+
+_FONT_FAMILY = "sgf2anim"
+
+# the sizes of the glyphs of a font, relative to its size,
+# which are used to fit text within a cell in the same way as <create_cell_text>.
+_GLYPH_HEIGHT = 0.72
+_DIGIT_WIDTH = 0.6
+
+# the markup whose graphics are drawn with shapes, which are measured from
+# the style's images of them. the stones and the placement marker are images.
+_SHAPE_KEYS = ("CR", "DD", "MA", "SL", "SQ", "TR")
+
+# the SVG of the style's graphics, as {(<style key>, <key>): <SVG>}.
+_graphic_svgs = {}
+
+
+# saves the SVG of the static diagram of a game to <out>, which is a file path
+# or a file object, from the CellReplay <replay> of every node of the game
+# on the <board>. the board is drawn with vector lines and star points,
+# and every graphic of the style is defined once and then referenced.
+def save_SVG_to_file(out, replay, board):
+    settings = get_settings()
+    margin = get_scaled_margin()
+    cell_size = get_cell_size()
+    width = margin * 2 + cell_size * get_show_width()
+    height = margin * 2 + cell_size * get_show_height()
+    cells = replay.get_cells()
+
+    graphic_keys = set()
+    for stone, overlay in cells.values():
+        graphic_keys.add(stone)
+        if overlay is not None and _is_graphic(overlay):
+            graphic_keys.add(overlay)
+    graphic_keys.discard(None)
+
+    parts = [
+        '<svg xmlns="http://www.w3.org/2000/svg" '
+        'xmlns:xlink="http://www.w3.org/1999/xlink" '
+        f'width="{width}" height="{height}" viewBox="0 0 {width} {height}">',
+        "<defs>",
+    ]
+    if settings.SVG_EMBED_FONT:
+        parts.append(_create_font_face())
+    if settings.SVG_EMBED_TEXTURE:
+        parts.append(_create_texture_pattern(board))
+    for key in sorted(graphic_keys):
+        parts.append(
+            f'<symbol id="{key}" viewBox="0 0 256 256">{_get_graphic_svg(key)}</symbol>'
+        )
+    parts.append("</defs>")
+
+    # 1) draws the board.
+    board_fill = "url(#board)" if settings.SVG_EMBED_TEXTURE else _to_rgb(BOARD_COLOR)
+    parts.append(
+        f'<rect width="{width}" height="{height}" fill="{_to_rgb(BOARD_COLOR)}"/>'
+    )
+    if settings.SVG_EMBED_TEXTURE:
+        parts.append(f'<rect width="{width}" height="{height}" fill="{board_fill}"/>')
+    parts.append(_create_board_lines(board))
+
+    # 2) draws the stones and annotations of every cell.
+    draw_cell_size = get_draw_cell_size()
+    offset = cell_size - draw_cell_size
+    for (column, row), (stone, overlay) in sorted(cells.items()):
+        x = margin + column * cell_size + offset
+        y = margin + row * cell_size + offset
+        if stone is not None:
+            parts.append(_create_use(stone, x, y, draw_cell_size))
+        if overlay is None:
+            continue
+
+        if overlay.startswith(LABEL_PREFIX) and stone is None:
+            # the label's background hides the lines beneath it.
+            size = int(cell_size * settings.LABEL_TEXT_SCALE * 1.15)
+            start = int(cell_size / 2 - size / 2)
+            parts.append(
+                f'<rect x="{x + start}" y="{y + start}" width="{size}" '
+                f'height="{size}" fill="{board_fill}"/>'
+            )
+        if _is_graphic(overlay):
+            parts.append(_create_use(overlay, x, y, draw_cell_size))
+        else:
+            parts.append(_create_text(overlay, x, y, draw_cell_size))
+
+    # 3) draws the lines.
+    if len(replay.lines) > 0:
+        line_width = int(settings.ANNOTATE_LINE_THICKNESS + cell_size * 0.03)
+        path = "".join(
+            "M{} {}L{} {}".format(*get_line_pixels(line)) for line in replay.lines
+        )
+        parts.append(
+            f'<path d="{path}" fill="none" '
+            f'stroke="{_to_rgb(settings.ANNOTATE_LINE_COLOR)}" '
+            f'stroke-width="{line_width}" stroke-linecap="round"/>'
+        )
+
+    parts.append("</svg>")
+    data = "\n".join(parts).encode("utf-8")
+    if isinstance(out, str):
+        with open(out, "wb") as file:
+            file.write(data)
+    else:
+        out.write(data)
+
+
+# returns True if the overlay is one of the style's graphics instead of text.
+def _is_graphic(overlay):
+    return overlay == "marker" or (
+        not overlay.startswith(LABEL_PREFIX) and not overlay[1:].isdigit()
+    )
+
+
+def _create_use(key, x, y, size):
+    return f'<use xlink:href="#{key}" x="{x}" y="{y}" width="{size}" height="{size}"/>'
+
+
+# returns the <text> of a move number (such as "B12") or a label,
+# fit within the cell in the same way as <create_cell_text>.
+def _create_text(overlay, x, y, size):
+    settings = get_settings()
+    if overlay.startswith(LABEL_PREFIX):
+        text = overlay[len(LABEL_PREFIX) :]
+        color = settings.LABEL_COLOR
+        scale = settings.LABEL_TEXT_SCALE
+    else:
+        text = overlay[1:]
+        if overlay[0] == "B":
+            color = settings.NUMBER_COLOR_FOR_BLACK
+        else:
+            color = settings.NUMBER_COLOR_FOR_WHITE
+        scale = (
+            settings.NUMBER_TEXT_SCALE
+            + (len(text) - 1) * settings.DIGIT_TEXT_SCALE_FACTOR
+        )
+
+    relative_size = max(_GLYPH_HEIGHT, _DIGIT_WIDTH * len(text))
+    font_size = round(size * scale / relative_size, 2)
+    font_family = _FONT_FAMILY if settings.SVG_EMBED_FONT else "sans-serif"
+    text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return (
+        f'<text x="{x + size / 2}" y="{y + size / 2}" font-size="{font_size}" '
+        f'font-family="{font_family}" fill="{_to_rgb(color)}" '
+        f'text-anchor="middle" dominant-baseline="central">{text}</text>'
+    )
+
+
+# returns a <path> of the board's lines and the <circle>s of its star points.
+def _create_board_lines(board):
+    settings = get_settings()
+    margin = get_scaled_margin()
+    cell_size = get_cell_size()
+    line_width = get_board_line_width()
+    px_offset = margin + cell_size // 2 + (line_width % 2) / 2
+    min_x, min_y, max_x, max_y = get_board_line_extents(board)
+
+    path = []
+    for x in range(get_show_width()):
+        path.append(f"M{x * cell_size + px_offset} {min_y}V{max_y}")
+    for y in range(get_show_height()):
+        path.append(f"M{min_x} {y * cell_size + px_offset}H{max_x}")
+    parts = [
+        f'<path d="{"".join(path)}" fill="none" '
+        f'stroke="{_to_rgb(settings.LINE_COLOR)}" stroke-width="{line_width}" '
+        'stroke-linecap="square"/>'
+    ]
+
+    start_x, start_y = get_board_start_point()
+    radius = round(cell_size * 50 / 512, 2)  # the same as the star point image.
+    for point_x, point_y in sorted(get_star_points(board)):
+        show_x = point_x - start_x
+        show_y = point_y - start_y
+        if 0 <= show_x < get_show_width() and 0 <= show_y < get_show_height():
+            parts.append(
+                f'<circle cx="{show_x * cell_size + px_offset}" '
+                f'cy="{show_y * cell_size + px_offset}" r="{radius}" '
+                f'fill="{_to_rgb(settings.LINE_COLOR)}"/>'
+            )
+    return "\n".join(parts)
+
+
+# returns a <pattern> of the style's board texture, placed where it would be
+# pasted onto the board image, which is embedded only once.
+def _create_texture_pattern(board):
+    margin = get_scaled_margin()
+    cell_size = get_cell_size()
+    start_x, start_y = get_board_start_point()
+    size = margin * 2 + cell_size * min(board.get_width(), board.get_height())
+    x = -start_x * cell_size
+    y = -start_y * cell_size
+    path = get_board_texture_path()
+    mime_type = "image/png" if path.endswith(".png") else "image/jpeg"
+    with open(path, "rb") as file:
+        uri = _to_data_uri(file.read(), mime_type)
+    return (
+        f'<pattern id="board" patternUnits="userSpaceOnUse" x="{x}" y="{y}" '
+        f'width="{size}" height="{size}">'
+        f'<image width="{size}" height="{size}" preserveAspectRatio="none" '
+        f'xlink:href="{uri}"/></pattern>'
+    )
+
+
+# returns a <style> with the @font-face of the style's font.
+def _create_font_face():
+    path = os.path.join(get_style_directory(), "font.ttf")
+    mime_type = "font/ttf"
+    if not os.path.exists(path):
+        path = os.path.join(get_style_directory(), "font.otf")
+        mime_type = "font/otf"
+    with open(path, "rb") as file:
+        uri = _to_data_uri(file.read(), mime_type)
+    return f'<style>@font-face{{font-family:"{_FONT_FAMILY}";src:url({uri});}}</style>'
+
+
+# returns the SVG of the style's graphic of the given <key>, 256 units wide.
+def _get_graphic_svg(key):
+    cache_key = (get_style_key(), key)
+    svg = _graphic_svgs.get(cache_key)
+    if svg is None:
+        if key in _SHAPE_KEYS:
+            svg = _create_shape(key)
+        else:
+            uri = _get_graphic_uri(key)
+            svg = f'<image width="256" height="256" xlink:href="{uri}"/>'
+        _graphic_svgs[cache_key] = svg
+    return svg
+
+
+# returns the shape of the markup graphic of the given <key>, measured from
+# the style's image of it, so it's the same size and color as in a raster diagram.
+# CR, DD and SL are a circle, SQ a square (either of which can have a hole),
+# TR a triangle and MA a cross.
+def _create_shape(key):
+    image = Image.open(get_style_image_path(key)).convert("RGBA")
+    alpha = image.getchannel("A")
+    max_alpha = alpha.getextrema()[1]
+    mask = alpha.point(lambda value: 255 if value * 2 > max_alpha else 0)
+    left, top, right, bottom = mask.getbbox()
+    center_x = (left + right) / 2
+    center_y = (top + bottom) / 2
+    opacity = max_alpha / 255
+    if key == "DD":
+        color = _to_rgb(image.getpixel((int(center_x), int(center_y))))
+    else:
+        # colored in the same way as <make_color_copy>.
+        color = _to_rgb([int(value * opacity) for value in get_settings().MARKER_COLOR])
+
+    if key in ["CR", "DD", "SL", "SQ"]:
+        # a hole is found by looking outward from the center.
+        half_size = (right - left) / 2
+        hole_half_size = 0
+        for x in range(int(center_x), right):
+            if mask.getpixel((x, int(center_y))) > 0:
+                hole_half_size = x - center_x
+                break
+        if hole_half_size <= 0:
+            paint = f'fill="{color}"'
+        else:
+            # the outline is drawn along the middle of where it's solid.
+            border = half_size - hole_half_size
+            half_size -= border / 2
+            paint = f'fill="none" stroke="{color}" stroke-width="{border}"'
+        if key == "SQ":
+            shape = (
+                f'<rect x="{center_x - half_size}" y="{center_y - half_size}" '
+                f'width="{half_size * 2}" height="{half_size * 2}" {paint}/>'
+            )
+        else:
+            shape = f'<circle cx="{center_x}" cy="{center_y}" r="{half_size}" {paint}/>'
+    elif key == "TR":
+        shape = (
+            f'<polygon points="{center_x},{top} {right},{bottom} {left},{bottom}" '
+            f'fill="{color}"/>'
+        )
+    else:
+        # the width of the cross's strokes is found from the row through
+        # a quarter of its height, which crosses each stroke at 45 degrees.
+        row = int(top + (bottom - top) / 4)
+        start = next(x for x in range(left, right) if mask.getpixel((x, row)) > 0)
+        end = next(x for x in range(start, right) if mask.getpixel((x, row)) == 0)
+        stroke_width = round((end - start) / 2**0.5, 2)
+        inset = (end - start) / 4  # where the flat ends of the strokes meet the box.
+        shape = (
+            f'<path d="M{left + inset} {top + inset}L{right - inset} {bottom - inset}'
+            f'M{right - inset} {top + inset}L{left + inset} {bottom - inset}" '
+            f'fill="none" stroke="{color}" stroke-width="{stroke_width}"/>'
+        )
+
+    if max_alpha < 255:
+        shape = f'<g opacity="{round(opacity, 3)}">{shape}</g>'
+    return shape
+
+
+# returns the data URI of the style's graphic of the given <key>,
+# colored in the same way as the graphics of a raster diagram.
+def _get_graphic_uri(key):
+    settings = get_settings()
+    if key == "marker":
+        path = os.path.join(get_style_directory(), "placement.png")
+        image = make_color_copy(Image.open(path), settings.PLACEMENT_MARKER_COLOR)
+    else:
+        image = Image.open(get_style_image_path(key))
+        if key not in ["B", "W", "DD"]:
+            image = make_color_copy(image, settings.MARKER_COLOR)
+    return _to_data_uri(encode_PNG(image, compress_level=9), "image/png")
+
+
+def _to_data_uri(data, mime_type):
+    return f"data:{mime_type};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+def _to_rgb(color):
+    return "rgb({},{},{})".format(*color[:3])
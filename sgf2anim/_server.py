@@ -0,0 +1,392 @@
+import ast
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qsl
+from ._settings import Settings, get_settings
+
+_MAX_BODY_BYTES = 16 * 1024 * 1024
+_CONTENT_TYPES = {"png": "image/png", "gif": "image/gif"}
+_TIMING_NAMES = (
+    "frame_delay_ms",
+    "start_freeze_ms",
+    "end_freeze_ms",
+    "number_display_ms",
+)
+_DEFAULT_TIMING = {
+    "frame_delay_ms": 1500,
+    "start_freeze_ms": 3000,
+    "end_freeze_ms": 10000,
+    "number_display_ms": 500,
+}
+_MAX_TIMING_MS = 60000
+
+
+# runs a local HTTP server that renders diagrams.
+# a POST request's body is the text of an SGF file, and the diagram's bytes
+# are sent back. the query string can contain:
+#   format=png|gif             the type of image to render (default png).
+#   preset=static|animated     applies one of the Settings' default profiles.
+#   frame_delay_ms=1500 (etc.) the same timing parameters as <save_diagram>.
+#   MARKER_COLOR=(0,0,0) (etc.) one of the settings in _QUERY_SETTINGS.
+# the current settings are used as the defaults for every request.
+#
+# renders are run in a pool of <n_workers> processes which keep their style
+# resources loaded. identical requests that arrive while one is being rendered
+# all wait for that single render, and finished results are kept in a cache
+# that holds up to <cache_size_mb> megabytes.
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    n_workers: int = 2,
+    cache_size_mb: float = 64,
+):
+    service = RenderService(n_workers, cache_size_mb, get_settings().to_dict())
+    server = ThreadingHTTPServer((host, port), _RenderRequestHandler)
+    server.daemon_threads = True
+    server.render_service = service
+    print(f"serving diagrams on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+# renders diagrams in a pool of worker processes,
+# coalescing identical requests and caching the results.
+class RenderService:
+    def __init__(self, n_workers, cache_size_mb, default_settings_values):
+        self._n_workers = n_workers
+        self._default_settings_values = default_settings_values
+        self._executor = self._create_executor()
+        self._cache = ResultCache(int(cache_size_mb * 1024 * 1024))
+        self._in_flight = {}
+        self._lock = threading.RLock()
+
+    def get_default_settings_values(self):
+        return dict(self._default_settings_values)
+
+    # returns the bytes of the rendered diagram (or None if it couldn't be
+    # rendered) and whether the result was a "hit", "miss" or "coalesced".
+    # a worker that crashes breaks the whole pool, so the pool is replaced
+    # and the render is tried once more before BrokenProcessPool is raised.
+    def render(self, content, out_format, timing, settings_values):
+        key = make_render_key(content, out_format, timing, settings_values)
+        try:
+            return self._render(key, content, out_format, timing, settings_values)
+        except BrokenProcessPool:
+            return self._render(key, content, out_format, timing, settings_values)
+
+    def _render(self, key, content, out_format, timing, settings_values):
+        with self._lock:
+            data = self._cache.get(key)
+            if data is not None:
+                return data, "hit"
+
+            source = "coalesced"
+            future, executor = self._in_flight.get(key, (None, None))
+            if future is None:
+                source = "miss"
+                executor = self._executor
+                try:
+                    future = executor.submit(
+                        _render_in_worker, content, out_format, timing, settings_values
+                    )
+                except BrokenProcessPool:
+                    self._replace_executor(executor)
+                    raise
+                self._in_flight[key] = (future, executor)
+                future.add_done_callback(lambda f: self._finish(key, f))
+
+        try:
+            return future.result(), source
+        except BrokenProcessPool:
+            self._replace_executor(executor)
+            raise
+
+    def _create_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self._n_workers,
+            initializer=_init_worker,
+            initargs=(self._default_settings_values,),
+        )
+
+    # shuts down the broken <executor> and starts a new pool in its place,
+    # unless another request has already replaced it.
+    def _replace_executor(self, executor):
+        with self._lock:
+            if self._executor is not executor:
+                return
+            executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._create_executor()
+
+    def _finish(self, key, future):
+        with self._lock:
+            # a retried render of the same key could already be in flight.
+            if self._in_flight.get(key, (None,))[0] is future:
+                del self._in_flight[key]
+            if future.cancelled() or future.exception() is not None:
+                return
+            data = future.result()
+            if data is not None:
+                self._cache.put(key, data)
+
+    def shutdown(self):
+        self._executor.shutdown(cancel_futures=True)
+
+
+# a thread-safe cache of rendered diagrams which discards
+# the least recently used results once it holds more than <max_bytes>.
+class ResultCache:
+    def __init__(self, max_bytes):
+        self._max_bytes = max_bytes
+        self._n_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        if len(data) > self._max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = data
+            self._n_bytes += len(data)
+            while self._n_bytes > self._max_bytes:
+                _, old_data = self._entries.popitem(last=False)
+                self._n_bytes -= len(old_data)
+
+
+# returns a key that identifies a render by the SGF <content>
+# and every value that affects what the rendered diagram looks like.
+def make_render_key(content, out_format, timing, settings_values):
+    description = json.dumps(
+        [out_format, list(timing), settings_values], sort_keys=True, default=str
+    )
+    hasher = hashlib.sha256()
+    hasher.update(description.encode("utf-8"))
+    hasher.update(b"\0")
+    hasher.update(content.encode("utf-8"))
+    return hasher.hexdigest()
+
+
+# returns (<out_format>, <timing>, <settings values>) from a request's query,
+# starting from the given <default_settings_values>.
+# a ValueError is raised if the query contains an unknown or invalid value.
+def parse_render_query(query, default_settings_values):
+    settings = Settings()
+    settings.load_dict(default_settings_values)
+    out_format = "png"
+    timing = dict(_DEFAULT_TIMING)
+
+    for name, value in parse_qsl(query, keep_blank_values=True):
+        if name == "format":
+            if value not in _CONTENT_TYPES:
+                raise ValueError(f"unknown format {value!r}.")
+            out_format = value
+        elif name == "preset":
+            if value == "static":
+                settings.set_for_static_diagram()
+            elif value == "animated":
+                settings.set_for_animated_diagram()
+            else:
+                raise ValueError(f"unknown preset {value!r}.")
+        elif name in _TIMING_NAMES or name in _QUERY_SETTINGS:
+            try:
+                if name in _TIMING_NAMES:
+                    timing[name] = _parse_int(value, 0, _MAX_TIMING_MS)
+                else:
+                    setattr(settings, name, _QUERY_SETTINGS[name](value))
+            except ValueError as error:
+                raise ValueError(f"invalid {name}: {error}") from None
+        else:
+            raise ValueError(f"unknown parameter {name!r}.")
+
+    timing = tuple(timing[name] for name in _TIMING_NAMES)
+    return out_format, timing, settings.to_dict()
+
+
+# setting values are Python literals, except for plain strings
+# such as a style name, which don't need to be quoted.
+def _parse_setting_value(value):
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return value
+
+
+def _parse_bool(value):
+    parsed = _parse_setting_value(value)
+    if not isinstance(parsed, bool):
+        raise ValueError("expected True or False.")
+    return parsed
+
+
+def _parse_color(value):
+    parsed = _parse_setting_value(value)
+    if not (
+        isinstance(parsed, tuple)
+        and len(parsed) == 3
+        and all(type(channel) is int and 0 <= channel <= 255 for channel in parsed)
+    ):
+        raise ValueError("expected an RGB color such as (0,0,0).")
+    return parsed
+
+
+def _parse_int(value, minimum, maximum):
+    parsed = _parse_setting_value(value)
+    if type(parsed) is not int or not minimum <= parsed <= maximum:
+        raise ValueError(f"expected a whole number from {minimum} to {maximum}.")
+    return parsed
+
+
+def _parse_float(value, minimum, maximum):
+    parsed = _parse_setting_value(value)
+    if type(parsed) not in [int, float] or not minimum <= parsed <= maximum:
+        raise ValueError(f"expected a number from {minimum} to {maximum}.")
+    return parsed
+
+
+def _parse_choice(value, choices):
+    if value not in choices:
+        raise ValueError(f"expected one of {', '.join(choices)}.")
+    return value
+
+
+def _parse_style_name(value):
+    from ._image_resources import get_style_names
+
+    return _parse_choice(value, get_style_names())
+
+
+def _parse_render_quality(value):
+    from ._image_text import RESAMPLE_FILTERS
+
+    return _parse_choice(value, list(RESAMPLE_FILTERS))
+
+
+def _parse_png_compression(value):
+    from ._save_png import PNG_COMPRESS_LEVELS
+
+    return _parse_choice(value, list(PNG_COMPRESS_LEVELS))
+
+
+# the settings that a request's query can change, as {<name>: <parser>},
+# where each parser returns the value or raises a ValueError if it's invalid.
+# sizes are limited so a single request can't take up too much time or memory.
+_QUERY_SETTINGS = {
+    "MAX_WIDTH": lambda value: _parse_int(value, 16, 2000),
+    "MAX_HEIGHT": lambda value: _parse_int(value, 16, 2000),
+    "IMAGE_MARGIN": lambda value: _parse_int(value, 0, 64),
+    "MIN_CELL_SIZE": lambda value: _parse_int(value, 4, 256),
+    "MAX_CELL_SIZE": lambda value: _parse_int(value, 4, 256),
+    "SHOW_STONE_NUMBERS": _parse_bool,
+    "MAINTAIN_STONE_NUMBERS": _parse_bool,
+    "MAINTAIN_NUMBERS_AT_END": _parse_bool,
+    "MARKER_INSTEAD_OF_NUMBERS": _parse_bool,
+    "LABEL_TEXT_SCALE": lambda value: _parse_float(value, 0.1, 1),
+    "NUMBER_TEXT_SCALE": lambda value: _parse_float(value, 0.1, 1),
+    "DIGIT_TEXT_SCALE_FACTOR": lambda value: _parse_float(value, 0, 1),
+    "CENTER_LABELS_VERTICALLY": _parse_bool,
+    "STYLE_NAME": _parse_style_name,
+    "LINE_COLOR": _parse_color,
+    "LINE_THICKNESS": lambda value: _parse_float(value, 0.1, 10),
+    "MARKER_COLOR": _parse_color,
+    "LABEL_COLOR": _parse_color,
+    "PLACEMENT_MARKER_COLOR": _parse_color,
+    "NUMBER_COLOR_FOR_BLACK": _parse_color,
+    "NUMBER_COLOR_FOR_WHITE": _parse_color,
+    "ANNOTATE_LINE_COLOR": _parse_color,
+    "ANNOTATE_LINE_THICKNESS": lambda value: _parse_float(value, 0, 32),
+    "DISPLAY_PADDING": lambda value: _parse_int(value, 0, 25),
+    "FORCE_STONES_CENTER": _parse_bool,
+    "RENDER_CAPTURES": _parse_bool,
+    "MERGE_DUPLICATE_FRAMES": _parse_bool,
+    "RENDER_QUALITY": _parse_render_quality,
+    "PNG_PALETTE": _parse_bool,
+    "PNG_COMPRESSION": _parse_png_compression,
+    "SHOW_GROUPED_MOVE_NUMBERS": _parse_bool,
+}
+
+
+def _init_worker(settings_values):
+    from ._image_resources import load_images
+
+    get_settings().load_dict(settings_values)
+    load_images()
+
+
+def _render_in_worker(content, out_format, timing, settings_values):
+    from . import render_diagram
+
+    get_settings().load_dict(settings_values)
+    return render_diagram(content, out_format, *timing)
+
+
+class _RenderRequestHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        service = self.server.render_service
+        url = urlparse(self.path)
+
+        try:
+            n_bytes = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            self._send_error(400, "the Content-Length isn't a number.")
+            return
+        if n_bytes < 0:
+            self._send_error(400, "the Content-Length can't be negative.")
+            return
+        if n_bytes > _MAX_BODY_BYTES:
+            self._send_error(413, "the SGF is too large.")
+            return
+        content = self.rfile.read(n_bytes).decode("utf-8", errors="replace")
+
+        try:
+            out_format, timing, settings_values = parse_render_query(
+                url.query, service.get_default_settings_values()
+            )
+        except ValueError as error:
+            self._send_error(400, str(error))
+            return
+
+        try:
+            data, source = service.render(content, out_format, timing, settings_values)
+        except BrokenProcessPool:
+            self._send_error(503, "a render worker crashed. try again.")
+            return
+        except Exception as error:
+            self._send_error(500, f"{type(error).__name__}: {error}")
+            return
+
+        if data is None:
+            self._send_error(422, "the SGF could not be rendered.")
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", _CONTENT_TYPES[out_format])
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("X-Cache", source)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, code, message):
+        body = (message + "\n").encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
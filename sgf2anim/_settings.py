@@ -36,6 +36,25 @@ class Settings:
         self.DISPLAY_PADDING = 1  # the padding around all active cells.
         self.FORCE_STONES_CENTER = False
         self.RENDER_CAPTURES = False
+        self.MERGE_DUPLICATE_FRAMES = True  # merges GIF frames that look the same.
+        self.RENDER_QUALITY = "final"  # "final", or "draft" for fast previews.
+
+        # the settings for saving static diagrams.
+        self.PNG_PALETTE = False  # saves PNGs with a palette of 256 colors.
+        self.PNG_COMPRESSION = "smallest"  # "fastest", "balanced" or "smallest".
+        self.SVG_EMBED_TEXTURE = True  # fills SVG boards with the style's texture.
+        self.SVG_EMBED_FONT = False  # embeds the style's font in SVGs.
+
+        # the settings for limiting the length of a GIF. if either is set,
+        # several consecutive moves will be shown in each frame as needed.
+        self.MAX_FRAMES = None
+        self.MAX_DURATION_MS = None
+        self.SHOW_GROUPED_MOVE_NUMBERS = False
+
+        # the megabytes that the frames of a GIF, the style's caches and the
+        # checkpoints of rendered positions can use, or None for no limit.
+        # frames past the limit are held on disk instead.
+        self.MEMORY_BUDGET_MB = None
 
         # for future implementation of a formatting for Sensei's Library.
         # if True, this will use the previous existing .png for the .sgf
@@ -58,6 +77,15 @@ class Settings:
         self.MARKER_INSTEAD_OF_NUMBERS = True
         self.RENDER_CAPTURES = True
 
+    # returns a copy of every setting's value, keyed by name.
+    def to_dict(self):
+        return dict(vars(self))
+
+    # sets the settings from a dict that was returned by <to_dict>.
+    def load_dict(self, values):
+        for name, value in values.items():
+            setattr(self, name, value)
+
 
 _settings = Settings()
 
@@ -0,0 +1,40 @@
+# returns a list with the text of every game in the SGF <content>.
+# an SGF file can be a collection which holds several games one after another,
+# such as "(;GM[1]...)(;GM[1]...)". the text is returned as a list
+# with one item if it only contains one game.
+def split_SGF_collection(content: str):
+    games = []
+    depth = 0
+    game_start = None
+    in_value = False
+    is_escaped = False
+    for i, char in enumerate(content):
+        if in_value:
+            # parentheses inside of property values (such as comments) are ignored.
+            if is_escaped:
+                is_escaped = False
+            elif char == "\\":
+                is_escaped = True
+            elif char == "]":
+                in_value = False
+            continue
+
+        if char == "[":
+            in_value = True
+        elif char == "(":
+            if depth == 0:
+                game_start = i
+            depth += 1
+        elif char == ")" and depth > 0:
+            depth -= 1
+            if depth == 0:
+                games.append(content[game_start : i + 1])
+                game_start = None
+
+    if game_start is not None:
+        # the last game was never closed.
+        games.append(content[game_start:])
+
+    if len(games) <= 1:
+        return [content]
+    return games
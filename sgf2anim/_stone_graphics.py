@@ -0,0 +1,129 @@
+import io
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from ._image_resources import get_stone_images, get_style_key, load_images
+from ._image_text import create_cell_text, get_render_quality
+from ._save_png import encode_PNG
+from ._settings import get_settings
+
+GRAPHIC_SIZE = 64
+SPRITE_SHEET_NAME = "stones"
+
+_MARKS = (("CR", "c.png"), ("SQ", "s.png"), ("TR", "t.png"), ("MA", "x.png"))
+_MAX_MOVE_NUM = 100
+
+# the rendered graphics of the last style, as {<file name>: <PNG bytes>}.
+_graphics_style_key = None
+_graphics = {}
+
+
+# saves individual stone graphics used in Sensei's Library to <stones_directory>.
+# the graphics are rendered once per style and written by <n_threads> threads.
+# a file that already has the same contents isn't written again.
+# if <as_sprite_sheet> is True, every graphic is instead saved in one image
+# (stones.png) with an index of where each one is (stones.json).
+# returns the number of files that were written.
+def save_stone_graphics(
+    stones_directory: str, n_threads: int = 8, as_sprite_sheet: bool = False
+):
+    graphics = _get_graphics()
+    if as_sprite_sheet:
+        image_bytes, index = _create_sprite_sheet(graphics)
+        index_bytes = json.dumps(index).encode("utf-8")
+        files = {
+            f"{SPRITE_SHEET_NAME}.png": image_bytes,
+            f"{SPRITE_SHEET_NAME}.json": index_bytes,
+        }
+    else:
+        files = graphics
+
+    paths_and_data = [
+        (os.path.join(stones_directory, name), data) for name, data in files.items()
+    ]
+    with ThreadPoolExecutor(max_workers=max(1, n_threads)) as executor:
+        was_written = executor.map(
+            lambda item: _write_if_changed(*item), paths_and_data
+        )
+        return sum(was_written)
+
+
+# returns {<file name>: <PNG bytes>} of every graphic for the current style.
+def _get_graphics():
+    global _graphics_style_key, _graphics
+    load_images()
+    # the style key has every other setting that <create_cell_text> depends on.
+    style_key = get_style_key() + (
+        get_settings().NUMBER_TEXT_SCALE,
+        get_render_quality(),
+    )
+    if _graphics_style_key == style_key:
+        return _graphics
+
+    images = {}
+    stone_images = get_stone_images()[GRAPHIC_SIZE]
+    for key, image_extension in _MARKS:
+        images["e" + image_extension] = stone_images[key]
+
+    for char, text_color in [
+        ("b", get_settings().NUMBER_COLOR_FOR_BLACK),
+        ("w", get_settings().NUMBER_COLOR_FOR_WHITE),
+    ]:
+        stone_graphic = stone_images[char.upper()]
+        images[f"{char}.png"] = stone_graphic
+
+        for i in range(1, _MAX_MOVE_NUM + 1):
+            comp = create_cell_text(
+                GRAPHIC_SIZE,
+                str(i),
+                text_color,
+                get_settings().NUMBER_TEXT_SCALE,
+            )
+            images[f"{char}{i}.png"] = Image.alpha_composite(stone_graphic, comp)
+
+        for key, image_extension in _MARKS:
+            images[char + image_extension] = Image.alpha_composite(
+                stone_graphic, stone_images[key]
+            )
+
+    # the graphics are encoded in parallel, since zlib releases the GIL.
+    with ThreadPoolExecutor() as executor:
+        encoded = executor.map(_encode_graphic, images.values())
+        _graphics = dict(zip(images.keys(), encoded))
+    _graphics_style_key = style_key
+    return _graphics
+
+
+# returns the PNG bytes of a sprite sheet of every graphic
+# and a dict of {<file name>: [x, y, width, height]} of where each one is.
+def _create_sprite_sheet(graphics):
+    n_columns = math.ceil(math.sqrt(len(graphics)))
+    n_rows = math.ceil(len(graphics) / n_columns)
+    sheet = Image.new(
+        "RGBA", (n_columns * GRAPHIC_SIZE, n_rows * GRAPHIC_SIZE), (0, 0, 0, 0)
+    )
+    index = {}
+    for i, (name, data) in enumerate(graphics.items()):
+        x = (i % n_columns) * GRAPHIC_SIZE
+        y = (i // n_columns) * GRAPHIC_SIZE
+        sheet.paste(Image.open(io.BytesIO(data)), (x, y))
+        index[name] = [x, y, GRAPHIC_SIZE, GRAPHIC_SIZE]
+    return _encode_graphic(sheet), index
+
+
+def _encode_graphic(image):
+    return encode_PNG(image, compress_level=9)
+
+
+# writes <data> to <path> unless the file already holds the same contents.
+# returns True if the file was written.
+def _write_if_changed(path, data):
+    if os.path.exists(path):
+        with open(path, "rb") as file:
+            if file.read() == data:
+                return False
+    with open(path, "wb") as file:
+        file.write(data)
+    return True
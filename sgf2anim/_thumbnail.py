@@ -0,0 +1,181 @@
+import json
+import time
+from PIL import Image
+from .weiqi_board import BLACK_NUM
+from ._commands import apply_command
+from ._image_resources import (
+    get_board_image,
+    get_board_start_point,
+    get_cell_size,
+    get_draw_cell_size,
+    get_scaled_margin,
+    get_show_width,
+    get_show_height,
+    get_stone_images,
+    setup_board,
+)
+from ._image_text import get_resample_filter
+from ._profile import stage
+from ._save_png import encode_PNG
+from ._settings import get_settings
+
+_SHEET_COLOR = (255, 255, 255)
+
+
+# returns a small RGB image of the final position of <game>, which is either
+# the text of an SGF or a CompiledGame, or None if it couldn't be parsed.
+# the image fits within <size> x <size> pixels.
+# only the board is replayed, so no frames or annotations are drawn.
+def render_thumbnail(game, size: int = 128):
+    from . import _parse_content
+
+    if isinstance(game, str):
+        with stage("parse"):
+            game = _parse_content(game)
+        if game is None:
+            return None
+
+    settings = get_settings()
+    max_size = (settings.MAX_WIDTH, settings.MAX_HEIGHT)
+    settings.MAX_WIDTH = size
+    settings.MAX_HEIGHT = size
+    try:
+        with stage("board"):
+            board = setup_board(None, game)
+    finally:
+        settings.MAX_WIDTH, settings.MAX_HEIGHT = max_size
+
+    with stage("replay"):
+        _play_stones(game, board)
+        image = get_board_image().copy()
+        stone_images = get_stone_images()[get_draw_cell_size()]
+        start_x, start_y = get_board_start_point()
+        offset = get_scaled_margin() + get_cell_size() - get_draw_cell_size()
+        for show_x in range(get_show_width()):
+            for show_y in range(get_show_height()):
+                player_num = board.get_player_num((start_x + show_x, start_y + show_y))
+                if player_num == 0:
+                    continue
+                stone_image = stone_images["B" if player_num == BLACK_NUM else "W"]
+                draw_x = offset + show_x * get_cell_size()
+                draw_y = offset + show_y * get_cell_size()
+                image.alpha_composite(stone_image, (draw_x, draw_y))
+
+    # a large board can be bigger than <size> at the MIN_CELL_SIZE.
+    if image.width > size or image.height > size:
+        image.thumbnail((size, size), get_resample_filter())
+    return image.convert("RGB")
+
+
+# plays every stone of <game> on the <board> without drawing anything.
+def _play_stones(game, board):
+    for node in game.nodes:
+        for op in node.ops:
+            apply_command(op, board)
+
+
+# packs thumbnails into grids of <n_columns> x <n_rows>, saved as
+# "<out_prefix>-1.png", "<out_prefix>-2.png" and so on. each sheet has an
+# index ("<out_prefix>-1.json") of {<name>: [x, y, width, height]}
+# giving where every thumbnail is.
+class ContactSheetWriter:
+    def __init__(self, out_prefix, thumbnail_size=128, n_columns=10, n_rows=10):
+        self._out_prefix = out_prefix
+        self._thumbnail_size = thumbnail_size
+        self._n_columns = n_columns
+        self._n_rows = n_rows
+        self._padding = max(1, thumbnail_size // 16)
+        self._sheet = None
+        self._index = {}
+        self._n_thumbnails = 0  # the number of thumbnails on the current sheet.
+        self.sheet_paths = []
+
+    # adds the thumbnail <image> with the given <name> to the current sheet,
+    # saving the sheet once it's full.
+    def add(self, name, image):
+        if self._sheet is None:
+            cell_size = self._thumbnail_size + self._padding
+            sheet_size = (
+                self._n_columns * cell_size + self._padding,
+                self._n_rows * cell_size + self._padding,
+            )
+            self._sheet = Image.new("RGB", sheet_size, _SHEET_COLOR)
+            self._index = {}
+            self._n_thumbnails = 0
+
+        # the thumbnail is centered in its cell.
+        i = self._n_thumbnails
+        cell_size = self._thumbnail_size + self._padding
+        x = self._padding + (i % self._n_columns) * cell_size
+        y = self._padding + (i // self._n_columns) * cell_size
+        x += (self._thumbnail_size - image.width) // 2
+        y += (self._thumbnail_size - image.height) // 2
+        self._sheet.paste(image, (x, y))
+        self._index[name] = [x, y, image.width, image.height]
+        self._n_thumbnails += 1
+
+        if self._n_thumbnails == self._n_columns * self._n_rows:
+            self._save_sheet()
+
+    # saves the last sheet, even if it isn't full.
+    def close(self):
+        if self._sheet is not None:
+            self._save_sheet()
+
+    def _save_sheet(self):
+        # the rows that a last sheet doesn't use are cropped off.
+        n_rows = -(-self._n_thumbnails // self._n_columns)
+        height = n_rows * (self._thumbnail_size + self._padding) + self._padding
+        if height < self._sheet.height:
+            self._sheet = self._sheet.crop((0, 0, self._sheet.width, height))
+
+        sheet_path = f"{self._out_prefix}-{len(self.sheet_paths) + 1}.png"
+        with stage("encode"):
+            self._sheet.save(sheet_path, format="PNG", compress_level=6)
+        with stage("write"):
+            with open(sheet_path[:-4] + ".json", "w", encoding="utf-8") as file:
+                json.dump(self._index, file)
+        self.sheet_paths.append(sheet_path)
+        self._sheet = None
+
+
+# saves contact sheets of the thumbnails of every game in the given .sgf files.
+# the games of a collection file are named "<path>-1", "<path>-2" and so on.
+# the parameters are the same as those of <ContactSheetWriter>.
+# returns the paths of the saved sheets.
+def save_contact_sheets(
+    sgf_paths,
+    out_prefix: str,
+    thumbnail_size: int = 128,
+    n_columns: int = 10,
+    n_rows: int = 10,
+):
+    from . import _read_SGF
+    from ._sgf_collection import split_SGF_collection
+
+    writer = ContactSheetWriter(out_prefix, thumbnail_size, n_columns, n_rows)
+    n_games = 0
+    start_time = time.perf_counter()
+    for path in sgf_paths:
+        with stage("read"):
+            games = split_SGF_collection(_read_SGF(path))
+        for i, content in enumerate(games):
+            image = render_thumbnail(content, thumbnail_size)
+            if image is None:
+                continue
+            writer.add(path if len(games) == 1 else f"{path}-{i + 1}", image)
+            n_games += 1
+    writer.close()
+
+    elapsed = time.perf_counter() - start_time
+    games_per_second = n_games / elapsed if elapsed > 0 else 0
+    print(
+        f"{n_games} thumbnails were saved to {len(writer.sheet_paths)} sheets "
+        f"({games_per_second:.1f} games per second)."
+    )
+    return writer.sheet_paths
+
+
+# returns the PNG bytes of a thumbnail image.
+def encode_thumbnail(image):
+    return encode_PNG(image, compress_level=6)
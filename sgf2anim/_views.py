@@ -0,0 +1,48 @@
+from . import _commands, _draw, _image_resources
+from ._image_resources import setup_board
+from ._settings import get_settings
+
+
+# returns the (<max width>, <max height>) of a view with the given <size>,
+# which is either a number of pixels for a square view, a (width, height)
+# tuple or None for the MAX_WIDTH and MAX_HEIGHT settings.
+def get_view_size(size):
+    if size is None:
+        return (get_settings().MAX_WIDTH, get_settings().MAX_HEIGHT)
+    if isinstance(size, int):
+        return (size, size)
+    width, height = size
+    return (width, height)
+
+
+# sets the board up for the CompiledGame <game> to fit within the given <size>,
+# returning a new Weiqi board object. the MAX_WIDTH and MAX_HEIGHT settings
+# are only changed while the viewport and board images are made.
+# the board images are only made if <draw_images>.
+def setup_view(sgf_path, game, size, draw_images=True):
+    settings = get_settings()
+    max_size = (settings.MAX_WIDTH, settings.MAX_HEIGHT)
+    settings.MAX_WIDTH, settings.MAX_HEIGHT = get_view_size(size)
+    try:
+        return setup_board(sgf_path, game, draw_images)
+    finally:
+        settings.MAX_WIDTH, settings.MAX_HEIGHT = max_size
+
+
+# returns everything that's drawn for the current view: its viewport,
+# board images, annotations, move number and lines.
+# the images and sprites are only referenced, never copied.
+def get_view_state():
+    return (
+        _image_resources.get_view_state(),
+        _draw.get_view_state(),
+        _commands.get_view_state(),
+    )
+
+
+# makes the view of a state from <get_view_state> the current one.
+def set_view_state(state):
+    image_resources_state, draw_state, commands_state = state
+    _image_resources.set_view_state(image_resources_state)
+    _draw.set_view_state(draw_state)
+    _commands.set_view_state(commands_state)
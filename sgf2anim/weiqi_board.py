@@ -1,5 +1,4 @@
 import copy
-import numpy as np
 
 BLACK_NUM = 1
 WHITE_NUM = 2
@@ -42,6 +41,10 @@ class WeiqiBoard:
         self._N_PLAYERS = n_players
         self._ALLOW_SELF_CAPTURE = False
 
+        # numpy is only imported once a board is made,
+        # so importing the package doesn't wait for it.
+        import numpy as np
+
         self._board = np.array(
             [
                 [[_ONE_HOT_FALSE for _ in range(height)] for _ in range(width)]
@@ -152,6 +155,8 @@ class WeiqiBoard:
 
         # checks for repetitions from Ko.
         if n_opposing_captured == 1 and len(own_group) == 1:
+            import numpy as np
+
             hash_num = hash(tuple(self._n_stones))
             if self._prev_boards.get(hash_num) is not None and any(
                 np.array_equal(self._board, prev_board)
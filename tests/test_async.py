@@ -0,0 +1,67 @@
+import asyncio
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sgf2anim
+from sgf2anim._settings import Settings
+
+GAME_A = "(;SZ[9];B[cc];W[gg];B[cg];W[gc];B[ee])"
+GAME_B = "(;SZ[13];AB[dd][jj];B[dj];W[jd];B[gg];W[gh];B[hh];W[])"
+
+# the seconds that a test waits before it counts as hung.
+TIMEOUT = 30
+
+
+def setup_function():
+    sgf2anim.get_settings().load_dict(Settings().to_dict())
+
+
+def teardown_function():
+    sgf2anim.get_settings().load_dict(Settings().to_dict())
+
+
+async def _collect(content, **kwargs):
+    return [frame async for frame in sgf2anim.render_frames(content, **kwargs)]
+
+
+def _assert_same_frames(frames, expected_frames):
+    assert len(frames) == len(expected_frames)
+    for (image, duration), (expected_image, expected_duration) in zip(
+        frames, expected_frames
+    ):
+        assert duration == expected_duration
+        assert np.array_equal(np.array(image), np.array(expected_image))
+
+
+def test_concurrent_streams_match_separate_streams():
+    async def run():
+        expected_a = await _collect(GAME_A)
+        expected_b = await _collect(GAME_B)
+
+        # the streams take turns, each one pausing after every frame.
+        frames = await asyncio.gather(
+            _collect(GAME_A, max_buffered_frames=1),
+            _collect(GAME_B, max_buffered_frames=1),
+        )
+        _assert_same_frames(frames[0], expected_a)
+        _assert_same_frames(frames[1], expected_b)
+
+    asyncio.run(asyncio.wait_for(run(), TIMEOUT))
+
+
+def test_paused_stream_leaves_the_render_thread_free():
+    async def run():
+        stream = sgf2anim.render_frames(GAME_A, max_buffered_frames=1)
+        await stream.__anext__()
+        await asyncio.sleep(0.1)  # lets the stream fill its buffer and pause.
+
+        # another stream and a whole render both finish while it's paused.
+        await asyncio.wait_for(_collect(GAME_B), TIMEOUT)
+        assert await asyncio.wait_for(sgf2anim.render(GAME_B), TIMEOUT) is not None
+
+        # stopping the stream early doesn't wait on frames that won't be used.
+        await asyncio.wait_for(stream.aclose(), TIMEOUT)
+
+    asyncio.run(run())
@@ -0,0 +1,51 @@
+import os
+import sys
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sgf2anim
+from sgf2anim import _get_nodes_per_frame, _group_frames, _iter_frames, _parse_content
+from sgf2anim._settings import Settings
+
+# a game whose last move is a pass, which doesn't show a move number.
+ENDS_ON_PASS = "(;SZ[9];B[cc];W[gg];B[cg];W[dd];B[])"
+
+
+# returns the pixels of the last image shown by the animated diagram
+# of <content> with <nodes_per_frame> nodes shown in each frame.
+def _render_final_image(content, nodes_per_frame, group_numbers):
+    settings = sgf2anim.get_settings()
+    settings.load_dict(Settings().to_dict())
+    settings.set_for_animated_diagram()
+    settings.SHOW_GROUPED_MOVE_NUMBERS = group_numbers
+    try:
+        game = _parse_content(content)
+        frames = _group_frames(_iter_frames(None, game, False), nodes_per_frame)
+        image = None
+        for frame, _ in frames:
+            image = (
+                frame.copy() if image is None else Image.alpha_composite(image, frame)
+            )
+        return np.array(image)
+    finally:
+        settings.load_dict(Settings().to_dict())
+
+
+def test_grouped_numbers_are_cleared_when_a_group_ends_on_a_pass():
+    ungrouped = _render_final_image(ENDS_ON_PASS, 1, False)
+    for nodes_per_frame in (2, 5):
+        grouped = _render_final_image(ENDS_ON_PASS, nodes_per_frame, True)
+        assert np.array_equal(grouped, ungrouped)
+
+
+def test_max_frames_keeps_the_first_frame_and_one_group():
+    settings = sgf2anim.get_settings()
+    settings.load_dict(Settings().to_dict())
+    settings.set_for_animated_diagram()
+    settings.MAX_FRAMES = 1
+    try:
+        game = _parse_content(ENDS_ON_PASS)
+        assert _get_nodes_per_frame(game, 1500, 3000, 10000, 500) == 5
+    finally:
+        settings.load_dict(Settings().to_dict())